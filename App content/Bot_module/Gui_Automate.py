@@ -27,6 +27,10 @@ from datetime import datetime
 import pyperclipimg
     
 from my_lib.shared_context import ExecutionContext as Context
+from my_lib.template_cache import template_cache
+from my_lib.image_matcher import ImageMatcher, BACKEND_FULL
+from my_lib.hit_memory import hit_memory_for
+from my_lib.polling import AdaptiveBackoff
 
 class Bot_utility:
     '''
@@ -45,6 +49,8 @@ class Bot_utility:
         self.context.add_log(f"{self.log_prefix} Initialized with context.")
         
         self.click_image_folder_path = context.get_click_image_base_dir()
+        # Swap in ImageMatcher(StoredFrameSource([...])) to replay saved screenshots.
+        self.matcher = ImageMatcher(hit_memory=hit_memory_for(self.click_image_folder_path) if self.click_image_folder_path else None)
         pass
         
     def click_ai_element(self, ai_response_json, label_to_click):
@@ -154,6 +160,107 @@ class Bot_utility:
         img_file = PIL.Image.open(io.BytesIO(image_data))    
         return img_file
 
+    def _load_template(self, image_to_click):
+        """Returns the decoded variants of a Click_image template from the shared cache.
+
+        Args:
+            image_to_click (str): The name of the image file (without extension),
+                                  relative to the 'Click_image/' directory.
+
+        Returns:
+            list: (variant key, grayscale numpy array) pairs, ready to be passed to
+                  pyautogui with grayscale=True.
+        """
+        return template_cache.get_template(self.click_image_folder_path, image_to_click)
+
+    def get_template_cache_stats(self):
+        """Returns the hit/miss counters of the decoded image template cache.
+
+        Returns:
+            dict: {'hits': n, 'misses': n, 'evictions': n, 'entries': n}, plus the
+                  last-hit region memory's 'region_hits', 'region_misses' and 'remembered',
+                  and the wait loops' 'frames_matched' and 'frames_skipped'.
+        """
+        stats = template_cache.stats()
+        if self.matcher.hit_memory is not None:
+            stats.update(self.matcher.hit_memory.stats())
+        stats.update(frames_matched=self.matcher.frames_matched, frames_skipped=self.matcher.frames_skipped)
+        self.context.add_log(f"{self.log_prefix} Template cache: {stats}")
+        return stats
+
+    def set_image_match_workers(self, workers=4):
+        """Sets how many CPU threads match the variants of an image lookup in parallel.
+
+        Args:
+            workers (int, optional): Threads per lookup; 1 matches the variants one
+                                     after another. Defaults to 4.
+        """
+        self.matcher.max_workers = max(1, int(workers))
+        self.context.add_log(f"{self.log_prefix} Image matching uses {self.matcher.max_workers} thread(s).")
+
+    def _locate(self, image_names, confidence=0.92, region=None, match_backend=BACKEND_FULL):
+        """Finds the best match of one or more templates with a single screen capture.
+
+        Args:
+            image_names (list): Image names (without extension) relative to 'Click_image/'.
+            confidence (float, optional): The minimum match score. Defaults to 0.92.
+            region (tuple, optional): (left, top, width, height) to search instead of
+                                      the whole screen.
+            match_backend (str, optional): 'full' for an exact full-resolution search
+                                           (default) or 'pyramid' for a faster
+                                           coarse-to-fine search on large screens.
+
+        Returns:
+            dict or None: The best match across all images and variants ('image',
+                          'variant', 'score', 'x', 'y' centre, 'left', 'top',
+                          'width', 'height'), or None if nothing was found.
+        """
+        templates = [(name, self._load_template(name)) for name in image_names]
+        # The template files' mtimes let the hit memory drop spots recorded for an older image.
+        stamps = {name: template_cache.template_stamp(self.click_image_folder_path, name) for name in image_names}
+        try:
+            return self.matcher.locate(templates, float(confidence), region, match_backend, stamps)
+        except OSError as e:
+            # e.g. the screen cannot be grabbed while the session is locked.
+            self.context.add_log(f"{self.log_prefix} Screen capture failed: {e}")
+            return None
+
+    def _wait_image(self, image_to_click, timeout, appear, match_backend=BACKEND_FULL):
+        """Waits until an image appears (appear=True) or disappears, at the 0.98 confidence of _check_item_existing.
+
+        Unchanged screens are not matched again and the polling slows down while
+        nothing changes, so long waits no longer keep a CPU core busy.
+
+        Returns:
+            bool: True if the condition was met within the timeout.
+        """
+        templates = [(image_to_click, self._load_template(image_to_click))]
+        stamps = {image_to_click: template_cache.template_stamp(self.click_image_folder_path, image_to_click)}
+        met, _ = self.matcher.wait(templates, 0.98, float(timeout), appear, match_backend, stamps)
+        return met
+
+    def find_image(self, image_to_click, confidence=0.92, match_backend=BACKEND_FULL):
+        """Finds the best on-screen match for an image, or for any image in a comma-separated list.
+
+        Args:
+            image_to_click (str): One image name, or several separated by commas.
+            confidence (float, optional): The minimum match score. Defaults to 0.92.
+            match_backend (str, optional): 'full' for an exact full-resolution search
+                                           (default) or 'pyramid' for a faster
+                                           coarse-to-fine search on large screens.
+
+        Returns:
+            dict or None: The best match with its 'image', 'variant', 'score' and
+                          centre 'x'/'y', or None if no image was found.
+        """
+        image_names = [img.strip() for img in image_to_click.split(',') if img.strip()]
+        match = self._locate(image_names, confidence, match_backend=match_backend)
+        if match is not None:
+            self.context.add_log(f"Image found: {match['image']} ({match['variant']}, score {match['score']:.3f}) at ({match['x']}, {match['y']})")
+        else:
+            self.context.add_log(f"Image not found: {image_to_click}")
+        return match
+
     def text_located(self,im):
         """Locates an image on the screen and moves the mouse cursor to it.
 
@@ -176,7 +283,7 @@ class Bot_utility:
             pyautogui.moveTo(location.x, location.y)
         return location
         
-    def _check_item_existing(self,image_to_click):
+    def _check_item_existing(self,image_to_click,match_backend=BACKEND_FULL):
         """Checks if a specific UI element (as an image) exists on the screen.
 
         This private helper method reads a base64 encoded image from a specified
@@ -189,20 +296,7 @@ class Bot_utility:
         Returns:
             bool: True if the image is found on the screen, False otherwise.
         """
-        full_path_without_ext = os.path.join(self.click_image_folder_path, image_to_click)
-        full_path_with_ext = full_path_without_ext + ".txt"
-        with open(full_path_with_ext) as json_file:
-            image_file = json.load(json_file)
-        for key, data in image_file.items():
-            img_obj = self._base64_pgn(data)
-            location=None
-            try:
-                location= pyautogui.locateCenterOnScreen(img_obj,grayscale=True, confidence=0.98)
-            except:
-                pass
-            if location!=None:
-                return True
-        return False
+        return self._locate([image_to_click], confidence=0.98, match_backend=match_backend) is not None
         
     def check_picture_list(self, picture_list_str: str) -> bool:
         """
@@ -225,7 +319,7 @@ class Bot_utility:
         self.context.add_log(f"None of the pictures in the list '{picture_list_str}' were found.")
         return False
         
-    def left_click(self,image_to_click,offset_x=0,offset_y=0,confidence=0.92,stop_if_not_found=False):
+    def left_click(self,image_to_click,offset_x=0,offset_y=0,confidence=0.92,stop_if_not_found=False,match_backend=BACKEND_FULL):
         """Finds a UI element (as an image) on the screen and performs a left click.
 
         Args:
@@ -236,32 +330,22 @@ class Bot_utility:
                                       to click. Defaults to 0.
             confidence (float, optional): The confidence level for the image recognition.
                                           Defaults to 0.92.
+            match_backend (str, optional): 'full' for an exact full-resolution search
+                                           (default) or 'pyramid' for a faster
+                                           coarse-to-fine search on large screens.
 
         Returns:
             str: A status message, 'left_click_done' on success or a failure message
                  if the image could not be found.
         """
-        location=None
         file_name= image_to_click
-        full_path_without_ext = os.path.join(self.click_image_folder_path, image_to_click)
-        full_path_with_ext = full_path_without_ext + ".txt"
-        confidence = float(confidence)
-        with open(full_path_with_ext) as json_file:
-            
-            image_file = json.load(json_file)
-        for key, data in image_file.items():
-            img_obj = self._base64_pgn(data)
-            try:
-                location= pyautogui.locateCenterOnScreen(img_obj,grayscale=True, confidence=confidence)
-                if location!=None:
-                    pyautogui.click(location.x + int(offset_x), location.y + int(offset_y))
-                    self.context.add_log(f"Image found: {file_name}")
-                    self.context.send_click_status(f"Image found: {file_name}")
-                    return 'left_click_done'
-            except:
-                pass
-        
-        if location is None:
+        location = self._locate([image_to_click], confidence, match_backend=match_backend)
+        if location is not None:
+            pyautogui.click(location["x"] + int(offset_x), location["y"] + int(offset_y))
+            self.context.add_log(f"Image found: {file_name} (score {location['score']:.3f})")
+            self.context.send_click_status(f"Image found: {file_name}")
+            return 'left_click_done'
+        else:
             self.context.send_click_status(f"Image not found: {file_name}")
             self.context.add_log(f"Image not found: {file_name}")
 
@@ -269,7 +353,7 @@ class Bot_utility:
             raise Exception ("Image not found")
         return 'left_click_done fail: {}'.format(file_name)
         
-    def right_click(self,image_to_click,offset_x=0,offset_y=0,confidence=0.92):
+    def right_click(self,image_to_click,offset_x=0,offset_y=0,confidence=0.92,match_backend=BACKEND_FULL):
         """Finds a UI element (as an image) on the screen and performs a right click.
 
         Args:
@@ -280,34 +364,25 @@ class Bot_utility:
                                       to click. Defaults to 0.
             confidence (float, optional): The confidence level for the image recognition.
                                           Defaults to 0.92.
+            match_backend (str, optional): 'full' for an exact full-resolution search
+                                           (default) or 'pyramid' for a faster
+                                           coarse-to-fine search on large screens.
 
         Returns:
             str: A status message, 'left_click_done' on success or a failure message
                  if the image could not be found.
         """
-        location=None
         file_name= image_to_click
-        full_path_without_ext = os.path.join(self.click_image_folder_path, image_to_click)
-        full_path_with_ext = full_path_without_ext + ".txt"
-
-        with open(full_path_with_ext) as json_file:
-            
-            image_file = json.load(json_file)
-        for key, data in image_file.items():
-            img_obj = self._base64_pgn(data)
-            try:
-                location= pyautogui.locateCenterOnScreen(img_obj,grayscale=True, confidence=confidence)
-                if location!=None:
-                    pyautogui.rightClick(location.x + int(offset_x), location.y + int(offset_y))
-                    self.context.add_log(f"Image found: {file_name}")
-                    return 'right_click_done'
-            except:
-                pass
-        if location is None:
+        location = self._locate([image_to_click], confidence, match_backend=match_backend)
+        if location is not None:
+            pyautogui.rightClick(location["x"] + int(offset_x), location["y"] + int(offset_y))
+            self.context.add_log(f"Image found: {file_name} (score {location['score']:.3f})")
+            return 'right_click_done'
+        else:
             self.context.add_log(f"Image not found: {file_name}")
         return 'right_click_done fail: {}'.format(file_name)
         
-    def double_click(self,image_to_click,offset_x=0,offset_y=0,confidence=0.92):
+    def double_click(self,image_to_click,offset_x=0,offset_y=0,confidence=0.92,match_backend=BACKEND_FULL):
         """Finds a UI element (as an image) on the screen and performs a right click.
 
         Args:
@@ -318,64 +393,45 @@ class Bot_utility:
                                       to click. Defaults to 0.
             confidence (float, optional): The confidence level for the image recognition.
                                           Defaults to 0.92.
+            match_backend (str, optional): 'full' for an exact full-resolution search
+                                           (default) or 'pyramid' for a faster
+                                           coarse-to-fine search on large screens.
 
         Returns:
             str: A status message, 'left_click_done' on success or a failure message
                  if the image could not be found.
         """
-        location=None
         file_name= image_to_click
-        full_path_without_ext = os.path.join(self.click_image_folder_path, image_to_click)
-        full_path_with_ext = full_path_without_ext + ".txt"
-
-        with open(full_path_with_ext) as json_file:
-            
-            image_file = json.load(json_file)
-        for key, data in image_file.items():
-            img_obj = self._base64_pgn(data)
-            try:
-                location= pyautogui.locateCenterOnScreen(img_obj,grayscale=True, confidence=confidence)
-                if location!=None:
-                    pyautogui.doubleClick(location.x + int(offset_x), location.y + int(offset_y))
-                    self.context.add_log(f"Image found: {file_name}")
-                    return 'double_click_done'
-            except:
-                pass
-        if location is None:
+        location = self._locate([image_to_click], confidence, match_backend=match_backend)
+        if location is not None:
+            pyautogui.doubleClick(location["x"] + int(offset_x), location["y"] + int(offset_y))
+            self.context.add_log(f"Image found: {file_name} (score {location['score']:.3f})")
+            return 'double_click_done'
+        else:
             self.context.add_log(f"Image not found: {file_name}")
         return 'double_click fail: {}'.format(file_name)      
-    def get_image_location(self,image_to_click,offset_x=0,offset_y=0,confidence=0.92):
+    def get_image_location(self,image_to_click,offset_x=0,offset_y=0,confidence=0.92,match_backend=BACKEND_FULL):
         """ Find and return image location
         """
-        location=None
         file_name= image_to_click
-        full_path_without_ext = os.path.join(self.click_image_folder_path, image_to_click)
-        full_path_with_ext = full_path_without_ext + ".txt"
-
-        with open(full_path_with_ext) as json_file:
-            
-            image_file = json.load(json_file)
-        for key, data in image_file.items():
-            img_obj = self._base64_pgn(data)
-            try:
-                location= pyautogui.locateCenterOnScreen(img_obj,grayscale=True, confidence=confidence)
-                if location!=None:
-                    self.context.add_log(f"Image found: {file_name}")
-                    self.context.send_click_status(f"Image found: {file_name}")
-                    return location
-            except:
-                pass
-        if location is None:
+        location = self._locate([image_to_click], confidence, match_backend=match_backend)
+        if location is not None:
+            self.context.add_log(f"Image found: {file_name} (score {location['score']:.3f})")
+            self.context.send_click_status(f"Image found: {file_name}")
+            return pyautogui.Point(location["x"], location["y"])
+        else:
             self.context.send_click_status(f"Image not found: {file_name}")
             self.context.add_log(f"Image not found: {file_name}")
         return None
 
-    def image_action_advanced(self, window_title, image_to_click, action_type="Left Click", waiting_time=0.5, timeout=10, exit_if_found=True):
+    def image_action_advanced(self, window_title, image_to_click, action_type="Left Click", waiting_time=0.5, timeout=10, exit_if_found=True, match_backend=BACKEND_FULL):
         """
         Unified Advanced Action:
         1. Activate window (if title provided)
         2. Wait 500ms stabilization
         3. Perform specified action (Click, Wait, etc.)
+
+        match_backend selects 'full' (default) or 'pyramid' image matching.
         """
         if window_title:
             self.activate_window(window_title)
@@ -384,19 +440,32 @@ class Bot_utility:
         all_image_files = [img.strip() for img in image_to_click.split(',') if img.strip()]
         found_any = False
         
+        if exit_if_found and action_type in ["Left Click", "Right Click", "Double Click"]:
+            # Match every image in the list against one capture and act on the best hit.
+            match = self._locate(all_image_files, confidence=0.92, match_backend=match_backend)
+            if match is None:
+                self.context.send_click_status(f"Image not found: {image_to_click}")
+                self.context.add_log(f"Image not found: {image_to_click}")
+                return 'fail'
+            click = {"Left Click": pyautogui.click, "Right Click": pyautogui.rightClick, "Double Click": pyautogui.doubleClick}[action_type]
+            click(match["x"], match["y"])
+            self.context.add_log(f"Image found: {match['image']} (score {match['score']:.3f})")
+            self.context.send_click_status(f"Image found: {match['image']}")
+            return 'done'
+        
         for img_name in all_image_files:
             res = 'fail'
             if action_type == "Left Click":
-                res = self.left_click(img_name, confidence=0.92)
+                res = self.left_click(img_name, confidence=0.92, match_backend=match_backend)
             elif action_type == "Right Click":
-                res = self.right_click(img_name, confidence=0.92)
+                res = self.right_click(img_name, confidence=0.92, match_backend=match_backend)
             elif action_type == "Double Click":
-                res = self.double_click(img_name, confidence=0.92)
+                res = self.double_click(img_name, confidence=0.92, match_backend=match_backend)
             elif action_type == "Wait Appear":
-                exists = self.check_image_exits(img_name, timeout=timeout)
+                exists = self.check_image_exits(img_name, timeout=timeout, match_backend=match_backend)
                 res = 'done' if exists else 'fail'
             elif action_type == "Wait Disappear":
-                disappeared = self.wait_image_disappear(img_name, timeout=timeout)
+                disappeared = self.wait_image_disappear(img_name, timeout=timeout, match_backend=match_backend)
                 res = 'done' if disappeared else 'fail'
             
             # Check for various success strings
@@ -412,26 +481,13 @@ class Bot_utility:
     def left_click_cross_2_images(self,image_to_click_x,image_to_click_y,offset_x=0,offset_y=0,confidence=0.92):
         """ Find and return image location
         """
-        location=None
         x_position=None
         file_name= image_to_click_x
-        full_path_without_ext = os.path.join(self.click_image_folder_path, image_to_click_x)
-        full_path_with_ext = full_path_without_ext + ".txt"
-
-        with open(full_path_with_ext) as json_file:
-            
-            image_file = json.load(json_file)
-        for key, data in image_file.items():
-            img_obj = self._base64_pgn(data)
-            try:
-                location= pyautogui.locateCenterOnScreen(img_obj,grayscale=True, confidence=confidence)
-                if location!=None:
-                    self.context.add_log(f"Image found: {file_name}")
-                    self.context.send_click_status(f"Image found: {file_name}")
-                    x_position = location.x
-                    break
-            except:
-                pass
+        location = self._locate([image_to_click_x], confidence)
+        if location is not None:
+            self.context.add_log(f"Image found: {file_name}")
+            self.context.send_click_status(f"Image found: {file_name}")
+            x_position = location["x"]
         if x_position is None:
             self.context.send_click_status(f"Image not found: {file_name}")
             self.context.add_log(f"Image not found: {file_name}")
@@ -439,26 +495,13 @@ class Bot_utility:
 
 
 
-        location=None
         y_position=None
         file_name= image_to_click_y
-        full_path_without_ext = os.path.join(self.click_image_folder_path, image_to_click_y)
-        full_path_with_ext = full_path_without_ext + ".txt"
-
-        with open(full_path_with_ext) as json_file:
-            
-            image_file = json.load(json_file)
-        for key, data in image_file.items():
-            img_obj = self._base64_pgn(data)
-            try:
-                location= pyautogui.locateCenterOnScreen(img_obj,grayscale=True, confidence=confidence)
-                if location!=None:
-                    self.context.add_log(f"Image found: {file_name}")
-                    self.context.send_click_status(f"Image found: {file_name}")
-                    y_position = location.y
-                    break
-            except:
-                pass
+        location = self._locate([image_to_click_y], confidence)
+        if location is not None:
+            self.context.add_log(f"Image found: {file_name}")
+            self.context.send_click_status(f"Image found: {file_name}")
+            y_position = location["y"]
         if y_position is None:
             self.context.send_click_status(f"Image not found: {file_name}")
             self.context.add_log(f"Image not found: {file_name}")
@@ -577,18 +620,16 @@ class Bot_utility:
             str: 'window_closed' if the window closes within the timeout period,
                  'window_not_close' otherwise.
         """
-        start_time = time.time()
-        
-        while int(time.time()-start_time) < timeout:
+        backoff = AdaptiveBackoff(timeout)
+        last_windows = None
+        while True:
             all_window = gw.getAllTitles()
-            result =  'window_closed'
-            for each_window in all_window:
-                if window_name in each_window:
-                    result =  'window_not_close'
-                    break # exit for look, get list of windows again
-            if result !=  'window_not_close':
-                return 'window_closed'  
-        return 'window_not_close'
+            if not any(window_name in each_window for each_window in all_window):
+                return 'window_closed'
+            # Poll quickly while windows come and go, slower while nothing changes.
+            if not backoff.wait(all_window != last_windows):
+                return 'window_not_close'
+            last_windows = all_window
     
     def check_win_title_exits(self,title,timeout=5):
         """Checks if a window with a specific title exists, waiting up to a timeout.
@@ -601,21 +642,17 @@ class Bot_utility:
             bool: True if a window with the matching title is found within the
                   timeout, False otherwise.
         """
-        win = None
-        st = time.time()
-        time_run=0
-        while win is None and time_run<timeout:
+        backoff = AdaptiveBackoff(timeout)
+        last_windows = None
+        while True:
             all_window = gw.getAllTitles()
-            for each_window in all_window:
-                if title in each_window:
-                    win = each_window
-            if win !=None:
+            if any(title in each_window for each_window in all_window):
                 return True
-            ed = time.time()
-            time_run = ed-st
-        return False    
+            if not backoff.wait(all_window != last_windows):
+                return False
+            last_windows = all_window
         
-    def check_image_exits(self,image_to_click,timeout=5):
+    def check_image_exits(self,image_to_click,timeout=5,match_backend=BACKEND_FULL):
         """Waits for a specific image to appear on the screen.
 
         This method repeatedly checks for the presence of an image until it is found
@@ -625,6 +662,9 @@ class Bot_utility:
             image_to_click (str): The name of the image file (without extension) to wait for.
             timeout (int, optional): The maximum time in seconds to wait for the image.
                                      Defaults to 5.
+            match_backend (str, optional): 'full' for an exact full-resolution search
+                                           (default) or 'pyramid' for a faster
+                                           coarse-to-fine search on large screens.
 
         Returns:
             bool: True if the image appears on screen within the timeout, False otherwise.
@@ -632,20 +672,13 @@ class Bot_utility:
         
         
         
-        win = False
-        st = time.time()
-        time_run=0
         self.context.add_log(f"{image_to_click}")
-        while win is False and time_run<timeout:
-            win = self._check_item_existing(image_to_click)
-            if win !=False:
-                time.sleep(1)
-                return True
-            ed = time.time()
-            time_run = ed-st
+        if self._wait_image(image_to_click, timeout, True, match_backend):
+            time.sleep(1)
+            return True
         return False        
                 
-    def wait_image_disappear(self,image_to_click,timeout=5):
+    def wait_image_disappear(self,image_to_click,timeout=5,match_backend=BACKEND_FULL):
         """Waits for a specific image to disappear from the screen.
 
         This method repeatedly checks for an image, returning True as soon as it is
@@ -654,23 +687,17 @@ class Bot_utility:
         Args:
             current_file (str): The name of the image file (without extension) to monitor.
             timeout (int, optional): The maximum time in seconds to wait. Defaults to 5.
+            match_backend (str, optional): 'full' for an exact full-resolution search
+                                           (default) or 'pyramid' for a faster
+                                           coarse-to-fine search on large screens.
 
         Returns:
             bool: True if the image disappears from the screen within the timeout,
                   False otherwise.
         """
     
-        win = True
-        st = time.time()
-        time_run=0
         self.context.add_log(f"{image_to_click}")
-        while win is True and time_run<timeout:
-            win = self._check_item_existing(image_to_click)
-            if win ==False:
-                return True
-            ed = time.time()
-            time_run = ed-st
-        return False 
+        return self._wait_image(image_to_click, timeout, False, match_backend)
 
     def wait_ms(self,value):
         """Pauses the execution for a specified number of milliseconds.
@@ -711,26 +738,13 @@ class Bot_utility:
     def check_image_in_cross_2_images(self,image_to_click_x,image_to_click_y,check_image,confidence=0.92,padding=10,timeout=5):
         """ Find and return image location
         """
-        location=None
         x_position=None
         file_name= image_to_click_x
-        full_path_without_ext = os.path.join(self.click_image_folder_path, image_to_click_x)
-        full_path_with_ext = full_path_without_ext + ".txt"
-
-        with open(full_path_with_ext) as json_file:
-            
-            image_file = json.load(json_file)
-        for key, data in image_file.items():
-            img_obj = self._base64_pgn(data)
-            try:
-                location= pyautogui.locateCenterOnScreen(img_obj,grayscale=True, confidence=confidence)
-                if location!=None:
-                    self.context.add_log(f"Image found: {file_name}")
-                    self.context.send_click_status(f"Image found: {file_name}")
-                    x_position = location.x
-                    break
-            except:
-                pass
+        location = self._locate([image_to_click_x], confidence)
+        if location is not None:
+            self.context.add_log(f"Image found: {file_name}")
+            self.context.send_click_status(f"Image found: {file_name}")
+            x_position = location["x"]
         if x_position is None:
             self.context.send_click_status(f"Image not found: {file_name}")
             self.context.add_log(f"Image not found: {file_name}")
@@ -738,26 +752,13 @@ class Bot_utility:
 
 
 
-        location=None
         y_position=None
         file_name= image_to_click_y
-        full_path_without_ext = os.path.join(self.click_image_folder_path, image_to_click_y)
-        full_path_with_ext = full_path_without_ext + ".txt"
-
-        with open(full_path_with_ext) as json_file:
-            
-            image_file = json.load(json_file)
-        for key, data in image_file.items():
-            img_obj = self._base64_pgn(data)
-            try:
-                location= pyautogui.locateCenterOnScreen(img_obj,grayscale=True, confidence=confidence)
-                if location!=None:
-                    self.context.add_log(f"Image found: {file_name}")
-                    self.context.send_click_status(f"Image found: {file_name}")
-                    y_position = location.y
-                    break
-            except:
-                pass
+        location = self._locate([image_to_click_y], confidence)
+        if location is not None:
+            self.context.add_log(f"Image found: {file_name}")
+            self.context.send_click_status(f"Image found: {file_name}")
+            y_position = location["y"]
         if y_position is None:
             self.context.send_click_status(f"Image not found: {file_name}")
             self.context.add_log(f"Image not found: {file_name}")
@@ -791,34 +792,25 @@ class Bot_utility:
         loop=0
         mouse_x, mouse_y = x_position ,y_position
         file_name= check_image
-        full_path_without_ext = os.path.join(self.click_image_folder_path, file_name)
-        full_path_with_ext = full_path_without_ext + ".txt"    
         location=None
         while loop<timeout:
             loop+=1
             
-            with open(full_path_with_ext) as json_file:
-                image_file_dict = json.load(json_file)
-            
-            found_in_loop = False
-            for key, data in image_file_dict.items():
-                img_obj = self._base64_pgn(data)
-                
-                img_width, img_height = img_obj.size
-                region_width = img_width + (padding * 2)
-                region_height = img_height + (padding * 2)
-                search_left = mouse_x - (region_width // 2)
-                search_top = mouse_y - (region_height // 2)                
-                search_left = max(0, search_left)
-                search_top = max(0, search_top)    
-                search_region = (search_left, search_top, region_width, region_height)                
-                try:
-                    location = pyautogui.locateOnScreen(img_obj, region=search_region, confidence=float(confidence))
-                    if location!=None:
-                        self.context.add_log(f"Image found in region: {file_name}")
-                        return True
-                except:
-                    pass
+            variants = self._load_template(file_name)
+            # One region large enough for the biggest variant, captured once per attempt.
+            img_height = max((img.shape[0] for _, img in variants), default=0)
+            img_width = max((img.shape[1] for _, img in variants), default=0)
+            region_width = img_width + (padding * 2)
+            region_height = img_height + (padding * 2)
+            search_left = mouse_x - (region_width // 2)
+            search_top = mouse_y - (region_height // 2)                
+            search_left = max(0, search_left)
+            search_top = max(0, search_top)    
+            search_region = (search_left, search_top, region_width, region_height)                
+            location = self._locate([file_name], confidence, region=search_region)
+            if location!=None:
+                self.context.add_log(f"Image found in region: {file_name}")
+                return True
             
             time.sleep(0.5)
             
@@ -409,6 +409,15 @@ class Local_AI_API:
             **kwargs
         )
 
+    def _without_page_report(self, result: Any) -> Any:
+        """Drops the server's per-page report from PDF results, so the variable keeps the usual shape."""
+        if isinstance(result, dict) and "pages" in result:
+            pages = result.pop("pages")
+            for page in pages if isinstance(pages, list) else []:
+                if isinstance(page, dict) and page.get("error"):
+                    self._log(f"Page {page.get('page')}: {page['error']}")
+        return result
+
     def _call_local_ai_api(self, context: ExecutionContext, config_data: dict) -> pd.DataFrame:
         self.context = context
         
@@ -485,7 +494,7 @@ class Local_AI_API:
                     files = {"file": (os.path.basename(file_path), f)}
                     response = requests.post(full_url, files=files, timeout=300)
                 response.raise_for_status()
-                result_data = json.dumps(response.json(), ensure_ascii=False, indent=2)
+                result_data = json.dumps(self._without_page_report(response.json()), ensure_ascii=False, indent=2)
 
             elif endpoint == "/invoice":
                 if not file_path or not os.path.exists(file_path): raise ValueError(f"File not found: {file_path}")
@@ -494,7 +503,7 @@ class Local_AI_API:
                     files = {"file": (os.path.basename(file_path), f)}
                     response = requests.post(full_url, data=data, files=files, timeout=300)
                 response.raise_for_status()
-                result_data = json.dumps(response.json(), ensure_ascii=False, indent=2)
+                result_data = json.dumps(self._without_page_report(response.json()), ensure_ascii=False, indent=2)
 
 
             elif endpoint == "/extract-product-from-text":
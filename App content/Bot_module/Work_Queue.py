@@ -0,0 +1,204 @@
+import os
+from typing import Any, List, Optional
+
+import pandas as pd
+
+from my_lib.shared_context import ExecutionContext as Context
+from my_lib.work_queue import SqliteWorkQueue, MssqlWorkQueue, WorkQueue
+
+
+class Work_Queue:
+    """
+    Steps to share one backlog of work items between several bots.
+
+    A bot opens a queue, claims a batch of items, works through them and marks
+    each one complete or failed. Claimed items are leased: if the bot dies,
+    the lease expires and another bot picks the item up again.
+    """
+
+    def __init__(self, context: Context):
+        """Initializes the Work_Queue class."""
+        self.context = context
+
+    def _log(self, message: str):
+        if self.context: self.context.add_log(message)
+        else: print(message)
+
+    @staticmethod
+    def _item_ids(items: Any) -> List[int]:
+        """Accepts a claimed-items DataFrame, a list of ids or a single id."""
+        if items is None:
+            return []
+        if isinstance(items, pd.DataFrame):
+            return [int(item_id) for item_id in items["id"].tolist()] if "id" in items.columns else []
+        if isinstance(items, pd.Series) and "id" in items.index:
+            return [int(items["id"])]
+        if isinstance(items, dict):
+            return [int(items["id"])]
+        if isinstance(items, (list, tuple, set)):
+            return [int(item["id"]) if isinstance(item, dict) else int(item) for item in items]
+        return [int(items)]
+
+    @staticmethod
+    def _check_queue(queue: Any) -> WorkQueue:
+        if not isinstance(queue, WorkQueue):
+            raise TypeError("The queue variable does not hold a work queue. Use 'open_sqlite_queue' or 'open_sql_server_queue' first.")
+        return queue
+
+    def open_sqlite_queue(self, database_file: str, queue_name: str = "default", table_name: str = "bot_work_queue"):
+        """
+        Opens (and creates if needed) a work queue in a local SQLite file.
+        Useful for testing, or for several bot processes on the same machine.
+
+        Args:
+            database_file (str): Path to the .db file, e.g. "D:/queues/po_backlog.db".
+            queue_name (str): Name of the queue; one table can hold several queues.
+            table_name (str): Table that stores the items.
+
+        Returns:
+            WorkQueue: The queue object; assign it to a variable for the other steps.
+        """
+        queue = SqliteWorkQueue(os.path.abspath(database_file), queue_name, table_name)
+        self._log(f"Opened work queue '{queue_name}' in {database_file} as worker {queue.worker_id}.")
+        return queue
+
+    def open_sql_server_queue(self, connection_engine, queue_name: str = "default", table_name: str = "bot_work_queue"):
+        """
+        Opens a work queue on SQL Server, creating the table on first use.
+
+        Args:
+            connection_engine: The engine variable created by the MS SQL Database step.
+            queue_name (str): Name of the queue; one table can hold several queues.
+            table_name (str): Table that stores the items.
+
+        Returns:
+            WorkQueue: The queue object; assign it to a variable for the other steps.
+        """
+        queue = MssqlWorkQueue(connection_engine, queue_name, table_name)
+        self._log(f"Opened work queue '{queue_name}' in table {table_name} as worker {queue.worker_id}.")
+        return queue
+
+    def add_items(self, queue, items, priority: int = 0):
+        """
+        Adds work items to the queue.
+
+        Args:
+            queue: The queue variable.
+            items: A DataFrame (one item per row) or a list of values.
+            priority (int): Higher priority items are claimed first.
+
+        Returns:
+            int: The number of items added.
+        """
+        queue = self._check_queue(queue)
+        if isinstance(items, pd.DataFrame):
+            payloads = items.to_dict("records")
+        elif isinstance(items, (list, tuple)):
+            payloads = list(items)
+        else:
+            payloads = [items]
+        added = queue.enqueue(payloads, priority)
+        self._log(f"Added {added} item(s) to work queue '{queue.queue_name}'.")
+        return added
+
+    def claim_items(self, queue, batch_size: int = 1, lease_seconds: int = 300):
+        """
+        Claims the next items for this bot in a single database round-trip.
+        Items whose lease has expired (their bot crashed) are claimed again.
+
+        Args:
+            queue: The queue variable.
+            batch_size (int): Maximum number of items to claim at once.
+            lease_seconds (int): How long the items stay reserved without a heartbeat.
+
+        Returns:
+            DataFrame: One row per claimed item with 'id', 'attempts' and the item's fields
+                       (or a 'payload' column for non-dict items). Empty when the queue is drained.
+        """
+        queue = self._check_queue(queue)
+        items = queue.claim(int(batch_size), int(lease_seconds))
+        rows = []
+        for item in items:
+            payload = item["payload"]
+            row = dict(payload) if isinstance(payload, dict) else {"payload": payload}
+            row["id"], row["attempts"] = item["id"], item["attempts"]
+            rows.append(row)
+        df = pd.DataFrame(rows)
+        if not df.empty:
+            df = df[["id", "attempts"] + [c for c in df.columns if c not in ("id", "attempts")]]
+        self._log(f"Claimed {len(df)} item(s) from work queue '{queue.queue_name}'.")
+        return df
+
+    def heartbeat_items(self, queue, items, lease_seconds: int = 300):
+        """
+        Extends the lease on items this bot is still working on.
+
+        Args:
+            queue: The queue variable.
+            items: The claimed-items DataFrame, a row of it, a list of ids or one id.
+            lease_seconds (int): New lease length from now.
+
+        Returns:
+            int: The number of items whose lease was extended.
+        """
+        queue = self._check_queue(queue)
+        item_ids = self._item_ids(items)
+        extended = queue.heartbeat(item_ids, int(lease_seconds))
+        if extended < len(item_ids):
+            self._log(f"WARNING: Lease lost on {len(item_ids) - extended} item(s); another bot may have reclaimed them.")
+        return extended
+
+    def complete_items(self, queue, items, result: Optional[str] = None):
+        """
+        Marks claimed items as done.
+
+        Args:
+            queue: The queue variable.
+            items: The claimed-items DataFrame, a row of it, a list of ids or one id.
+            result (str, optional): A result to store with the items.
+
+        Returns:
+            int: The number of items completed.
+        """
+        queue = self._check_queue(queue)
+        item_ids = self._item_ids(items)
+        completed = queue.complete(item_ids, result)
+        self._log(f"Completed {completed} of {len(item_ids)} item(s) in work queue '{queue.queue_name}'.")
+        if completed < len(item_ids):
+            self._log(f"WARNING: {len(item_ids) - completed} item(s) were no longer leased to this bot and were not completed.")
+        return completed
+
+    def fail_items(self, queue, items, error_message: str = "", retry: bool = True, max_attempts: int = 3):
+        """
+        Releases claimed items after an error.
+
+        Args:
+            queue: The queue variable.
+            items: The claimed-items DataFrame, a row of it, a list of ids or one id.
+            error_message (str): Stored with the items for troubleshooting.
+            retry (bool): Put the items back in the queue if they have attempts left.
+            max_attempts (int): Attempts after which an item is marked failed for good.
+
+        Returns:
+            int: The number of items released.
+        """
+        queue = self._check_queue(queue)
+        item_ids = self._item_ids(items)
+        released = queue.fail(item_ids, error_message, bool(retry), int(max_attempts))
+        self._log(f"Released {released} failed item(s) in work queue '{queue.queue_name}' (retry={retry}).")
+        return released
+
+    def get_queue_stats(self, queue):
+        """
+        Counts the items in each state.
+
+        Args:
+            queue: The queue variable.
+
+        Returns:
+            dict: {'pending': n, 'claimed': n, 'done': n, 'failed': n}
+        """
+        queue = self._check_queue(queue)
+        counts = queue.stats()
+        self._log(f"Work queue '{queue.queue_name}': {counts}")
+        return counts
@@ -0,0 +1,496 @@
+# ai_server_common.py
+# Parts of fast_flux_server.py that import no model library (mflux, torch, Whisper),
+# so they can be used and tested without those installed.
+import os
+import re
+import json
+import math
+import time
+import heapq
+import asyncio
+import hashlib
+import itertools
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# --- Admission control in front of Ollama ---
+# Lower runs first: a bot waiting on a click target goes ahead of a batch invoice job.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BATCH = 2
+ENDPOINT_PRIORITY = {
+    "/detect": PRIORITY_INTERACTIVE,
+    "/detect-precise": PRIORITY_INTERACTIVE,
+    "/locate-keywords": PRIORITY_INTERACTIVE,
+    "/ocr": PRIORITY_INTERACTIVE,
+    "/prompt": PRIORITY_NORMAL,
+    "/story": PRIORITY_NORMAL,
+    "/invoice": PRIORITY_BATCH,
+    "/extract-product": PRIORITY_BATCH,
+    "/extract-product-from-text": PRIORITY_BATCH,
+    "/extract-product-from-image": PRIORITY_BATCH,
+}
+# Calls Ollama runs at once per model, e.g. OLLAMA_MODEL_CONCURRENCY='{"qwen2.5vl:7b": 1, "llama3": 2}'
+MODEL_CONCURRENCY = json.loads(os.environ.get("OLLAMA_MODEL_CONCURRENCY", "{}"))
+DEFAULT_MODEL_CONCURRENCY = int(os.environ.get("OLLAMA_DEFAULT_CONCURRENCY", "2"))
+# Calls allowed to wait per model; beyond that new calls are rejected with 429
+MAX_QUEUE_PER_MODEL = int(os.environ.get("OLLAMA_MAX_QUEUE", "32"))
+# Seconds a call may wait for its turn before it is rejected with 503
+MAX_QUEUE_WAIT = float(os.environ.get("OLLAMA_MAX_QUEUE_WAIT", "120"))
+
+class ModelGate:
+    """
+    Lets at most 'limit' calls to one model run at once. Others wait in a
+    bounded queue ordered by priority, then arrival.
+    """
+    def __init__(self, model, limit, max_queue):
+        self.model = model
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters = []  # heap of [priority, sequence, future]
+        self._sequence = itertools.count()
+        # Moving average of how long one call holds a slot, for Retry-After hints
+        self.avg_service_s = 10.0
+
+    def queued(self):
+        return sum(1 for entry in self._waiters if not entry[2].done())
+
+    def retry_after(self):
+        """Rough seconds until a slot frees up for a new caller."""
+        return max(1, math.ceil(self.avg_service_s * (self.queued() + 1) / self.limit))
+
+    async def acquire(self, priority, timeout):
+        if self.active < self.limit and not self.queued():
+            self.active += 1
+            return
+        if self.queued() >= self.max_queue:
+            raise HTTPException(status_code=429, detail=f"Queue for model '{self.model}' is full ({self.max_queue} waiting).",
+                                headers={"Retry-After": str(self.retry_after())})
+        entry = [priority, next(self._sequence), asyncio.get_running_loop().create_future()]
+        heapq.heappush(self._waiters, entry)
+        try:
+            # The slot is handed over by release() setting the future's result.
+            await asyncio.wait_for(entry[2], timeout)
+        except asyncio.TimeoutError:
+            self._discard(entry)
+            raise HTTPException(status_code=503, detail=f"Model '{self.model}' is busy; waited {timeout:.0f}s without a free slot.",
+                                headers={"Retry-After": str(self.retry_after())})
+        except asyncio.CancelledError:
+            # The client went away. If the slot was granted in the meantime, pass it on.
+            if entry[2].done() and not entry[2].cancelled():
+                self.release()
+            self._discard(entry)
+            raise
+
+    def _discard(self, entry):
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    def release(self, service_s=None):
+        if service_s is not None:
+            self.avg_service_s = 0.8 * self.avg_service_s + 0.2 * service_s
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # the slot moves to this waiter; 'active' is unchanged
+                return
+        self.active -= 1
+
+class AdmissionController:
+    """
+    Per-model concurrency limits, priority queues and fast rejection for Ollama calls,
+    with queue depth and wait times recorded per endpoint.
+    """
+    def __init__(self):
+        self.gates = {}
+        self.endpoints = {}
+
+    def gate(self, model):
+        if model not in self.gates:
+            self.gates[model] = ModelGate(model, int(MODEL_CONCURRENCY.get(model, DEFAULT_MODEL_CONCURRENCY)), MAX_QUEUE_PER_MODEL)
+        return self.gates[model]
+
+    def _endpoint_stats(self, endpoint):
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = {"admitted": 0, "rejected_queue_full": 0, "rejected_timeout": 0,
+                                        "waiting": 0, "max_waiting": 0, "total_wait_s": 0.0, "max_wait_s": 0.0}
+        return self.endpoints[endpoint]
+
+    @asynccontextmanager
+    async def slot(self, model, endpoint):
+        gate = self.gate(model)
+        stats = self._endpoint_stats(endpoint)
+        priority = ENDPOINT_PRIORITY.get(endpoint, PRIORITY_NORMAL)
+        queued_at = time.monotonic()
+        stats["waiting"] += 1
+        stats["max_waiting"] = max(stats["max_waiting"], stats["waiting"])
+        try:
+            await gate.acquire(priority, MAX_QUEUE_WAIT)
+        except HTTPException as e:
+            stats["rejected_queue_full" if e.status_code == 429 else "rejected_timeout"] += 1
+            raise
+        finally:
+            stats["waiting"] -= 1
+        started = time.monotonic()
+        waited = started - queued_at
+        stats["admitted"] += 1
+        stats["total_wait_s"] += waited
+        stats["max_wait_s"] = max(stats["max_wait_s"], waited)
+        try:
+            yield
+        finally:
+            gate.release(time.monotonic() - started)
+
+    def stats(self):
+        return {
+            "models": {model: {"active": gate.active, "limit": gate.limit, "queued": gate.queued(), "max_queue": gate.max_queue,
+                               "avg_service_s": round(gate.avg_service_s, 2)}
+                       for model, gate in self.gates.items()},
+            "endpoints": {endpoint: {**{k: v for k, v in s.items() if k != "total_wait_s"},
+                                     "avg_wait_s": round(s["total_wait_s"] / s["admitted"], 3) if s["admitted"] else 0.0,
+                                     "max_wait_s": round(s["max_wait_s"], 3)}
+                          for endpoint, s in self.endpoints.items()},
+        }
+
+# --- Executors for local model work and image/PDF preprocessing ---
+# Flux, Whisper and VITS run in-process and hold the CPU/GPU for seconds to minutes; run inline in an
+# async handler they stall every other endpoint. Each kind of work gets its own small thread pool
+# with a bounded queue instead. 'workers' bounds the model memory in use at once, and
+# 'max_queued_mb' bounds the upload bytes held by waiting jobs. Override per executor, e.g.
+# LOCAL_EXECUTORS='{"flux": {"max_queue": 2}, "preprocess": {"workers": 2}}'
+LOCAL_EXECUTOR_DEFAULTS = {
+    "flux": {"workers": 1, "max_queue": 4, "max_queued_mb": 16},
+    "whisper": {"workers": 1, "max_queue": 8, "max_queued_mb": 512},
+    "tts": {"workers": 1, "max_queue": 16, "max_queued_mb": 16},
+    "preprocess": {"workers": max(1, min(4, (os.cpu_count() or 2) // 2)), "max_queue": 64, "max_queued_mb": 512},
+    # PyMuPDF objects must not be used from more than one thread, so fitz work stays on one thread
+    "pdf": {"workers": 1, "max_queue": 16, "max_queued_mb": 512},
+}
+LOCAL_EXECUTOR_CONFIG = json.loads(os.environ.get("LOCAL_EXECUTORS", "{}"))
+
+class LocalExecutor:
+    """
+    A thread pool for one kind of blocking work, with a bounded queue in front of it.
+    A job that would push the queue past max_queue jobs or max_queued_mb of input is
+    rejected with 429 and a Retry-After hint. Records queue depth, wait and busy time.
+    """
+    def __init__(self, name, workers, max_queue, max_queued_mb):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.max_queued_bytes = max_queued_mb * 1024 * 1024
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.queued_bytes = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_s = 0.0
+        self.total_wait_s = 0.0
+        self.avg_run_s = 1.0
+
+    @classmethod
+    def from_config(cls, name):
+        config = {**LOCAL_EXECUTOR_DEFAULTS[name], **LOCAL_EXECUTOR_CONFIG.get(name, {})}
+        if name == "pdf":
+            config["workers"] = 1
+        return cls(name, int(config["workers"]), int(config["max_queue"]), float(config["max_queued_mb"]))
+
+    def retry_after(self):
+        return max(1, math.ceil(self.avg_run_s * (self.queued + self.running + 1) / self.workers))
+
+    async def run(self, fn, *args, size_bytes=0):
+        """Runs fn(*args) on the pool and returns its result; size_bytes is the input the job holds while queued."""
+        with self._lock:
+            if self.queued >= self.max_queue or (self.queued and self.queued_bytes + size_bytes > self.max_queued_bytes):
+                self.rejected += 1
+                raise HTTPException(status_code=429, detail=f"The {self.name} queue is full ({self.queued} job(s) waiting).",
+                                    headers={"Retry-After": str(self.retry_after())})
+            self.queued += 1
+            self.queued_bytes += size_bytes
+        submitted = time.monotonic()
+
+        def job():
+            started = time.monotonic()
+            with self._lock:
+                self.queued -= 1
+                self.queued_bytes -= size_bytes
+                self.running += 1
+                self.total_wait_s += started - submitted
+            try:
+                return fn(*args)
+            finally:
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.busy_s += elapsed
+                    self.avg_run_s = 0.8 * self.avg_run_s + 0.2 * elapsed
+
+        future = self._pool.submit(job)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # The client went away; a job that had not started yet is dropped from the queue.
+            if future.cancelled():
+                with self._lock:
+                    self.queued -= 1
+                    self.queued_bytes -= size_bytes
+            raise
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "running": self.running, "queued": self.queued, "max_queue": self.max_queue,
+                    "queued_mb": round(self.queued_bytes / (1024 * 1024), 2), "completed": self.completed,
+                    "rejected": self.rejected, "busy_s": round(self.busy_s, 2), "avg_run_s": round(self.avg_run_s, 3),
+                    "avg_wait_s": round(self.total_wait_s / self.completed, 3) if self.completed else 0.0}
+
+# --- Response cache for the vision and extraction endpoints ---
+class ResponseCache:
+    """
+    Disk-backed LRU cache of Ollama replies, one JSON file per entry. The key is a
+    hash of the whole generate payload: model, prompt, the preprocessed images and
+    the generation options, so any change to one of them is a different entry.
+    Least recently used entries are evicted past the size limit, and entries older
+    than the TTL count as misses. Identical calls that arrive while the first is
+    still running wait for its answer instead of calling Ollama again. Only replies the
+    endpoint can use are kept, so a retry after a malformed answer asks the model again.
+    """
+    def __init__(self, directory, ttl, max_bytes, enabled=True):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._bytes = 0
+        self._in_flight = {}
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "stored": 0, "unusable": 0, "expired": 0, "evicted": 0}
+        self.endpoints = {}
+        if enabled:
+            self._load_index()
+
+    def _load_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, name[:-5], stat.st_size))
+        # A hit touches the file, so mtime order is LRU order across restarts.
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._bytes += size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    @staticmethod
+    def key_for(payload):
+        canonical = {k: v for k, v in payload.items() if k != "stream"}
+        return hashlib.sha256(json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def policy(http_request):
+        """
+        (read, write) for a request. 'Cache-Control: no-cache' skips the lookup but stores the
+        fresh answer; 'no-store' (or 'X-No-Cache: 1') leaves the cache out entirely.
+        """
+        if http_request is None:
+            return True, True
+        cache_control = http_request.headers.get("cache-control", "").lower()
+        if "no-store" in cache_control or http_request.headers.get("x-no-cache", "").lower() in ("1", "true", "yes"):
+            return False, False
+        return "no-cache" not in cache_control, True
+
+    def _count(self, endpoint, counter):
+        self.counters[counter] += 1
+        stats = self.endpoints.setdefault(endpoint, {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0})
+        if counter in stats:
+            stats[counter] += 1
+
+    def _read(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._forget(key)
+            return None
+        if time.time() - entry.get("created", 0) > self.ttl:
+            self._forget(key)
+            self.counters["expired"] += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return entry["reply"]
+
+    def _write(self, key, reply):
+        data = json.dumps({"created": time.time(), "reply": reply}, ensure_ascii=False).encode("utf-8")
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        evict = []
+        with self._lock:
+            self._bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._bytes -= size
+                evict.append(old_key)
+        for old_key in evict:
+            self._remove_file(old_key)
+        self.counters["stored"] += 1
+        self.counters["evicted"] += len(evict)
+
+    def _forget(self, key):
+        with self._lock:
+            self._bytes -= self._entries.pop(key, 0)
+        self._remove_file(key)
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def usable(self, reply, validate):
+        """
+        True if the reply may be cached: it has a non-empty 'response' and, if given,
+        validate(reply) (the endpoint's own parser) does not raise.
+        """
+        try:
+            if not isinstance(reply, dict) or not str(reply.get("response") or "").strip():
+                return False
+            if validate is not None:
+                validate(reply)
+            return True
+        except Exception:
+            self.counters["unusable"] += 1
+            return False
+
+    async def get_or_call(self, payload, endpoint, call, http_request=None, validate=None):
+        read, write = self.policy(http_request)
+        if not self.enabled or not read:
+            if self.enabled:
+                self._count(endpoint, "bypassed")
+            reply = await call()
+            if self.enabled and write and self.usable(reply, validate):
+                await self._store(self.key_for(payload), reply)
+            return reply
+        key = self.key_for(payload)
+        reply = await asyncio.to_thread(self._read, key)
+        if reply is not None:
+            self._count(endpoint, "hits")
+            return reply
+        if key in self._in_flight:
+            # Same call already running (a retry, an overlapping batch): share its answer.
+            reply = await asyncio.shield(self._in_flight[key])
+            if reply is not None:
+                self._count(endpoint, "coalesced")
+                return reply
+        self._count(endpoint, "misses")
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        reply = None
+        valid = False
+        try:
+            reply = await call()
+            valid = self.usable(reply, validate)
+        finally:
+            # On failure, or an unusable reply, waiters get None and make their own call.
+            future.set_result(reply if valid else None)
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+        if valid and write:
+            await self._store(key, reply)
+        return reply
+
+    async def _store(self, key, reply):
+        try:
+            await asyncio.to_thread(self._write, key, reply)
+        except OSError as e:
+            logger.warning(f"Response cache: could not store entry: {e}")
+
+    def stats(self):
+        lookups = self.counters["hits"] + self.counters["misses"] + self.counters["coalesced"]
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "size_mb": round(self._bytes / (1024 * 1024), 3),
+            "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "ttl_s": self.ttl,
+            **self.counters,
+            "hit_rate": round((self.counters["hits"] + self.counters["coalesced"]) / lookups, 3) if lookups else 0.0,
+            "endpoints": {endpoint: {**s, "hit_rate": round((s["hits"] + s["coalesced"]) / (s["hits"] + s["misses"] + s["coalesced"]), 3)
+                                     if s["hits"] + s["misses"] + s["coalesced"] else 0.0}
+                          for endpoint, s in self.endpoints.items()},
+        }
+
+# --- PDF pages ---
+def parse_page_ranges(spec, page_count):
+    """
+    '1-3,5,8-' -> [0, 1, 2, 4, 7, ..., page_count - 1] (0-based, in document order).
+    An empty spec selects every page; anything malformed or out of range raises HTTPException 400.
+    """
+    if not spec or not spec.strip():
+        return list(range(page_count))
+    selected = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        match = re.fullmatch(r"(\d*)\s*-\s*(\d*)|(\d+)", part)
+        if not match or part == "-":
+            raise HTTPException(status_code=400, detail=f"Invalid page range '{part}'; use e.g. '1-3,5'.")
+        if match.group(3):
+            first = last = int(match.group(3))
+        else:
+            first = int(match.group(1) or 1)
+            last = int(match.group(2) or page_count)
+        if first < 1 or last > page_count or first > last:
+            raise HTTPException(status_code=400, detail=f"Page range '{part}' is outside 1-{page_count}.")
+        selected.update(range(first - 1, last))
+    if not selected:
+        raise HTTPException(status_code=400, detail="No pages selected.")
+    return sorted(selected)
+
+def merge_invoice_pages(page_results):
+    """
+    Merges per-page extractions into one invoice: lists (line items) are concatenated in page
+    order, other fields keep the first non-empty value, except totals, where the last page that
+    has one wins (subtotals come before the grand total).
+    """
+    merged = {}
+    for data in page_results:
+        if not isinstance(data, dict):
+            continue
+        for key, value in data.items():
+            if isinstance(value, list):
+                merged.setdefault(key, [])
+                if isinstance(merged[key], list):
+                    merged[key].extend(value)
+            elif value not in ("", None, 0, 0.0) and (key not in merged or merged[key] in ("", None, 0, 0.0) or "total" in key):
+                merged[key] = value
+            elif key not in merged:
+                merged[key] = value
+    return merged
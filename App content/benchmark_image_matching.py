@@ -0,0 +1,145 @@
+import sys
+import os
+import time
+import argparse
+import random
+
+import numpy as np
+
+# Make sure my_lib resolves no matter where we are launched from.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(script_dir)
+
+from my_lib.template_cache import template_cache
+from my_lib.template_pack import list_template_names
+from my_lib.image_matcher import ImageMatcher, StoredFrameSource, BACKEND_FULL, BACKEND_PYRAMID
+
+# Compares the accuracy and latency of the image matching backends on the
+# templates stored in Click_image/. Each template is pasted at a random spot
+# into a synthetic screen cluttered with other templates, then looked up with
+# pyautogui's matcher (pyscreeze, if installed) and with ImageMatcher's
+# 'full' and 'pyramid' backends. Runs on any platform; no screen is needed.
+#
+#   python benchmark_image_matching.py
+#   python benchmark_image_matching.py --folder "SAP GUI" --width 3840 --height 2160 --limit 20
+
+
+def load_templates(click_image_dir, folder=None):
+    """Returns [(image name, variants)] for every readable template (.txt or pack) under Click_image/."""
+    templates = []
+    for name in list_template_names(click_image_dir):
+        if folder and not name.startswith(folder.rstrip("/") + "/"):
+            continue
+        try:
+            variants = template_cache.get_template(click_image_dir, name)
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        if variants:
+            templates.append((name, variants))
+    return templates
+
+
+def make_screen(width, height, clutter, rng):
+    """A light UI-like background (flat panels plus noise) with other templates pasted in as distractors."""
+    screen = np.full((height, width), 235, dtype=np.uint8)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        screen[y:y + rng.randrange(20, 300), x:x + rng.randrange(20, 600)] = rng.randrange(180, 256)
+    noise = np.random.default_rng(rng.randrange(1 << 30)).integers(-6, 7, screen.shape)
+    screen = np.clip(screen.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    for template in clutter:
+        paste(screen, template, rng)
+    return screen
+
+
+def paste(screen, template, rng):
+    height, width = template.shape
+    if height >= screen.shape[0] or width >= screen.shape[1]:
+        return None
+    left, top = rng.randrange(screen.shape[1] - width), rng.randrange(screen.shape[0] - height)
+    screen[top:top + height, left:left + width] = template
+    return left + width // 2, top + height // 2
+
+
+def pyscreeze_locate(screen, template, confidence):
+    """pyautogui's own matcher on the same frame, as the pre-ImageMatcher Bot_utility did it per variant."""
+    import pyscreeze
+    import PIL.Image
+    box = pyscreeze.locate(template, PIL.Image.fromarray(screen), grayscale=True, confidence=confidence)
+    return None if box is None else (box.left + box.width // 2, box.top + box.height // 2)
+
+
+def summarize(name, results):
+    if not results:
+        return
+    times = sorted(r[0] for r in results)
+    correct = sum(1 for r in results if r[1] == "ok")
+    missed = sum(1 for r in results if r[1] == "miss")
+    wrong = sum(1 for r in results if r[1] == "wrong")
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"{name:<10} lookups={len(results):<5} correct={correct:<5} missed={missed:<4} wrong={wrong:<4} "
+          f"mean={1000 * sum(times) / len(times):8.1f} ms   p95={1000 * p95:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image matching backends on Click_image templates.")
+    parser.add_argument("--click-image-dir", default=os.path.join(script_dir, "Click_image"))
+    parser.add_argument("--folder", default=None, help="Only use templates from this Click_image subfolder.")
+    parser.add_argument("--width", type=int, default=2560)
+    parser.add_argument("--height", type=int, default=1440)
+    parser.add_argument("--limit", type=int, default=0, help="Maximum number of templates (0 = all).")
+    parser.add_argument("--confidence", type=float, default=0.92)
+    parser.add_argument("--clutter", type=int, default=15, help="Distractor templates pasted into each screen.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    templates = load_templates(args.click_image_dir, args.folder)
+    if args.limit:
+        templates = templates[:args.limit]
+    if not templates:
+        print(f"No templates found in {args.click_image_dir}")
+        return 1
+    all_variants = [img for _, variants in templates for _, img in variants]
+    try:
+        import pyscreeze  # noqa: F401
+        backends = ["pyautogui", BACKEND_FULL, BACKEND_PYRAMID]
+    except ImportError:
+        print("pyscreeze is not installed; skipping the pyautogui column.")
+        backends = [BACKEND_FULL, BACKEND_PYRAMID]
+
+    print(f"{len(templates)} template(s), {len(all_variants)} variant(s), screen {args.width}x{args.height}, confidence {args.confidence}")
+    results = {backend: [] for backend in backends}
+    for name, variants in templates:
+        for variant, target in variants:
+            others = [img for img in all_variants if img is not target]
+            screen = make_screen(args.width, args.height, rng.sample(others, min(args.clutter, len(others))), rng)
+            expected = paste(screen, target, rng)
+            if expected is None:
+                continue
+            matcher = ImageMatcher(StoredFrameSource([screen]))
+            for backend in backends:
+                started = time.perf_counter()
+                if backend == "pyautogui":
+                    found = pyscreeze_locate(screen, target, args.confidence)
+                else:
+                    match = matcher.match_frame(screen, [(name, [(variant, target)])], args.confidence, backend=backend)
+                    found = None if match is None else (match["x"], match["y"])
+                elapsed = time.perf_counter() - started
+                if found is None:
+                    outcome = "miss"
+                elif abs(found[0] - expected[0]) <= 2 and abs(found[1] - expected[1]) <= 2:
+                    outcome = "ok"
+                else:
+                    outcome = "wrong"
+                results[backend].append((elapsed, outcome))
+
+    print()
+    for backend in backends:
+        summarize(backend, results[backend])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
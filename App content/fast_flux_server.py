@@ -2,12 +2,14 @@ import os
 import io
 import json
 import base64
+import asyncio
 import uvicorn
 import tempfile
 import shutil
-import requests
+import httpx
 import subprocess
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from fastapi.responses import Response
 from pydantic import BaseModel
 from mflux.models.flux.variants.txt2img.flux import Flux1
@@ -21,6 +23,8 @@ from PIL import Image
 import fitz  # PyMuPDF
 import re
 import logging
+from ai_server_common import (AdmissionController, LocalExecutor, LOCAL_EXECUTOR_DEFAULTS, ResponseCache,
+                              parse_page_ranges, merge_invoice_pages)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -83,10 +87,89 @@ def clean_html_noise(html):
     html = re.sub(r' +', ' ', html)
     return html.strip()
 
-app = FastAPI(title="Flux & Transcription AI API")
-
 # Configuration
-OLLAMA_BASE_URL = "http://localhost:11434"
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+# Seconds to wait for a connection to Ollama, and for a whole inference (vision models on CPU can take minutes)
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "10"))
+OLLAMA_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", "600"))
+# Pooled keep-alive connections to Ollama; requests beyond this wait for a free connection
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get("OLLAMA_MAX_CONNECTIONS", "32"))
+
+# One async client for the whole server, so handlers await Ollama instead of blocking the event loop
+http_client: httpx.AsyncClient | None = None
+
+@asynccontextmanager
+async def lifespan(app):
+    global http_client
+    http_client = httpx.AsyncClient(
+        base_url=OLLAMA_BASE_URL,
+        timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=OLLAMA_MAX_CONNECTIONS, max_keepalive_connections=OLLAMA_MAX_CONNECTIONS)
+    )
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+
+app = FastAPI(title="Flux & Transcription AI API", lifespan=lifespan)
+
+# --- Admission control in front of Ollama ---
+admission = AdmissionController()
+
+# --- Executors for local model work and image/PDF preprocessing ---
+executors = {name: LocalExecutor.from_config(name) for name in LOCAL_EXECUTOR_DEFAULTS}
+
+async def preprocess(image_bytes, **kwargs):
+    """resize_and_pad_image on the preprocess executor."""
+    return await executors["preprocess"].run(lambda: resize_and_pad_image(image_bytes, **kwargs), size_bytes=len(image_bytes))
+
+# --- Response cache for the vision and extraction endpoints ---
+# Bots resend the same screenshot, invoice or product text on retries and re-runs; a repeat is
+# answered from disk instead of costing another 5-60 s of model time. Off unless
+# RESPONSE_CACHE_ENABLED=1; entries go to ai_response_cache/ next to this file by default.
+RESPONSE_CACHE_DIR = os.environ.get("RESPONSE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_response_cache"))
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "0") in ("1", "true", "True")
+# Seconds an answer stays valid, and the total size the cache may use on disk
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+RESPONSE_CACHE_MAX_MB = float(os.environ.get("RESPONSE_CACHE_MAX_MB", "512"))
+
+response_cache = ResponseCache(RESPONSE_CACHE_DIR, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_MB * 1024 * 1024, RESPONSE_CACHE_ENABLED)
+
+async def ollama_generate(payload, endpoint, cache=False, http_request=None, validate=None):
+    """
+    Calls Ollama's /api/generate on the shared client and returns the decoded JSON reply.
+    The call waits for a slot on its model first; a full queue or a too-long wait raises
+    HTTPException 429/503 with a Retry-After header. With cache=True an identical earlier
+    call is answered from the response cache, before any slot is taken; the caller's
+    Cache-Control / X-No-Cache headers can opt out. validate(reply) should raise if the
+    endpoint cannot use the reply; such replies are returned but never cached.
+    """
+    async def call():
+        async with admission.slot(payload["model"], endpoint):
+            response = await http_client.post("/api/generate", json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    if not cache:
+        return await call()
+    return await response_cache.get_or_call(payload, endpoint, call, http_request, validate)
+
+def validate_json_reply(reply):
+    """Cache validator for endpoints that parse the model's answer with extract_json."""
+    extract_json(reply["response"])
+
+@app.get("/stats")
+async def server_stats():
+    """
+    Queue depth and wait times per endpoint, slot usage per model, response cache hit rates,
+    and queue depth and busy time of the local executors.
+    """
+    return {**admission.stats(), "cache": response_cache.stats(),
+            "executors": {name: executor.stats() for name, executor in executors.items()}}
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
 
 # Initialize models (Lazy loading)
 flux_model = None
@@ -180,44 +263,58 @@ def extract_json(text):
 
     raise ValueError(f"Cannot parse JSON or coordinates from: {text}")
 
+def run_flux(request):
+    """Runs on the flux executor."""
+    model = get_flux_model()
+    output = model.generate_image(
+        seed=request.seed,
+        prompt=request.prompt,
+        width=request.width,
+        height=request.height,
+        num_inference_steps=request.steps
+    )
+    pil_image = output.image
+    img_byte_arr = io.BytesIO()
+    pil_image.save(img_byte_arr, format='PNG')
+    return img_byte_arr.getvalue()
+
 @app.post("/generate")
 async def generate_image(request: GenerateRequest):
     try:
         print(f"Generating image for prompt: {request.prompt}")
-        model = get_flux_model()
-        output = model.generate_image(
-            seed=request.seed,
-            prompt=request.prompt,
-            width=request.width,
-            height=request.height,
-            num_inference_steps=request.steps
-        )
-        pil_image = output.image
-        img_byte_arr = io.BytesIO()
-        pil_image.save(img_byte_arr, format='PNG')
-        return Response(content=img_byte_arr.getvalue(), media_type="image/png")
+        png = await executors["flux"].run(run_flux, request, size_bytes=len(request.prompt))
+        return Response(content=png, media_type="image/png")
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error generating image: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def run_whisper(upload, suffix):
+    """Runs on the whisper executor."""
+    temp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+            shutil.copyfileobj(upload, tmp)
+            temp_path = tmp.name
+        return mlx_whisper.transcribe(temp_path, path_or_hf_repo="mlx-community/whisper-base-mlx")
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
 @app.post("/transcribe")
 async def transcribe_audio(file: UploadFile = File(...)):
-    temp_path = None
     try:
         _, suffix = os.path.splitext(file.filename)
         suffix = suffix.lower()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            temp_path = tmp.name
-        result = mlx_whisper.transcribe(temp_path, path_or_hf_repo="mlx-community/whisper-base-mlx")
+        result = await executors["whisper"].run(run_whisper, file.file, suffix, size_bytes=file.size or 0)
         return {"text": result["text"]}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Transcription error: {str(e)}")
-    finally:
-        if temp_path and os.path.exists(temp_path):
-            os.remove(temp_path)
 
 @app.post("/story")
 async def generate_story(request: StoryRequest):
@@ -225,14 +322,15 @@ async def generate_story(request: StoryRequest):
         words_str = ", ".join(request.words)
         prompt = f"Schreibe eine kurze, kreative Geschichte auf Deutsch, die die folgenden Wörter verwendet: {words_str}."
         ollama_payload = {"model": "llama3", "prompt": prompt, "stream": False}
-        response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=ollama_payload)
-        response.raise_for_status()
-        return {"story": response.json()["response"]}
+        result = await ollama_generate(ollama_payload, "/story")
+        return {"story": result["response"]}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Story generation error: {str(e)}")
 
-@app.post("/tts")
-async def text_to_speech(request: TTSRequest):
+def run_tts(request):
+    """Runs on the tts executor: VITS synthesis, then ffmpeg to MP3."""
     temp_wav = None
     temp_mp3 = None
     try:
@@ -249,112 +347,231 @@ async def text_to_speech(request: TTSRequest):
         scipy.io.wavfile.write(temp_wav, rate=model.config.sampling_rate, data=output_np)
         subprocess.run(["ffmpeg", "-y", "-i", temp_wav, "-codec:a", "libmp3lame", "-qscale:a", "2", temp_mp3], check=True, capture_output=True)
         with open(temp_mp3, "rb") as f:
-            return Response(content=f.read(), media_type="audio/mpeg")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"TTS error: {str(e)}")
+            return f.read()
     finally:
         for p in [temp_wav, temp_mp3]:
             if p and os.path.exists(p): os.remove(p)
 
+@app.post("/tts")
+async def text_to_speech(request: TTSRequest):
+    try:
+        mp3 = await executors["tts"].run(run_tts, request, size_bytes=len(request.text))
+        return Response(content=mp3, media_type="audio/mpeg")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"TTS error: {str(e)}")
+
+# PDF pages are rendered in order on the single-threaded "pdf" executor, and each page goes to
+# the model as soon as it is rendered. Pages of one PDF sent to the model at once (the model
+# gate still applies on top):
+PDF_PAGE_CONCURRENCY = max(1, int(os.environ.get("PDF_PAGE_CONCURRENCY", "4")))
+PDF_RENDER_ZOOM = float(os.environ.get("PDF_RENDER_ZOOM", "2"))
+# A page with at least this many characters of extractable text is read from its text layer
+# instead of being rendered for the vision model; most supplier PDFs are generated, not scanned.
+PDF_TEXT_MIN_CHARS = int(os.environ.get("PDF_TEXT_MIN_CHARS", "50"))
+# Text model that reads invoice pages taken from the text layer
+INVOICE_TEXT_MODEL = os.environ.get("INVOICE_TEXT_MODEL", "llama3")
+
+DEFAULT_INVOICE_PROMPT = (
+    "Please extract all data from the attached invoice/transaction statement into a structured JSON format.\n\n"
+    "Mandatory Requirements:\n"
+    "1. Translation: If the invoice is in a language other than English (e.g., Korean, Japanese, Vietnamese), "
+    "translate all extracted values—specifically product descriptions, company names, and storage locations—into English.\n"
+    "2. Completeness: Every field listed in the JSON structure below is mandatory. If a specific piece of data is not found, "
+    "populate it with an empty string (\"\").\n"
+    "3. Format: Ensure all quantities and amounts are represented as numbers (remove commas and currency symbols). "
+    "Dates should be in YYYY-MM-DD format.\n\n"
+    "JSON Structure:\n"
+    "{\n"
+    "  \"vendor_name\": \"...\",\n"
+    "  \"invoice_number\": \"...\",\n"
+    "  \"invoice_date\": \"...\",\n"
+    "  \"currency\": \"...\",\n"
+    "  \"line_items\": [\n"
+    "    {\n"
+    "      \"contract_no\": \"...\",\n"
+    "      \"product_model\": \"...\",\n"
+    "      \"description\": \"...\",\n"
+    "      \"quantity\": 0,\n"
+    "      \"unit_price\": 0.0,\n"
+    "      \"total_amount\": 0.0\n"
+    "    }\n"
+    "  ],\n"
+    "  \"total_invoice_amount\": 0.0\n"
+    "}\n\n"
+    "Return ONLY a JSON object."
+)
+
+def pdf_page_count(contents):
+    """Runs on the pdf executor, like every other use of fitz."""
+    pdf_document = fitz.open(stream=contents, filetype="pdf")
+    try:
+        return pdf_document.page_count
+    finally:
+        pdf_document.close()
+
+def page_text_layer(page):
+    """The page's extractable text, or None for image-only (scanned) pages."""
+    text = page.get_text("text").strip()
+    return text if len(text) >= PDF_TEXT_MIN_CHARS else None
+
+def render_pdf_pages(contents, page_indexes, on_page, use_text_layer=True):
+    """
+    Runs on the pdf executor: goes through the pages one by one and calls
+    on_page(index, png bytes, None) for rendered pages, or on_page(index, None, text) for pages
+    read from their text layer, so the caller can start on a page while the next one renders.
+    """
+    pdf_document = fitz.open(stream=contents, filetype="pdf")
+    try:
+        for index in page_indexes:
+            page = pdf_document[index]
+            text = page_text_layer(page) if use_text_layer else None
+            if text is not None:
+                on_page(index, None, text)
+                continue
+            pix = page.get_pixmap(matrix=fitz.Matrix(PDF_RENDER_ZOOM, PDF_RENDER_ZOOM))
+            on_page(index, pix.tobytes("png"), None)
+    finally:
+        pdf_document.close()
+
+async def process_pdf_pages(contents, pages, process_page, use_text_layer=True):
+    """
+    Feeds the selected pages ('1-3,5', None for all) to process_page(index, png bytes, text) as
+    they come off the render thread and returns (page count, results in page order). If one
+    page fails, the other page calls are cancelled so they give back their model slots.
+    """
+    loop = asyncio.get_running_loop()
+    page_count = await executors["pdf"].run(pdf_page_count, contents, size_bytes=len(contents))
+    page_indexes = parse_page_ranges(pages, page_count)
+    tasks = []
+
+    def on_page(index, img_bytes, text):
+        # Called on the render thread; the page's work starts on the event loop right away.
+        tasks.append(asyncio.run_coroutine_threadsafe(process_page(index, img_bytes, text), loop))
+
+    try:
+        await executors["pdf"].run(render_pdf_pages, contents, page_indexes, on_page, use_text_layer, size_bytes=len(contents))
+        return page_count, await asyncio.gather(*(asyncio.wrap_future(task) for task in tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
 @app.post("/ocr")
-async def extract_text(file: UploadFile = File(...)):
+async def extract_text(http_request: Request, file: UploadFile = File(...), pages: str | None = Form(None),
+                       text_layer: bool = Form(True)):
+    """
+    Reads the text of an image, or of a PDF page by page. PDF pages with a text layer are
+    returned as is; only image-only pages go to the vision model. For PDFs, 'pages' lists
+    each page's lines and the path used ('text_layer' or 'vision'), even for a single page.
+    """
     try:
         contents = await file.read()
-        contents, _, _, _, _, _, _, _ = resize_and_pad_image(contents)
-        image_base64 = base64.b64encode(contents).decode('utf-8')
-        ollama_payload = {
-            "model": "llava:7b-v1.6-mistral-q4_0",
-            "prompt": "Read all the text in this image line by line.",
-            "images": [image_base64],
-            "stream": False
-        }
-        response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=ollama_payload)
-        response.raise_for_status()
-        return {"text": [l.strip() for l in response.json()["response"].split('\n') if l.strip()]}
+        semaphore = asyncio.Semaphore(PDF_PAGE_CONCURRENCY)
+
+        async def read_page(index, img_bytes, text):
+            if text is not None:
+                return {"page": index + 1, "path": "text_layer", "text": [l.strip() for l in text.split('\n') if l.strip()]}
+            img_bytes, _, _, _, _, _, _, _ = await preprocess(img_bytes)
+            image_base64 = base64.b64encode(img_bytes).decode('utf-8')
+            ollama_payload = {
+                "model": "llava:7b-v1.6-mistral-q4_0",
+                "prompt": "Read all the text in this image line by line.",
+                "images": [image_base64],
+                "stream": False
+            }
+            async with semaphore:
+                result = await ollama_generate(ollama_payload, "/ocr", cache=True, http_request=http_request)
+            return {"page": index + 1, "path": "vision", "text": [l.strip() for l in result["response"].split('\n') if l.strip()]}
+
+        if file.filename.lower().endswith('.pdf'):
+            _, page_results = await process_pdf_pages(contents, pages, read_page, text_layer)
+            return {"text": [line for page in page_results for line in page["text"]], "pages": page_results}
+        return {"text": (await read_page(0, contents, None))["text"]}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OCR error: {str(e)}")
 
 @app.post("/invoice")
-async def process_invoice(file: UploadFile = File(...), prompt: str | None = Form(None)):
+async def process_invoice(http_request: Request, file: UploadFile = File(...), prompt: str | None = Form(None),
+                          pages: str | None = Form(None), text_layer: bool = Form(True)):
+    """
+    Extracts invoice data page by page. PDF pages with a text layer are sent as text to
+    INVOICE_TEXT_MODEL; the others are rendered in order and each is sent to the vision model
+    as soon as it is ready, up to PDF_PAGE_CONCURRENCY pages at once. 'pages' limits the run
+    to e.g. '1-3,5'. An image returns its extraction as is. For PDFs the per-page results are
+    merged into one invoice, and 'pages' lists the path each page took ('text_layer' or 'vision')
+    and any page that failed to parse, even when only one page was read.
+    """
     try:
         contents = await file.read()
-        images_base64 = []
-        
-        if file.filename.lower().endswith('.pdf'):
-            pdf_document = fitz.open(stream=contents, filetype="pdf")
-            for page in pdf_document:
-                # Convert page to high-quality PNG
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                img_bytes = pix.tobytes("png")
-                # Resize and pad
-                proc_bytes, _, _, _, _, _, _, _ = resize_and_pad_image(img_bytes)
-                images_base64.append(base64.b64encode(proc_bytes).decode('utf-8'))
-            pdf_document.close()
+        prompt = prompt or DEFAULT_INVOICE_PROMPT
+        semaphore = asyncio.Semaphore(PDF_PAGE_CONCURRENCY)
+
+        async def extract_page(index, img_bytes, text):
+            if text is not None:
+                path = "text_layer"
+                ollama_payload = {
+                    "model": INVOICE_TEXT_MODEL,
+                    "prompt": f"Invoice Text Content:\n{text}\n\n###\n\nINSTRUCTION:\n{prompt}",
+                    "stream": False,
+                    "format": "json"
+                }
+            else:
+                path = "vision"
+                proc_bytes, _, _, _, _, _, _, _ = await preprocess(img_bytes)
+                ollama_payload = {
+                    "model": "qwen2.5vl:7b",
+                    "prompt": prompt,
+                    "images": [base64.b64encode(proc_bytes).decode('utf-8')],
+                    "stream": False
+                }
+            async with semaphore:
+                result = await ollama_generate(ollama_payload, "/invoice", cache=True, http_request=http_request, validate=validate_json_reply)
+            try:
+                return {"page": index + 1, "path": path, "data": extract_json(result["response"])}
+            except ValueError as e:
+                return {"page": index + 1, "path": path, "error": str(e)}
+
+        is_pdf = file.filename.lower().endswith('.pdf')
+        if is_pdf:
+            page_count, page_results = await process_pdf_pages(contents, pages, extract_page, text_layer)
+            paths = [page["path"] for page in page_results]
+            print(f"Invoice extraction: {len(page_results)} of {page_count} pages, "
+                  f"{paths.count('text_layer')} from the text layer, {paths.count('vision')} with Qwen2.5-VL")
         else:
             # Handle standard image files
-            proc_bytes, _, _, _, _, _, _, _ = resize_and_pad_image(contents)
-            images_base64.append(base64.b64encode(proc_bytes).decode('utf-8'))
-
-        if not prompt:
-            prompt = (
-                "Please extract all data from the attached invoice/transaction statement into a structured JSON format.\n\n"
-                "Mandatory Requirements:\n"
-                "1. Translation: If the invoice is in a language other than English (e.g., Korean, Japanese, Vietnamese), "
-                "translate all extracted values—specifically product descriptions, company names, and storage locations—into English.\n"
-                "2. Completeness: Every field listed in the JSON structure below is mandatory. If a specific piece of data is not found, "
-                "populate it with an empty string (\"\").\n"
-                "3. Format: Ensure all quantities and amounts are represented as numbers (remove commas and currency symbols). "
-                "Dates should be in YYYY-MM-DD format.\n\n"
-                "JSON Structure:\n"
-                "{\n"
-                "  \"vendor_name\": \"...\",\n"
-                "  \"invoice_number\": \"...\",\n"
-                "  \"invoice_date\": \"...\",\n"
-                "  \"currency\": \"...\",\n"
-                "  \"line_items\": [\n"
-                "    {\n"
-                "      \"contract_no\": \"...\",\n"
-                "      \"product_model\": \"...\",\n"
-                "      \"description\": \"...\",\n"
-                "      \"quantity\": 0,\n"
-                "      \"unit_price\": 0.0,\n"
-                "      \"total_amount\": 0.0\n"
-                "    }\n"
-                "  ],\n"
-                "  \"total_invoice_amount\": 0.0\n"
-                "}\n\n"
-                "Return ONLY a JSON object."
-            )
+            print("Calling Qwen2.5-VL for invoice extraction (1 page)...")
+            page_results = [await extract_page(0, contents, None)]
 
-        ollama_payload = {
-            "model": "qwen2.5vl:7b",
-            "prompt": prompt,
-            "images": images_base64,
-            "stream": False
-        }
-        
-        print(f"Calling Qwen2.5-VL for invoice extraction ({len(images_base64)} pages)...")
-        response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=ollama_payload)
-        response.raise_for_status()
-        
-        return extract_json(response.json()["response"])
+        parsed = [page["data"] for page in page_results if "data" in page]
+        if not parsed:
+            raise ValueError(f"Cannot parse JSON from any page: {page_results[0].get('error') if page_results else 'no pages'}")
+        if not is_pdf:
+            return parsed[0]
+        merged = merge_invoice_pages(parsed)
+        # Only the per-page status; the data itself is already merged above
+        merged["pages"] = [{k: v for k, v in page.items() if k != "data"} for page in page_results]
+        return merged
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Invoice error: {str(e)}")
 
 @app.post("/detect")
-async def detect_objects(file: UploadFile = File(...), prompt: str | None = Form(None)):
+async def detect_objects(http_request: Request, file: UploadFile = File(...), prompt: str | None = Form(None)):
     try:
         contents = await file.read()
-        contents, orig_w, orig_h, canvas_w, canvas_h, scale, offset_x, offset_y = resize_and_pad_image(contents, ratio=(16, 9))
+        contents, orig_w, orig_h, canvas_w, canvas_h, scale, offset_x, offset_y = await preprocess(contents, ratio=(16, 9))
         image_base64 = base64.b64encode(contents).decode('utf-8')
         if not prompt: prompt = "Detect all visible UI elements."
         p = f"{prompt}. Return JSON list: [{{'label': '...', 'bbox': [xmin, ymin, xmax, ymax]}}]."
         payload = {"model": "qwen2.5vl:7b", "prompt": p, "images": [image_base64], "stream": False}
-        response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=payload)
-        response.raise_for_status()
-        raw = response.json()["response"]
+        raw = (await ollama_generate(payload, "/detect", cache=True, http_request=http_request, validate=validate_json_reply))["response"]
         parsed = extract_json(raw)
         if isinstance(parsed, dict): 
             for v in parsed.values(): 
@@ -377,26 +594,52 @@ async def detect_objects(file: UploadFile = File(...), prompt: str | None = Form
                     px = {"xmin": int((xmin-offset_x)/scale), "ymin": int((ymin-offset_y)/scale), "xmax": int((xmax-offset_x)/scale), "ymax": int((ymax-offset_y)/scale)}
                 elements.append({"label": label, "bbox_pixels": px})
         return {"elements": elements, "image_size": [orig_w, orig_h]}
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         print(f"[detect-precise] Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Stage-2 refinements /detect-precise runs at once per request (the model gate still applies on top)
+DETECT_PRECISE_CONCURRENCY = max(1, int(os.environ.get("DETECT_PRECISE_CONCURRENCY", "4")))
+# Set to a folder to keep the zoomed stage-2 crops for debugging
+DETECT_PRECISE_DEBUG_DIR = os.environ.get("DETECT_PRECISE_DEBUG_DIR")
+
+def zoom_crop(image, box, label):
+    """
+    Crops 'box' out of 'image' and scales it so the longer side is 1024 px.
+    Returns (base64 PNG, zoomed width, zoomed height, zoom scale).
+    """
+    crop = image.crop(box)
+    cw, ch = crop.size
+    z_scale = 1024 / max(cw, ch)
+    zw, zh = int(cw * z_scale), int(ch * z_scale)
+    zoomed = crop.resize((zw, zh), Image.Resampling.LANCZOS)
+    if DETECT_PRECISE_DEBUG_DIR:
+        os.makedirs(DETECT_PRECISE_DEBUG_DIR, exist_ok=True)
+        debug_crop_path = os.path.join(DETECT_PRECISE_DEBUG_DIR, f"debug_crop_{label.replace(' ', '_')}.png")
+        zoomed.save(debug_crop_path)
+        print(f"[detect-precise] Debug: Saved zoomed crop to {debug_crop_path}")
+    buf = io.BytesIO()
+    zoomed.save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("utf-8"), zw, zh, z_scale
+
 @app.post("/detect-precise")
-async def detect_precise(file: UploadFile = File(...), labels: str = Form(...)):
+async def detect_precise(http_request: Request, file: UploadFile = File(...), labels: str = Form(...)):
     """
     High-precision multi-stage detection pipeline for multiple labels.
     """
     try:
         label_list = [l.strip() for l in labels.split(",") if l.strip()]
         contents = await file.read()
-        orig_img = Image.open(io.BytesIO(contents)).convert("RGB")
+        orig_img = await executors["preprocess"].run(lambda: Image.open(io.BytesIO(contents)).convert("RGB"), size_bytes=len(contents))
         orig_w, orig_h = orig_img.size
 
         # Stage 1: Bulk Coarse
         print(f"[detect-precise] Stage 1: Bulk Coarse search for {label_list}...")
-        s1_bytes, _, _, canvas_w, canvas_h, scale, off_x, off_y = resize_and_pad_image(contents, max_dim=1536, ratio=None, center=False)
+        s1_bytes, _, _, canvas_w, canvas_h, scale, off_x, off_y = await preprocess(contents, max_dim=1536, ratio=None, center=False)
         s1_b64 = base64.b64encode(s1_bytes).decode("utf-8")
         coarse_prompt = (
             f"This image resolution is {canvas_w}x{canvas_h}. "
@@ -404,16 +647,16 @@ async def detect_precise(file: UploadFile = File(...), labels: str = Form(...)):
             f"Return ONLY a JSON list: [{{\"label\": \"...\", \"bbox\": [xmin, ymin, xmax, ymax]}}, ...]"
         )
         payload1 = {"model": "qwen2.5vl:7b", "prompt": coarse_prompt, "images": [s1_b64], "stream": False}
-        resp1 = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=payload1)
-        resp1.raise_for_status()
-        parsed1 = extract_json(resp1.json()["response"])
+        resp1 = await ollama_generate(payload1, "/detect-precise", cache=True, http_request=http_request, validate=validate_json_reply)
+        parsed1 = extract_json(resp1["response"])
         if not isinstance(parsed1, list):
             if isinstance(parsed1, dict):
                 for v in parsed1.values():
                     if isinstance(v, list): parsed1 = v; break
             if not isinstance(parsed1, list): parsed1 = [parsed1]
 
-        final_results = []
+        # Map the coarse boxes back to the original image first; the refinements below run concurrently.
+        candidates = []
         for item in parsed1:
             if not isinstance(item, dict): continue
             curr_label = item.get("label", "unknown")
@@ -437,40 +680,36 @@ async def detect_precise(file: UploadFile = File(...), labels: str = Form(...)):
                 cy1 = max(0, min(orig_h, int((cy1_n - off_y) / scale)))
                 cx2 = max(0, min(orig_w, int((cx2_n - off_x) / scale)))
                 cy2 = max(0, min(orig_h, int((cy2_n - off_y) / scale)))
+            candidates.append((curr_label, cx1, cy1, cx2, cy2))
+
+        # Stage 2: Individual Fine, one refinement per label, at most DETECT_PRECISE_CONCURRENCY at once
+        print(f"[detect-precise] Stage 2: Refining {len(candidates)} element(s)...")
+        semaphore = asyncio.Semaphore(DETECT_PRECISE_CONCURRENCY)
 
-            # Stage 2: Individual Fine
+        async def refine(curr_label, cx1, cy1, cx2, cy2):
             w_px, h_px = cx2 - cx1, cy2 - cy1
             mx, my = max(150, int(w_px * 1.5)), max(100, int(h_px * 1.5))
             c1x, c1y = max(0, cx1 - mx), max(0, cy1 - my)
             c2x, c2y = min(orig_w, cx2 + mx), min(orig_h, cy2 + my)
-            
-            crop = orig_img.crop((c1x, c1y, c2x, c2y))
-            cw, ch = crop.size
-            z_scale = 1024 / max(cw, ch)
-            zw, zh = int(cw * z_scale), int(ch * z_scale)
-            zoomed = crop.resize((zw, zh), Image.Resampling.LANCZOS)
-            debug_crop_path = f"/Users/hung_macbook_pro/Ollama/debug_crop_{curr_label.replace(' ', '_')}.png"
-            zoomed.save(debug_crop_path)
-            print(f"[detect-precise] Debug: Saved zoomed crop to {debug_crop_path}")
-            
-            buf2 = io.BytesIO()
-            zoomed.save(buf2, format="PNG")
-            s2_b64 = base64.b64encode(buf2.getvalue()).decode("utf-8")
-            
-            f_prompt = (
-                f"This zoomed image resolution is {zw}x{zh}. Find the exact bounding box [xmin, ymin, xmax, ymax] "
-                f"in pixels of the element with text '{curr_label}'. "
-                f"Return ONLY a JSON object: {{\"bbox\": [xmin, ymin, xmax, ymax]}}. "
-                f"No explanations."
-            )
-            payload2 = {"model": "qwen2.5vl:7b", "prompt": f_prompt, "images": [s2_b64], "stream": False}
-            resp2 = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=payload2)
-            parsed2 = extract_json(resp2.json()["response"])
+
+            async with semaphore:
+                # Crop, zoom and encode off the event loop
+                s2_b64, zw, zh, z_scale = await executors["preprocess"].run(zoom_crop, orig_img, (c1x, c1y, c2x, c2y), curr_label)
+
+                f_prompt = (
+                    f"This zoomed image resolution is {zw}x{zh}. Find the exact bounding box [xmin, ymin, xmax, ymax] "
+                    f"in pixels of the element with text '{curr_label}'. "
+                    f"Return ONLY a JSON object: {{\"bbox\": [xmin, ymin, xmax, ymax]}}. "
+                    f"No explanations."
+                )
+                payload2 = {"model": "qwen2.5vl:7b", "prompt": f_prompt, "images": [s2_b64], "stream": False}
+                resp2 = await ollama_generate(payload2, "/detect-precise", cache=True, http_request=http_request, validate=validate_json_reply)
+            parsed2 = extract_json(resp2["response"])
             f_bbox = None
             if isinstance(parsed2, dict):
                 for k in ("bbox", "bbox_2d", "box", "coordinates"):
                     if isinstance(parsed2.get(k), list) and len(parsed2[k]) == 4: f_bbox = parsed2[k]; break
-            if not f_bbox: continue
+            if not f_bbox: return None
 
             f1, f2, f3, f4 = f_bbox
             fx1_n, fx2_n = min(f1, f3), max(f1, f3)
@@ -484,14 +723,20 @@ async def detect_precise(file: UploadFile = File(...), labels: str = Form(...)):
             final_xmax = int((fx2_z / z_scale) + c1x)
             final_ymax = int((fy2_z / z_scale) + c1y)
 
-            final_results.append({
+            return {
                 "label": curr_label,
                 "bbox_pixels": {"xmin": final_xmin, "ymin": final_ymin, "xmax": final_xmax, "ymax": final_ymax},
                 "stage1_coarse_pixels": {"xmin": cx1, "ymin": cy1, "xmax": cx2, "ymax": cy2},
                 "crop_region": {"x1": c1x, "y1": c1y, "x2": c2x, "y2": c2y}
-            })
+            }
+
+        # gather keeps stage-1 order; labels the model could not refine are dropped as before
+        refined = await asyncio.gather(*(refine(*candidate) for candidate in candidates))
+        final_results = [r for r in refined if r is not None]
             
         return {"status": "success", "results": final_results, "image_size": [orig_w, orig_h]}
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -499,16 +744,16 @@ async def detect_precise(file: UploadFile = File(...), labels: str = Form(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/locate-keywords")
-async def locate_keywords(file: UploadFile = File(...), keywords: str = Form(...)):
+async def locate_keywords(http_request: Request, file: UploadFile = File(...), keywords: str = Form(...)):
     try:
         kw_list = [k.strip() for k in keywords.split(",") if k.strip()]
         contents = await file.read()
-        contents, orig_w, orig_h, canvas_w, canvas_h, scale, off_x, off_y = resize_and_pad_image(contents, ratio=(1, 1))
+        contents, orig_w, orig_h, canvas_w, canvas_h, scale, off_x, off_y = await preprocess(contents, ratio=(1, 1))
         image_base64 = base64.b64encode(contents).decode('utf-8')
         p = f"Find bounding boxes for: {', '.join(kw_list)}. JSON list with 'keyword' and 'bbox' (normalized 0-1000)."
         payload = {"model": "qwen2.5vl:7b", "prompt": p, "images": [image_base64], "stream": False}
-        response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=payload)
-        detected_items = extract_json(response.json()["response"])
+        response = await ollama_generate(payload, "/locate-keywords", cache=True, http_request=http_request, validate=validate_json_reply)
+        detected_items = extract_json(response["response"])
         final_results = []
         if isinstance(detected_items, list):
             for item in detected_items:
@@ -524,6 +769,8 @@ async def locate_keywords(file: UploadFile = File(...), keywords: str = Form(...
                     }
                     final_results.append({"keyword": kw, "bbox_pixels": px})
         return {"results": final_results, "image_size": [orig_w, orig_h]}
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -535,8 +782,10 @@ async def create_prompt_text(request: PromptRequest):
     try:
         p = f"Describe a simple, clear, educational illustration for '{request.word}' ({request.translation})."
         payload = {"model": "llama3", "prompt": p, "stream": False}
-        response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=payload)
-        return {"prompt": response.json()["response"]}
+        response = await ollama_generate(payload, "/prompt")
+        return {"prompt": response["response"]}
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -559,7 +808,7 @@ async def extract_product_info(request: ProductRequest):
                 "Referer": "https://www.google.com/",
                 "Upgrade-Insecure-Requests": "1"
             }
-            resp = requests.get(request.url, headers=headers, timeout=15)
+            resp = await http_client.get(request.url, headers=headers, timeout=15, follow_redirects=True)
             resp.raise_for_status()
             html_content = resp.text
             
@@ -657,10 +906,7 @@ async def extract_product_info(request: ProductRequest):
         }
         
         print("Calling Ollama (Llama3) for product extraction...")
-        response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=ollama_payload)
-        response.raise_for_status()
-        
-        result = response.json()
+        result = await ollama_generate(ollama_payload, "/extract-product")
         raw_res = result["response"]
         print(f"Raw Ollama Response: {raw_res}")
         
@@ -684,6 +930,8 @@ async def extract_product_info(request: ProductRequest):
                 except: pass
             return {"error": "Failed to parse JSON", "raw": raw_res}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error extracting product info: {e}")
         import traceback
@@ -691,7 +939,7 @@ async def extract_product_info(request: ProductRequest):
         raise HTTPException(status_code=500, detail=f"Extraction error: {str(e)}")
 
 @app.post("/extract-product-from-text")
-async def extract_product_from_text(request: ProductRequest):
+async def extract_product_from_text(request: ProductRequest, http_request: Request):
     try:
         content = request.content
         if not content:
@@ -730,10 +978,7 @@ async def extract_product_from_text(request: ProductRequest):
         
         print("Calling Ollama (Llama3) for plaintext product extraction...")
         # Since this is likely inside the same file, we use OLLAMA_BASE_URL
-        response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=ollama_payload)
-        response.raise_for_status()
-        
-        result = response.json()
+        result = await ollama_generate(ollama_payload, "/extract-product-from-text", cache=True, http_request=http_request, validate=validate_json_reply)
         raw_res = result["response"]
         print(f"Raw Ollama Response: {raw_res}")
         
@@ -756,6 +1001,8 @@ async def extract_product_from_text(request: ProductRequest):
                 except: pass
             return {"error": "Failed to parse JSON", "raw": raw_res}
             
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in plaintext extraction: {e}")
         import traceback
@@ -763,7 +1010,7 @@ async def extract_product_from_text(request: ProductRequest):
         raise HTTPException(status_code=500, detail=f"Extraction error: {str(e)}")
 
 @app.post("/extract-product-from-image")
-async def extract_product_from_image(file: UploadFile = File(...), myproduct: str | None = Form(None), prompt: str | None = Form(None)):
+async def extract_product_from_image(http_request: Request, file: UploadFile = File(...), myproduct: str | None = Form(None), prompt: str | None = Form(None)):
     try:
         print(f"Extracting product from image: {file.filename}")
         
@@ -771,7 +1018,7 @@ async def extract_product_from_image(file: UploadFile = File(...), myproduct: st
         contents = await file.read()
         
         # Resize and Pad to 16:9 for consistent model performance
-        contents, orig_w, orig_h, canvas_w, canvas_h, scale, off_x, off_y = resize_and_pad_image(contents, ratio=(16, 9))
+        contents, orig_w, orig_h, canvas_w, canvas_h, scale, off_x, off_y = await preprocess(contents, ratio=(16, 9))
 
         # Encode to base64 for Ollama
         image_base64 = base64.b64encode(contents).decode('utf-8')
@@ -807,10 +1054,7 @@ async def extract_product_from_image(file: UploadFile = File(...), myproduct: st
         }
         
         print(f"Calling Qwen2.5-VL for visual product extraction of '{target_product}'...")
-        response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=ollama_payload)
-        response.raise_for_status()
-        
-        result = response.json()
+        result = await ollama_generate(ollama_payload, "/extract-product-from-image", cache=True, http_request=http_request, validate=validate_json_reply)
         raw_res = result["response"]
         print(f"Raw Ollama Response: {raw_res}")
         
@@ -833,6 +1077,8 @@ async def extract_product_from_image(file: UploadFile = File(...), myproduct: st
                 except: pass
             return {"error": "Failed to parse JSON", "raw": raw_res}
             
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in visual product extraction: {e}")
         import traceback
@@ -1,10 +1,12 @@
+import os
 import io
 import json
 import base64
 import uvicorn
-import requests
+import httpx
 import re
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from pydantic import BaseModel
 from PIL import Image
@@ -13,10 +15,31 @@ from PIL import Image
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Vision Extraction API")
-
 # Configuration - Ollama usually runs on 11434 by default
-OLLAMA_BASE_URL = "http://localhost:11434"
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+# Seconds to wait for a connection to Ollama, and for a whole inference
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "10"))
+OLLAMA_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", "600"))
+# Pooled keep-alive connections to Ollama
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get("OLLAMA_MAX_CONNECTIONS", "32"))
+
+# Shared async client: a slow inference no longer blocks the event loop for other requests
+http_client: httpx.AsyncClient | None = None
+
+@asynccontextmanager
+async def lifespan(app):
+    global http_client
+    http_client = httpx.AsyncClient(
+        base_url=OLLAMA_BASE_URL,
+        timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=OLLAMA_MAX_CONNECTIONS, max_keepalive_connections=OLLAMA_MAX_CONNECTIONS)
+    )
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+
+app = FastAPI(title="Vision Extraction API", lifespan=lifespan)
 
 def resize_and_pad_image(image_bytes, max_dim=1024, ratio=None, center=True):
     """
@@ -106,7 +129,7 @@ async def extract_product_from_image(file: UploadFile = File(...), myproduct: st
         }
         
         logger.info(f"Calling Ollama (qwen2.5vl:7b) for product: {target_product}")
-        response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=ollama_payload)
+        response = await http_client.post("/api/generate", json=ollama_payload)
         response.raise_for_status()
         
         result = response.json()
@@ -0,0 +1,83 @@
+import sys
+import os
+import json
+import time
+import argparse
+
+# Make sure my_lib and Bot_module resolve no matter where we are launched from.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(script_dir)
+
+from my_lib.step_engine import run_bot_file
+
+# Runs a saved bot from Bot_steps/ without creating a QApplication or MainWindow.
+# Intended for scheduled data-only bots (SQL -> Excel -> email) on servers and for
+# measuring engine overhead in isolation. Bots that drive the desktop still work,
+# but nothing is shown on screen.
+#
+#   python headless_runner.py "Convert_PO"
+#   python headless_runner.py "Bot_steps/Convert_PO.json" --var folder_link=D:/in --wait 0.5
+#   python headless_runner.py "block_BP_by_excel" --resume
+
+
+def resolve_bot_path(bot: str) -> str:
+    """Accepts a bot name (looked up in Bot_steps/) or a path to a .csv/.json file."""
+    if os.path.isfile(bot):
+        return bot
+    for ext in (".csv", ".json"):
+        candidate = os.path.join(script_dir, "Bot_steps", bot + ext)
+        if os.path.isfile(candidate):
+            return candidate
+    raise FileNotFoundError(f"Bot '{bot}' was not found as a file or in Bot_steps/.")
+
+
+def parse_variable(text: str):
+    """Parses NAME=VALUE; VALUE is read as JSON when possible, otherwise kept as a string."""
+    if "=" not in text:
+        raise argparse.ArgumentTypeError(f"Expected NAME=VALUE, got '{text}'.")
+    name, value = text.split("=", 1)
+    try:
+        value = json.loads(value)
+    except json.JSONDecodeError:
+        pass
+    return name.strip(), value
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run an AutomateTask bot without the GUI.")
+    parser.add_argument("bot", help="Bot name in Bot_steps/ or path to a .csv/.json bot file.")
+    parser.add_argument("--var", action="append", type=parse_variable, default=[],
+                        metavar="NAME=VALUE", help="Override a global variable (repeatable).")
+    parser.add_argument("--wait", type=float, default=0, help="Seconds to wait between steps.")
+    parser.add_argument("--modules", default=os.path.join(script_dir, "Bot_module"),
+                        help="Folder containing the Bot_module files.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the checkpoint left by an interrupted run, if there is one.")
+    parser.add_argument("--quiet", action="store_true", help="Do not print log lines while running.")
+    args = parser.parse_args(argv)
+
+    try:
+        bot_path = resolve_bot_path(args.bot)
+    except FileNotFoundError as e:
+        print(f"[ERROR] {e}")
+        return 2
+
+    log_callback = None if args.quiet else print
+    started = time.perf_counter()
+    context, stopped_by_error, _ = run_bot_file(
+        bot_path,
+        module_directory=args.modules,
+        variable_overrides=dict(args.var),
+        wait_seconds=args.wait,
+        log_callback=log_callback,
+        resume_from_checkpoint=args.resume
+    )
+    elapsed = time.perf_counter() - started
+
+    status = "FAILED" if stopped_by_error else "COMPLETED"
+    print(f"[INFO] Bot '{os.path.basename(bot_path)}' {status} in {elapsed:.2f}s ({len(context.logs)} log lines).")
+    return 1 if stopped_by_error else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import sys
+import os
+import io
+import json
+import time
+import asyncio
+import argparse
+import importlib
+import threading
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from PIL import Image
+
+# Load test for fast_flux_server.py / fast_vision_server.py against a local mock
+# Ollama. The mock answers /api/generate after a fixed delay, like a busy model,
+# so the numbers show how well the AI server overlaps concurrent requests and
+# whether light endpoints (/health) stay responsive while inferences are pending.
+#
+#   python load_test_ai_server.py --server fast_vision_server --endpoint /extract-product-from-image
+#   python load_test_ai_server.py --server fast_flux_server --endpoint /prompt --requests 60 --concurrency 20 --latency 2
+#   python load_test_ai_server.py --url http://localhost:8000 --endpoint /ocr   (server already running, pointed at a mock or real Ollama)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(script_dir)
+
+DETECTION_REPLY = [{"label": "OK", "keyword": "OK", "bbox": [100, 100, 200, 150]}]
+PRODUCT_REPLY = {"product_name": "Mock product", "price": "1.000.000đ", "status": "Còn hàng", "similarity": "100%", "popup_xpath": ""}
+
+
+def make_mock_ollama(latency):
+    """A stand-in for Ollama's /api/generate that sleeps 'latency' seconds per call without blocking other calls."""
+    mock = FastAPI()
+    mock.state.calls = 0
+    mock.state.in_flight = 0
+    mock.state.max_in_flight = 0
+
+    @mock.post("/api/generate")
+    async def generate(payload: dict):
+        mock.state.calls += 1
+        mock.state.in_flight += 1
+        mock.state.max_in_flight = max(mock.state.max_in_flight, mock.state.in_flight)
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            mock.state.in_flight -= 1
+        prompt = payload.get("prompt", "").lower()
+        reply = DETECTION_REPLY if ("bounding box" in prompt or "bbox" in prompt) else PRODUCT_REPLY
+        return {"model": payload.get("model"), "response": json.dumps(reply), "done": True}
+
+    return mock
+
+
+def start_server(app, port):
+    """Runs a uvicorn server in a background thread and waits until it accepts requests."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError(f"Server on port {port} did not start.")
+        time.sleep(0.05)
+    return server
+
+
+def sample_png(width=1280, height=720):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (240, 240, 240)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def request_builder(endpoint):
+    """Returns a function that sends one request to 'endpoint' with a small valid body."""
+    png = sample_png()
+    text_bodies = {
+        "/prompt": {"word": "Haus", "translation": "house"},
+        "/story": {"words": ["Haus", "Baum"]},
+        "/extract-product-from-text": {"content": "Mock product 1.000.000đ Còn hàng", "myproduct": "Mock product"},
+        "/extract-product": {"content": "<div>Mock product 1.000.000đ</div>", "myproduct": "Mock product"},
+    }
+    form_fields = {
+        "/detect-precise": {"labels": "OK, Cancel"},
+        "/locate-keywords": {"keywords": "OK"},
+        "/extract-product-from-image": {"myproduct": "Mock product"},
+    }
+    if endpoint in text_bodies:
+        return lambda client: client.post(endpoint, json=text_bodies[endpoint])
+    if endpoint in ("/ocr", "/invoice", "/detect") or endpoint in form_fields:
+        return lambda client: client.post(endpoint, files={"file": ("screen.png", png, "image/png")}, data=form_fields.get(endpoint, {}))
+    raise SystemExit(f"No request body defined for {endpoint}.")
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def run_load(base_url, endpoint, total, concurrency, timeout):
+    send = request_builder(endpoint)
+    latencies, failures, health = [], [], []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency + 2, max_keepalive_connections=concurrency + 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await send(client)
+                    if response.status_code != 200:
+                        failures.append(f"HTTP {response.status_code}: {response.text[:200]}")
+                        return
+                except httpx.HTTPError as e:
+                    failures.append(f"{type(e).__name__}: {e}")
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        async def probe(stop):
+            # A light request every 100 ms while the load runs; it should not wait for inferences.
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    response = await client.get("/health")
+                    # A server without the route answers 404 at once; that says nothing about load.
+                    if response.status_code == 200:
+                        health.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.1)
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await prober
+    return elapsed, latencies, failures, health
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test an AI server against a local mock Ollama.")
+    parser.add_argument("--server", default="fast_vision_server", help="Server module to start (ignored with --url).")
+    parser.add_argument("--url", default=None, help="Test an already running server instead of starting one.")
+    parser.add_argument("--endpoint", default="/extract-product-from-image")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds the mock Ollama takes per call.")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--mock-port", type=int, default=11499)
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    mock = make_mock_ollama(args.latency)
+    start_server(mock, args.mock_port)
+    base_url = args.url
+    if base_url is None:
+        # Must be set before the server module reads its configuration.
+        os.environ["OLLAMA_BASE_URL"] = f"http://127.0.0.1:{args.mock_port}"
+        server_module = importlib.import_module(args.server)
+        start_server(server_module.app, args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    elapsed, latencies, failures, health = asyncio.run(
+        run_load(base_url, args.endpoint, args.requests, args.concurrency, args.timeout))
+
+    serial = mock.state.calls * args.latency
+    print(f"{args.endpoint}: {args.requests} request(s), concurrency {args.concurrency}, mock latency {args.latency:.2f}s")
+    print(f"  ok={len(latencies)} failed={len(failures)} wall={elapsed:.2f}s throughput={len(latencies) / elapsed:.2f} req/s")
+    if latencies:
+        print(f"  latency p50={percentile(latencies, 0.5):.2f}s p95={percentile(latencies, 0.95):.2f}s max={max(latencies):.2f}s")
+    print(f"  mock Ollama: {mock.state.calls} call(s), up to {mock.state.max_in_flight} at once; "
+          f"serial time would be {serial:.1f}s ({serial / elapsed:.1f}x overlap)")
+    if health:
+        print(f"  /health while loaded: p50={1000 * percentile(health, 0.5):.0f} ms max={1000 * max(health):.0f} ms ({len(health)} probes)")
+    for failure in failures[:5]:
+        print(f"  failure: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,7 @@ import importlib
 import time
 import csv
 import io
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 import base64
 import re
@@ -54,7 +54,12 @@ from PyQt6.QtGui import QSyntaxHighlighter, QTextCharFormat, QColor, QFont, QPai
 
 # Use the actual libraries from the my_lib folder
 from my_lib.shared_context import ExecutionContext, GuiCommunicator
+from my_lib.step_engine import StepEngine
+from my_lib.checkpoint import CheckpointStore
+from my_lib.bot_scheduler import BotDispatcher, format_bot_stats, RUN_MODE_AUTO, RUN_MODE_DESKTOP, RUN_MODE_BACKGROUND
+from my_lib.schedule_queue import ScheduleQueue, MISSED_SKIP, MISSED_RUN_ONCE, MISSED_CATCH_UP
 from my_lib.BOT_take_image import MainWindow as BotTakeImageWindow
+from my_lib.template_pack import list_template_names, read_template_data
 from my_lib.Emailer import Emailer
 
 
@@ -857,7 +862,40 @@ class LoopConfigDialog(QDialog):
         self.new_var_iter_editor.setPlaceholderText("Enter new variable name")
         self.new_var_iter_editor.setEnabled(False)
         form_layout.addRow("New Var Name for Iter:", self.new_var_iter_editor)
+        self.checkpoint_every_spin = QSpinBox()
+        self.checkpoint_every_spin.setRange(0, 100000)
+        self.checkpoint_every_spin.setValue(0)
+        self.checkpoint_every_spin.setSpecialValueText("Off")
+        self.checkpoint_every_spin.setToolTip("Save a resumable checkpoint every N iterations so an interrupted run can continue from there.")
+        form_layout.addRow("Checkpoint Every N Iterations:", self.checkpoint_every_spin)
         main_layout.addLayout(form_layout)
+
+        # --- Parallel for-each: iterations run on a worker pool (non-GUI steps only) ---
+        self.parallel_group = QGroupBox("Parallel For-Each (non-GUI steps only)")
+        self.parallel_group.setCheckable(True)
+        self.parallel_group.setChecked(False)
+        self.parallel_group.setToolTip("Each iteration gets its own copy of the variable list, but DataFrames, lists and dicts\n"
+                                       "in it are shared between iterations: reassign them, do not modify them in place.")
+        parallel_form_layout = QFormLayout()
+        self.parallel_source_combo = QComboBox()
+        self.parallel_source_combo.addItem("-- Select Global Variable --")
+        self.parallel_source_combo.addItems(sorted(global_variables.keys()))
+        parallel_form_layout.addRow("Items (DataFrame/List):", self.parallel_source_combo)
+        self.parallel_item_editor = QLineEdit("item")
+        parallel_form_layout.addRow("Current Item Variable:", self.parallel_item_editor)
+        self.parallel_workers_spin = QSpinBox()
+        self.parallel_workers_spin.setRange(1, 64)
+        self.parallel_workers_spin.setValue(4)
+        parallel_form_layout.addRow("Max Workers:", self.parallel_workers_spin)
+        self.parallel_results_editor = QLineEdit()
+        self.parallel_results_editor.setPlaceholderText("Comma-separated variables to collect, e.g. answer,status")
+        parallel_form_layout.addRow("Collect Variables:", self.parallel_results_editor)
+        self.parallel_output_editor = QLineEdit()
+        self.parallel_output_editor.setPlaceholderText("Variable that receives the results DataFrame")
+        parallel_form_layout.addRow("Results DataFrame To:", self.parallel_output_editor)
+        self.parallel_group.setLayout(parallel_form_layout)
+        main_layout.addWidget(self.parallel_group)
+
         button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
         button_box.accepted.connect(self.accept)
         button_box.rejected.connect(self.reject)
@@ -866,6 +904,17 @@ class LoopConfigDialog(QDialog):
         if initial_config: self.set_config(initial_config)
         else: self._toggle_count_var_input(); self._toggle_assign_iter_input()
 
+    @staticmethod
+    def variables_to_register(loop_config: Dict[str, Any]) -> List[str]:
+        """Returns the variable names a loop config writes to, so they can be added to the global list."""
+        names = [loop_config.get("assign_iteration_to_variable")]
+        parallel_config = loop_config.get("parallel_config") or {}
+        if parallel_config.get("enabled"):
+            names.append(parallel_config.get("item_variable"))
+            names.append(parallel_config.get("output_variable"))
+            names.extend(parallel_config.get("result_variables", []))
+        return [name for name in names if name]
+
     def _toggle_count_var_input(self) -> None:
         is_using_var = self.use_var_checkbox.isChecked()
         self.repeat_count_editor.setEnabled(not is_using_var)
@@ -893,7 +942,21 @@ class LoopConfigDialog(QDialog):
     def get_config(self) -> Optional[Dict[str, Any]]:
         loop_name = self.loop_name_editor.text().strip()
         count_config = {}
-        if self.use_var_checkbox.isChecked():
+        parallel_config = None
+        if self.parallel_group.isChecked():
+            source_var = self.parallel_source_combo.currentText()
+            if self.parallel_source_combo.currentIndex() == 0: QMessageBox.warning(self, "Input Error", "Please select the DataFrame or list variable to iterate over in parallel."); return None
+            item_var = self.parallel_item_editor.text().strip()
+            if not item_var: QMessageBox.warning(self, "Input Error", "Please enter a variable name for the current item."); return None
+            output_var = self.parallel_output_editor.text().strip()
+            if not output_var: QMessageBox.warning(self, "Input Error", "Please enter a variable name for the results DataFrame."); return None
+            result_vars = [name.strip() for name in self.parallel_results_editor.text().split(",") if name.strip()]
+            parallel_config = {"enabled": True, "source_variable": source_var, "item_variable": item_var,
+                               "max_workers": self.parallel_workers_spin.value(), "result_variables": result_vars,
+                               "output_variable": output_var}
+            # The item count drives a parallel loop; the count fields are not used.
+            count_config = {"type": "hardcoded", "value": 1}
+        elif self.use_var_checkbox.isChecked():
             global_var_name = self.global_var_combo_count.currentText()
             if global_var_name == "-- Select Global Variable --": QMessageBox.warning(self, "Input Error", "Please select a global variable for loop count."); return None
             count_config = {"type": "variable", "value": global_var_name}
@@ -913,7 +976,10 @@ class LoopConfigDialog(QDialog):
                 assign_iter_var_name = new_var_name
             else: assign_iter_var_name = self.global_var_combo_assign_iter.currentText()
             if count_config["type"] == "variable" and count_config["value"] == assign_iter_var_name: QMessageBox.warning(self, "Input Error", "The variable for Loop Count cannot be the same as the variable for assigning Current Iteration."); return None
-        return {"loop_name": loop_name if loop_name else None, "iteration_count_config": count_config, "assign_iteration_to_variable": assign_iter_var_name}
+        config = {"loop_name": loop_name if loop_name else None, "iteration_count_config": count_config, "assign_iteration_to_variable": assign_iter_var_name}
+        if parallel_config: config["parallel_config"] = parallel_config
+        if self.checkpoint_every_spin.value() > 0: config["checkpoint_every"] = self.checkpoint_every_spin.value()
+        return config
 
     def set_config(self, config: Dict[str, Any]) -> None:
         self.loop_name_editor.setText(config.get("loop_name", "") or "")
@@ -934,6 +1000,16 @@ class LoopConfigDialog(QDialog):
             else: self.global_var_combo_assign_iter.setCurrentIndex(0); self.new_var_iter_editor.setText(assign_iter_var_name)
         else: self.assign_iter_checkbox.setChecked(False)
         self._toggle_assign_iter_input()
+        self.checkpoint_every_spin.setValue(int(config.get("checkpoint_every", 0) or 0))
+        parallel_config = config.get("parallel_config") or {}
+        if parallel_config.get("enabled"):
+            self.parallel_group.setChecked(True)
+            idx = self.parallel_source_combo.findText(parallel_config.get("source_variable", ""))
+            if idx != -1: self.parallel_source_combo.setCurrentIndex(idx)
+            self.parallel_item_editor.setText(parallel_config.get("item_variable", "item"))
+            self.parallel_workers_spin.setValue(int(parallel_config.get("max_workers", 4)))
+            self.parallel_results_editor.setText(", ".join(parallel_config.get("result_variables", [])))
+            self.parallel_output_editor.setText(parallel_config.get("output_variable", ""))
 
 class ConditionalConfigDialog(QDialog):
     def __init__(self, global_variables: Dict[str, Any], parent: Optional[QWidget] = None, initial_config: Optional[Dict[str, Any]] = None):
@@ -1948,6 +2024,11 @@ class StepSearchDialog(QDialog):
         self.accept()
 
 class ExecutionWorker(QThread):
+    """
+    Runs a StepEngine on a background thread and relays its progress to the GUI
+    through Qt signals. The step semantics themselves live in my_lib/step_engine.py
+    so the headless runner can share them.
+    """
     execution_started = pyqtSignal(str)
     execution_progress = pyqtSignal(int)
     execution_item_started = pyqtSignal(dict, int)
@@ -1965,336 +2046,30 @@ class ExecutionWorker(QThread):
                  selected_end_index: Optional[int] = None,
                  # --- NEW ARGUMENTS FOR EMAIL NOTIFICATIONS ---
                  bot_name: str = "Untitled Bot",
-                 email_config: Optional[Dict[str, Any]] = None):
+                 email_config: Optional[Dict[str, Any]] = None,
+                 bot_steps_directory: Optional[str] = None,
+                 resume_from_checkpoint: bool = False):
         super().__init__(parent)
-        self.steps_to_execute = steps_to_execute
-        self.module_directory = module_directory
-        self.click_image_dir = os.path.normpath(os.path.join(module_directory, "..", "Click_image"))
-        self.instantiated_objects: Dict[Tuple[str, str], Any] = {}
-        self.context = ExecutionContext()
-        self.context.set_gui_communicator(gui_communicator)
-        self.global_variables = global_variables_ref
-        self._is_stopped = False
-        self.loop_stack: List[Dict[str, Any]] = []
-        self.conditional_stack: List[Dict[str, Any]] = []
-        self.group_stack: List[Dict[str, Any]] = []
-        self.single_step_mode = single_step_mode
-        self.selected_start_index = selected_start_index
-        self.selected_end_index = selected_end_index
-        self.next_step_index_to_select: int = -1
-        self._is_paused = False
-        self.wait_config = wait_config
-        # --- STORE NEW ATTRIBUTES ---
-        self.bot_name = bot_name
-        self.email_config = email_config or {}
-        self.error_message: Optional[str] = None # To store the specific error
-
-    # ... (Keep all existing methods like _resolve_loop_count, _resolve_operand_value, _evaluate_condition) ...
-    def _resolve_loop_count(self, loop_config: Dict[str, Any]) -> int:
-        count_config = loop_config["iteration_count_config"]
-        if count_config["type"] == "variable":
-            var_name = count_config["value"]
-            var_value = self.global_variables.get(var_name)
-            if isinstance(var_value, int) and var_value >= 1: return var_value
-            else: self.context.add_log(f"Warning: Global variable '{var_name}' for loop count is not a valid positive integer (value: {var_value}). Defaulting to 1 iteration."); return 1
-        else: return count_config.get("value", 1)
-
-    def _resolve_operand_value(self, operand_config: Dict[str, Any]) -> Any:
-        if operand_config["type"] == "variable":
-            var_name = operand_config["value"]
-            if var_name not in self.global_variables: raise ValueError(f"Global variable '{var_name}' not found for condition operand.")
-            return self.global_variables[var_name]
-        else: return operand_config["value"]
-
-    def _evaluate_condition(self, condition_config: Dict[str, Any]) -> bool:
-        left_val = self._resolve_operand_value(condition_config["left_operand"])
-        right_val = self._resolve_operand_value(condition_config["right_operand"])
-        operator = condition_config["operator"]
-        try:
-            if operator == '==': return left_val == right_val
-            elif operator == '!=': return left_val != right_val
-            elif operator == '<': return left_val < right_val
-            elif operator == '>': return left_val > right_val
-            elif operator == '<=': return left_val <= right_val
-            elif operator == '>=': return left_val >= right_val
-            elif operator == 'in': return left_val in right_val
-            elif operator == 'not in': return left_val not in right_val
-            elif operator == 'is': return left_val is right_val
-            elif operator == 'is not': return left_val is not right_val
-            else: raise ValueError(f"Unknown operator: {operator}")
-        except Exception as e: raise ValueError(f"Error evaluating condition '{left_val} {operator} {right_val}': {e}")
-        
-    # --- NEW METHOD TO SEND EMAIL ---
-    # --- NEW METHOD TO SEND EMAIL ---
-    def _send_notification_email(self):
-        """Sends an email based on the execution result and configuration."""
-        if not self.email_config.get("email_notification_enabled"):
-            return
-
-        is_error = self.error_message is not None
-        should_send = False
-
-        if is_error and self.email_config.get("notify_on_error"):
-            should_send = True
-        elif not is_error and self.email_config.get("notify_on_success"):
-            should_send = True
-
-        if should_send:
-            status = "Failed with Error" if is_error else "Completed Successfully"
-            recipient = self.email_config.get("recipient_email")
-            
-            try:
-                emailer = Emailer()
-                # --- THIS IS THE KEY CHANGE ---
-                # Check the return value of the send function.
-                was_sent = emailer.send_outlook_notification(
-                    recipient_email=recipient,
-                    bot_name=self.bot_name,
-                    status=status,
-                    error_message=self.error_message or ""
-                )
-                
-                if was_sent:
-                    self.context.add_log(f"Notification email sent to {recipient}.")
-                else:
-                    # If it fails, log a warning instead of crashing.
-                    self.context.add_log(f"WARNING: Could not send notification email to {recipient}. Outlook may not be installed or available.")
-                # --- END OF KEY CHANGE ---
-            except Exception as e:
-                # Log to the context if email sending fails for any other reason
-                self.context.add_log(f"CRITICAL: Failed to send notification email. Error: {e}")
-
-    # --- MODIFIED RUN METHOD ---
-# In main_app.py, find the ExecutionWorker class
-# REPLACE the entire 'run' method with this one:
+        # The engine emits through this QThread's pyqtSignals.
+        self.engine = StepEngine(
+            steps_to_execute, module_directory, gui_communicator, global_variables_ref, wait_config,
+            signals=self,
+            single_step_mode=single_step_mode,
+            selected_start_index=selected_start_index,
+            selected_end_index=selected_end_index,
+            bot_name=bot_name,
+            email_config=email_config,
+            bot_steps_directory=bot_steps_directory,
+            resume_from_checkpoint=resume_from_checkpoint
+        )
+        self.context = self.engine.context
 
     def run(self) -> None:
-        self.execution_started.emit("Starting execution...")
-        if not self.steps_to_execute:
-            self.execution_finished_all.emit(self.context, False, -1)
-            return
-            
-        if self.selected_end_index is not None:
-            actual_end_index = min(self.selected_end_index + 1, len(self.steps_to_execute))
-        else:
-            actual_end_index = len(self.steps_to_execute)
-        
-        total_steps_for_progress = (actual_end_index - self.selected_start_index) if not self.single_step_mode else 1
-        if total_steps_for_progress == 0: total_steps_for_progress = 1
-            
-        current_execution_item_count = 0
-        original_sys_path = sys.path[:]
-        
-        if self.module_directory not in sys.path:
-            sys.path.insert(0, self.module_directory)
-            
-        self.context.set_click_image_base_dir(self.click_image_dir)
-        self.context.set_global_variables_ref(self.global_variables)     
-        
-        self.loop_stack = []
-        self.conditional_stack = []
-        self.group_stack = []
-        step_index = self.selected_start_index
-        original_listbox_row_index = 0
-        
-        # Define the jump signal prefix
-        JUMP_PREFIX = "_JUMP_TO_STEP_::"
-
-        try:
-            while step_index < actual_end_index:
-                while self._is_paused:
-                    if self._is_stopped: break
-                    QThread.msleep(100)
-                
-                if self._is_stopped: break
-                if self.single_step_mode and current_execution_item_count >= 1: break
-                
-                if current_execution_item_count > 0 and not self.single_step_mode:
-                    wait_seconds = 0
-                    if self.wait_config['type'] == 'variable':
-                        var_name = self.wait_config['value']
-                        var_value = self.global_variables.get(var_name, 0)
-                        try: wait_seconds = float(var_value)
-                        except (ValueError, TypeError):
-                            self.context.add_log(f"Warning: Global variable '@{var_name}' does not contain a valid number for wait time. Using 0."); wait_seconds = 0
-                    else: wait_seconds = self.wait_config['value']
-
-                    if wait_seconds > 0:
-                        self.context.add_log(f"Waiting for {wait_seconds:.2f} second(s)..."); QThread.msleep(int(wait_seconds * 1000))
-                
-                step_data = self.steps_to_execute[step_index]
-                step_type = step_data["type"]
-                original_listbox_row_index = step_data.get("original_listbox_row_index", step_index)
-                current_execution_item_count += 1
-                progress_percentage = int((current_execution_item_count / total_steps_for_progress) * 100)
-                self.execution_progress.emit(min(progress_percentage, 100))
-                
-                is_skipping = False
-                if self.conditional_stack:
-                    current_if_context = self.conditional_stack[-1]
-                    is_in_false_if_branch = not current_if_context.get('condition_result', True) and not current_if_context.get('else_taken', False)
-                    is_in_true_else_branch = current_if_context.get('condition_result', False) and current_if_context.get('else_taken', False)
-                    if is_in_false_if_branch and not (step_type == "ELSE" and step_data.get("if_id") == current_if_context["if_id"]): is_skipping = True
-                    elif is_in_true_else_branch and not (step_type == "IF_END" and step_data.get("if_id") == current_if_context["if_id"]): is_skipping = True
-                
-                if is_skipping:
-                    self.execution_item_started.emit(step_data, original_listbox_row_index)
-                    if step_type == "IF_START": self.conditional_stack.append({'if_id': step_data['if_id'], 'skipped_marker': True})
-                    elif step_type == "loop_start": self.loop_stack.append({'loop_id': step_data['loop_id'], 'skipped_marker': True})
-                    elif step_type == "group_start": self.group_stack.append({'group_id': step_data['group_id'], 'skipped_marker': True})
-                    elif step_type == "IF_END" and self.conditional_stack and self.conditional_stack[-1].get('skipped_marker'): self.conditional_stack.pop()
-                    elif step_type == "loop_end" and self.loop_stack and self.loop_stack[-1].get('skipped_marker'): self.loop_stack.pop()
-                    elif step_type == "group_end" and self.group_stack and self.group_stack[-1].get('skipped_marker'): self.group_stack.pop()
-                    self.execution_item_finished.emit(step_data, "SKIPPED", original_listbox_row_index); step_index += 1; continue
-                
-                self.execution_item_started.emit(step_data, original_listbox_row_index); QThread.msleep(50)
-                if step_type in ["group_start", "group_end"]: self.execution_item_finished.emit(step_data, "Organizational Step", original_listbox_row_index)
-                elif step_type == "loop_start":
-                    loop_id, loop_config = step_data["loop_id"], step_data["loop_config"]
-                    is_new_loop = not (self.loop_stack and self.loop_stack[-1].get('loop_id') == loop_id)
-                    if is_new_loop: total_iterations = self._resolve_loop_count(loop_config); self.loop_stack.append({'loop_id': loop_id, 'start_index': step_index, 'current_iteration': 1, 'total_iterations': total_iterations, 'loop_config': loop_config}); self.loop_iteration_started.emit(loop_id, 1)
-                    else: current_loop_info = self.loop_stack[-1]; current_loop_info['current_iteration'] += 1; current_loop_info['total_iterations'] = self._resolve_loop_count(loop_config); self.loop_iteration_started.emit(loop_id, current_loop_info['current_iteration'])
-                    current_loop_info = self.loop_stack[-1]
-                    if current_loop_info['current_iteration'] > current_loop_info['total_iterations']:
-                        self.loop_stack.pop()
-                        nesting_level, loop_end_index = 0, -1
-                        for i in range(step_index + 1, len(self.steps_to_execute)):
-                            s, s_type = self.steps_to_execute[i], self.steps_to_execute[i].get("type")
-                            if s_type in ["loop_start", "IF_START", "group_start"]: nesting_level += 1
-                            elif s_type == "loop_end" and s.get("loop_id") == loop_id and nesting_level == 0: loop_end_index = i; break
-                            elif s_type in ["loop_end", "IF_END", "group_end"] and nesting_level > 0: nesting_level -= 1
-                        if loop_end_index != -1: step_index = loop_end_index
-                        self.execution_item_finished.emit(step_data, "Loop Finished", original_listbox_row_index)
-                    else:
-                        assign_var = loop_config.get("assign_iteration_to_variable")
-                        if assign_var: self.global_variables[assign_var] = current_loop_info['current_iteration']; self.context.add_log(f"Assigned iteration {current_loop_info['current_iteration']} to @{assign_var}")
-                        self.execution_item_finished.emit(step_data, f"Iter {current_loop_info['current_iteration']}/{current_loop_info['total_iterations']}", original_listbox_row_index)
-                elif step_type == "loop_end":
-                    if not self.loop_stack or self.loop_stack[-1].get('loop_id') != step_data['loop_id']: raise ValueError(f"Mismatched loop_end for ID: {step_data['loop_id']}")
-                    step_index = self.loop_stack[-1]['start_index'] - 1; self.execution_item_finished.emit(step_data, "Looping...", original_listbox_row_index)
-                elif step_type == "step":
-                    class_name, method_name, module_name, parameters_config, assign_to_variable_name = step_data["class_name"], step_data["method_name"], step_data["module_name"], step_data["parameters_config"], step_data["assign_to_variable_name"]
-                    resolved_parameters, params_str_debug = {}, []
-                    for param_name, config in parameters_config.items():
-                        if param_name == "original_listbox_row_index": continue
-                        if config['type'] == 'hardcoded': resolved_parameters[param_name] = config['value']; params_str_debug.append(f"{param_name}={repr(config['value'])}")
-                        elif config['type'] == 'hardcoded_file': resolved_parameters[param_name] = config['value']; params_str_debug.append(f"{param_name}=FILE('{config['value']}')")
-                        elif config['type'] == 'variable':
-                            var_name = config['value']
-                            if var_name in self.global_variables:
-                                val = self.global_variables[var_name]
-                                val_repr = repr(val)
-                                if len(val_repr) > 100: val_repr = val_repr[:100] + "..."
-                                resolved_parameters[param_name] = val
-                                params_str_debug.append(f"{param_name}=@{var_name}({val_repr})")
-                            else: raise ValueError(f"Global variable '{var_name}' not found for parameter '{param_name}'.")
-                    self.context.add_log(f"Executing: {class_name}.{method_name}({', '.join(params_str_debug)})")
-                    try:
-                        module = importlib.import_module(module_name); importlib.reload(module); class_obj = getattr(module, class_name)
-                        instance_key = (class_name, module_name)
-                        if instance_key not in self.instantiated_objects:
-                            init_kwargs = {};
-                            if 'context' in inspect.signature(class_obj.__init__).parameters: init_kwargs['context'] = self.context
-                            self.instantiated_objects[instance_key] = class_obj(**init_kwargs)
-                        instance = self.instantiated_objects[instance_key]; method_func = getattr(instance, method_name); method_kwargs = {k:v for k,v in resolved_parameters.items()}
-                        if 'context' in inspect.signature(method_func).parameters: method_kwargs['context'] = self.context
-                        
-                        # Execute the method and get the result
-                        result = method_func(**method_kwargs)
-                        
-                        # ===============================================
-                        # === NEW JUMP LOGIC STARTS HERE ===
-                        # ===============================================
-                        if isinstance(result, str) and result.startswith(JUMP_PREFIX):
-                            try:
-                                # 1. Parse the target step number from the result string
-                                target_step_1_based = int(result.replace(JUMP_PREFIX, ""))
-                                # 2. Convert to 0-based index for our list
-                                target_index_0_based = target_step_1_based - 1
-
-                                # 3. Validate the target index
-                                if 0 <= target_index_0_based < len(self.steps_to_execute):
-                                    # 4. Set the main step_index to the new target.
-                                    #    We subtract 1 because the loop will auto-increment it.
-                                    step_index = target_index_0_based - 1
-                                    self.context.add_log(f"Jumping to step {target_step_1_based}.")
-                                    self.execution_item_finished.emit(step_data, f"Jumping to step {target_step_1_based}", original_listbox_row_index)
-                                else:
-                                    # The jump target is out of bounds, treat as an error
-                                    raise ValueError(f"Jump target step {target_step_1_based} is out of bounds (1-{len(self.steps_to_execute)}).")
-                            except (ValueError, TypeError) as jump_error:
-                                # Catch errors from parsing or invalid numbers
-                                raise ValueError(f"Invalid JumpTo instruction: {jump_error}")
-                            
-                            # After setting the new index, continue to the next loop iteration
-                            # to immediately process the target step.
-                            step_index += 1
-                            continue 
-                        # ===============================================
-                        # === NEW JUMP LOGIC ENDS HERE ===
-                        # ===============================================
-                        
-                        # --- This is the original logic for normal steps ---
-                        if assign_to_variable_name: 
-                            self.global_variables[assign_to_variable_name] = result
-                            result_msg = f"Result: {result} (Assigned to @{assign_to_variable_name})"
-                        else: 
-                            result_msg = f"Result: {result}"
-                            
-                        self.execution_item_finished.emit(step_data, result_msg, original_listbox_row_index)
-                        
-                    except Exception as e: raise e
-                elif step_type == "IF_START":
-                    condition_config, if_id = step_data["condition_config"], step_data["if_id"]; condition_result = self._evaluate_condition(condition_config["condition"])
-                    self.context.add_log(f"IF '{if_id}' evaluated: {condition_result}"); self.conditional_stack.append({'if_id': if_id, 'condition_result': condition_result, 'else_taken': False})
-                    self.execution_item_finished.emit(step_data, f"Condition: {condition_result}", original_listbox_row_index)
-                    if not condition_result:
-                        nesting_level, target_index = 0, -1
-                        for i in range(step_index + 1, len(self.steps_to_execute)):
-                            s, s_type = self.steps_to_execute[i], self.steps_to_execute[i].get("type")
-                            if s_type in ["loop_start", "IF_START", "group_start"]: nesting_level += 1
-                            elif s_type in ["ELSE", "IF_END"] and s.get("if_id") == if_id and nesting_level == 0: target_index = i; break
-                            elif s_type in ["loop_end", "IF_END", "group_end"] and nesting_level > 0: nesting_level -= 1
-                        if target_index != -1: step_index = target_index - 1
-                        else: raise ValueError(f"Mismatched IF_START for ID: {if_id}, no ELSE or IF_END found.")
-                elif step_type == "ELSE":
-                    if not self.conditional_stack or self.conditional_stack[-1].get('if_id') != step_data['if_id']: raise ValueError(f"Mismatched ELSE for ID: {step_data['if_id']}")
-                    current_if = self.conditional_stack[-1]; current_if['else_taken'] = True; self.execution_item_finished.emit(step_data, "Branching", original_listbox_row_index)
-                    if current_if.get('condition_result', False):
-                        nesting_level, target_index = 0, -1
-                        for i in range(step_index + 1, len(self.steps_to_execute)):
-                            s, s_type = self.steps_to_execute[i], self.steps_to_execute[i].get("type")
-                            if s_type in ["loop_start", "IF_START", "group_start"]: nesting_level += 1
-                            elif s_type == "IF_END" and s.get("if_id") == current_if["if_id"] and nesting_level == 0: target_index = i; break
-                            elif s_type in ["loop_end", "IF_END", "group_end"] and nesting_level > 0: nesting_level -= 1
-                        if target_index != -1: step_index = target_index - 1
-                        else: raise ValueError(f"Mismatched ELSE for ID: {current_if['if_id']}, no IF_END found.")
-                elif step_type == "IF_END":
-                    if not self.conditional_stack or self.conditional_stack[-1].get('if_id') != step_data['if_id']: raise ValueError(f"Mismatched IF_END for ID: {step_data['if_id']}")
-                    self.conditional_stack.pop(); self.execution_item_finished.emit(step_data, "End of Conditional", original_listbox_row_index)
-                step_index += 1
-        except Exception as e:
-            self.error_message = f"Error at step {original_listbox_row_index+1}: {type(e).__name__}: {e}"
-            self.context.add_log(self.error_message)
-            self.execution_error.emit(self.steps_to_execute[step_index] if step_index < len(self.steps_to_execute) else {}, self.error_message, original_listbox_row_index)
-            self._is_stopped = True
-        finally:
-            sys.path = original_sys_path
-            if self.single_step_mode:
-                next_index = -1
-                if not self._is_stopped and step_index < len(self.steps_to_execute): next_index = self.steps_to_execute[step_index].get("original_listbox_row_index", -1)
-                self.next_step_index_to_select = next_index
-            
-            if not self.single_step_mode:
-                self._send_notification_email()
-            
-            self.execution_finished_all.emit(self.context, self._is_stopped, self.next_step_index_to_select)
+        self.engine.run()
 
-
-    # ... (Keep all existing methods like pause, resume, stop) ...
-    def pause(self): self._is_paused = True; self.context.add_log("Execution PAUSED."); self.execution_started.emit("Execution PAUSED.")
-    def resume(self): self._is_paused = False; self.context.add_log("Execution RESUMED."); self.execution_started.emit("Execution RESUMED.")
-    def stop(self): self._is_stopped = True; self.context.add_log("Execution STOP requested by user."); self.execution_started.emit("Execution STOPPED.")
+    def pause(self): self.engine.pause()
+    def resume(self): self.engine.resume()
+    def stop(self): self.engine.stop()
 
         
 class RearrangeStepItemWidget(QWidget):
@@ -3374,6 +3149,22 @@ class ScheduleTaskDialog(QDialog):
                     ])
         self.layout.addRow("Repeat:", self.repeat_combo)
 
+        self.run_mode_combo = QComboBox()
+        self.run_mode_combo.addItem("Auto (detect GUI steps)", RUN_MODE_AUTO)
+        self.run_mode_combo.addItem("Desktop (one bot at a time)", RUN_MODE_DESKTOP)
+        self.run_mode_combo.addItem("Background process", RUN_MODE_BACKGROUND)
+        self.run_mode_combo.setToolTip("Bots that use the mouse, keyboard, screen or a browser must run on the desktop;\n"
+                                       "other bots can run in a background process alongside them.")
+        self.layout.addRow("Run Mode:", self.run_mode_combo)
+
+        self.missed_run_combo = QComboBox()
+        self.missed_run_combo.addItem("Run once now", MISSED_RUN_ONCE)
+        self.missed_run_combo.addItem("Skip to the next run", MISSED_SKIP)
+        self.missed_run_combo.addItem("Catch up every missed run", MISSED_CATCH_UP)
+        self.missed_run_combo.setToolTip("What to do with runs that were due while the app was closed\n"
+                                         "or while the previous run of this bot was still going.")
+        self.layout.addRow("Missed Runs:", self.missed_run_combo)
+
         # --- Days of Week Group ---
         self.days_of_week_group = QGroupBox("Run on Specific Days")
         days_layout = QHBoxLayout()
@@ -3449,8 +3240,10 @@ class ScheduleTaskDialog(QDialog):
         # All scheduling options are only visible if the schedule is enabled
         self.date_edit.setVisible(is_schedule_enabled)
         self.repeat_combo.setVisible(is_schedule_enabled)
+        self.run_mode_combo.setVisible(is_schedule_enabled)
         
         repeat_mode = self.repeat_combo.currentText()
+        self.missed_run_combo.setVisible(is_schedule_enabled and repeat_mode != "Do not repeat")
         
         # --- THIS IS THE KEY CHANGE ---
         # Show day/time controls for all repeating schedules except "Monthly"
@@ -3479,6 +3272,11 @@ class ScheduleTaskDialog(QDialog):
             index = self.repeat_combo.findText(repeat_str, Qt.MatchFlag.MatchFixedString)
             if index >= 0: self.repeat_combo.setCurrentIndex(index)
 
+        run_mode_index = self.run_mode_combo.findData(schedule_data.get("run_mode", RUN_MODE_AUTO))
+        if run_mode_index >= 0: self.run_mode_combo.setCurrentIndex(run_mode_index)
+        missed_run_index = self.missed_run_combo.findData(schedule_data.get("missed_run_policy", MISSED_RUN_ONCE))
+        if missed_run_index >= 0: self.missed_run_combo.setCurrentIndex(missed_run_index)
+
         selected_days = schedule_data.get("selected_days", [])
         for day, cb in self.day_checkboxes.items():
             cb.setChecked(day in selected_days)
@@ -3516,6 +3314,8 @@ class ScheduleTaskDialog(QDialog):
             "enabled": self.enable_checkbox.isChecked(),
             "start_datetime": self.date_edit.dateTime().toString(Qt.DateFormat.ISODate),
             "repeat": self.repeat_combo.currentText(),
+            "run_mode": self.run_mode_combo.currentData(),
+            "missed_run_policy": self.missed_run_combo.currentData(),
             "selected_days": selected_days,
             "time_boundary_enabled": self.enable_time_boundary_check.isChecked(),
             "start_time": self.start_time_edit.time().toString(Qt.DateFormat.ISODate),
@@ -4762,6 +4562,11 @@ class TemplateTreeWidget(QTreeWidget):
             event.ignore()        
 # --- MAIN APPLICATION WINDOW ---
 class MainWindow(QMainWindow):
+    # Longest the scheduler sleeps between checks, even if nothing is due sooner.
+    MAX_SCHEDULER_SLEEP_S = 300
+    # How long to wait before retrying a catch-up run whose previous run is still going.
+    SCHEDULER_RETRY_S = 30
+
 # In MainWindow class
     def __init__(self, parent: Optional[QWidget] = None):
         super().__init__(parent)
@@ -4786,6 +4591,7 @@ class MainWindow(QMainWindow):
         os.makedirs(self.click_image_dir, exist_ok=True)
         self.schedules_directory = os.path.join(self.base_directory, "Schedules")
         self.schedules = {}
+        self.schedule_queue = ScheduleQueue()
         self._last_focused_step_index: Optional[int] = None
         icon_path = os.path.join(self.base_directory, "app_icon.ico")
         if os.path.exists(icon_path):
@@ -4843,10 +4649,18 @@ class MainWindow(QMainWindow):
 
 
         # --- Scheduler Setup ---
+        # The timer is re-armed after every check to fire exactly when the next schedule is due.
         self.schedule_timer = QTimer(self)
+        self.schedule_timer.setSingleShot(True)
+        self.schedule_timer.setTimerType(Qt.TimerType.PreciseTimer)
         self.schedule_timer.timeout.connect(self.check_schedules)
-        self.schedule_timer.start(60000)
-        self._log_to_console("Scheduler started. Will check for due tasks every minute.")
+        self._log_to_console("Scheduler started. Will wake up when the next scheduled task is due.")
+        # Desktop bots share one desktop lock; data-only bots run in worker processes.
+        self.bot_dispatcher = BotDispatcher(self.module_directory)
+        self.scheduler_stats_file = os.path.join(self.schedules_directory, "scheduler_stats.json")
+        self.background_bot_timer = QTimer(self)
+        self.background_bot_timer.timeout.connect(self._poll_background_bots)
+        QApplication.instance().aboutToQuit.connect(self.bot_dispatcher.shutdown)
         
         # --- Load initial data ---
         self.load_all_modules_to_tree()
@@ -5420,6 +5234,21 @@ class MainWindow(QMainWindow):
                 self.schedules = {}
         else:
             self.schedules = {}
+        for message in self.schedule_queue.sync(self.schedules, datetime.now()):
+            self._log_to_console(f"Scheduler: {message}")
+        self._arm_schedule_timer()
+
+    def _arm_schedule_timer(self) -> None:
+        """Sleeps until the earliest fire time in the schedule queue (capped, to notice wall-clock changes)."""
+        if not hasattr(self, "schedule_timer"):
+            return
+        seconds = self.schedule_queue.seconds_until_next(datetime.now())
+        if seconds is None:
+            self.schedule_timer.stop()
+            return
+        # QTimer runs on a monotonic clock, so re-check at least every few minutes in case
+        # the machine slept or the system time changed.
+        self.schedule_timer.start(int(min(seconds, self.MAX_SCHEDULER_SLEEP_S) * 1000))
     
     def _toggle_execute_one_step_button(self) -> None:
         self.execute_one_step_button.setEnabled(len(self.execution_tree.selectedItems()) > 0)
@@ -6586,9 +6415,10 @@ class MainWindow(QMainWindow):
             if loop_config is None:
                 return
 
-            new_iter_var = loop_config.get("assign_iteration_to_variable")
-            if new_iter_var and new_iter_var not in self.global_variables:
-                self.global_variables[new_iter_var] = None
+            new_loop_vars = [v for v in LoopConfigDialog.variables_to_register(loop_config) if v not in self.global_variables]
+            for new_var in new_loop_vars:
+                self.global_variables[new_var] = None
+            if new_loop_vars:
                 self._update_variables_list_display()
 
             self.loop_id_counter += 1
@@ -6863,9 +6693,10 @@ class MainWindow(QMainWindow):
                 if new_loop_config is None:
                     return
 
-                new_iter_var = new_loop_config.get("assign_iteration_to_variable")
-                if new_iter_var and new_iter_var not in self.global_variables:
-                    self.global_variables[new_iter_var] = None
+                new_loop_vars = [v for v in LoopConfigDialog.variables_to_register(new_loop_config) if v not in self.global_variables]
+                for new_var in new_loop_vars:
+                    self.global_variables[new_var] = None
+                if new_loop_vars:
                     self._update_variables_list_display()
 
                 self.added_steps_data[current_row]["loop_config"] = new_loop_config
@@ -7045,9 +6876,10 @@ class MainWindow(QMainWindow):
                 new_loop_config = dialog.get_config()
                 if new_loop_config is None: return
                 
-                new_iter_var = new_loop_config.get("assign_iteration_to_variable")
-                if new_iter_var and new_iter_var not in self.global_variables:
-                    self.global_variables[new_iter_var] = None
+                new_loop_vars = [v for v in LoopConfigDialog.variables_to_register(new_loop_config) if v not in self.global_variables]
+                for new_var in new_loop_vars:
+                    self.global_variables[new_var] = None
+                if new_loop_vars:
                     self._update_variables_list_display()
 
                 self.loop_id_counter += 1
@@ -7429,6 +7261,7 @@ class MainWindow(QMainWindow):
                 return
             if not self._validate_block_structure_on_execution():
                 return
+            resume_from_checkpoint = self._ask_resume_from_checkpoint()
 
             self.is_bot_running = True
             self.is_paused = False
@@ -7493,12 +7326,37 @@ class MainWindow(QMainWindow):
                 self.module_directory, 
                 self.gui_communicator, 
                 self.global_variables,
-                self.wait_time_between_steps
+                self.wait_time_between_steps,
+                bot_name=self._current_bot_name(),
+                bot_steps_directory=self.bot_steps_directory,
+                resume_from_checkpoint=resume_from_checkpoint
             )
             self._connect_worker_signals()
             self.worker.start()
 
 
+    def _current_bot_name(self) -> str:
+        """Returns the name of the bot being edited, or 'Untitled Bot' if it has never been saved."""
+        if self.current_temp_file_path != self.default_temp_file_path:
+            return os.path.splitext(os.path.basename(self.current_temp_file_path))[0]
+        return "Untitled Bot"
+
+    def _ask_resume_from_checkpoint(self) -> bool:
+        """If an earlier run of this bot was interrupted after saving a checkpoint, asks whether to resume it."""
+        checkpoint = CheckpointStore(self.bot_steps_directory, self._current_bot_name()).describe()
+        if checkpoint is None:
+            return False
+        reply = QMessageBox.question(
+            self, "Resume Previous Run?",
+            f"A previous run of this bot stopped before finishing.\n\n"
+            f"Checkpoint saved: {checkpoint.get('saved_at', 'unknown')}\n"
+            f"Resume at step: {checkpoint.get('row', '?')}\n\n"
+            "Resume from the checkpoint? Choose 'No' to start again from step 1 (the checkpoint will be discarded).",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.Yes
+        )
+        return reply == QMessageBox.StandardButton.Yes
+
     def _validate_block_structure_on_execution(self) -> bool:
         open_blocks = []
         for step_data in self.added_steps_data:
@@ -7627,7 +7485,9 @@ class MainWindow(QMainWindow):
             self.wait_time_between_steps if execute_all else {'type': 'hardcoded', 'value': 0},
             single_step_mode=not execute_all, 
             selected_start_index=start_index,
-            selected_end_index=end_index  # NEW: Specify where to stop
+            selected_end_index=end_index,  # NEW: Specify where to stop
+            bot_name=self._current_bot_name(),
+            bot_steps_directory=self.bot_steps_directory
         )
         
         self._connect_worker_signals()
@@ -7956,6 +7816,7 @@ class MainWindow(QMainWindow):
 
         self.progress_bar.setValue(100)
         self.last_executed_context = context
+        self._finish_scheduled_desktop_bot(not stopped_by_error)
 
         is_restoring = False
         if self.minimized_for_execution:
@@ -8028,17 +7889,15 @@ class MainWindow(QMainWindow):
         # 2. If we have a message, it's an image name. Construct the full path.
         #    THIS IS THE CRITICAL FIX: We need to build the full path to the .txt file.
         image_name = message.replace("Image not found: ","")
-        image_data_filepath = os.path.join(self.click_image_dir, f"{image_name}.txt")
 
-        # 3. Check if the data file actually exists.
-        if os.path.exists(image_data_filepath):
+        # 3. Check if the image exists (as a .txt file or inside its folder's template pack).
+        if image_name in list_template_names(self.click_image_dir):
             self.label_info3.setText(image_name)
             try:
-                # 4. Open the .txt file and load the JSON data.
-                with open(image_data_filepath, 'r', encoding='utf-8') as json_file:
-                    img_data = json.load(json_file)
-                    # The image data is the first value in the dictionary
-                    base64_string = next(iter(img_data.values()), None)
+                # 4. Load the variants ({key: base64 PNG}).
+                img_data = read_template_data(self.click_image_dir, image_name)
+                # The image data is the first value in the dictionary
+                base64_string = next(iter(img_data.values()), None)
                 
                 if base64_string:
                     # 5. Decode, convert, resize, and display the image.
@@ -8709,61 +8568,98 @@ class MainWindow(QMainWindow):
 
     def check_schedules(self):
         """
-        Timer-triggered function to check for and run scheduled bots.
-        This version correctly handles multiple bots and ensures the UI is updated.
-        It now saves the current user workflow before running a scheduled task.
-        The rescheduling logic now intelligently handles time boundaries.
+        Timer-triggered function to run every scheduled bot whose fire time has come.
+        Fire times live in a min-heap (self.schedule_queue), so only due entries are
+        touched and the timer is re-armed to wake exactly at the next one. Due bots
+        that drive the desktop are queued behind the desktop lock and run in the GUI
+        one at a time; the rest start at once in background worker processes.
         """
-        if self.is_bot_running:
-            return  # Main guard: If a bot is already running, do nothing.
-
-        now = QDateTime.currentDateTime()
-        
-        bot_names = list(self.schedules.keys())
-        
-        due_bots = []
-        for bot_name in bot_names:
+        now = datetime.now()
+        while True:
+            due_entry = self.schedule_queue.pop_due(now)
+            if due_entry is None:
+                break
+            bot_name, due, anchor = due_entry
             schedule_data = self.schedules.get(bot_name)
-
             if not (schedule_data and schedule_data.get("enabled")):
                 continue
-
-            start_datetime = QDateTime.fromString(schedule_data.get("start_datetime"), Qt.DateFormat.ISODate)
-
-            if now >= start_datetime:
-                repeat_mode = schedule_data.get("repeat")
-                current_day_str = now.toString("ddd")
-                current_time = now.time()
-
-                # MODIFIED: Condition now includes new minute-based intervals
-                if repeat_mode not in ["Do not repeat", "Monthly"]:
-                    selected_days = schedule_data.get("selected_days", [])
-                    if selected_days and current_day_str not in selected_days:
-                        continue
-
-                if schedule_data.get("time_boundary_enabled", False):
-                    start_time = QTime.fromString(schedule_data.get("start_time", "00:00:00"), Qt.DateFormat.ISODate)
-                    end_time = QTime.fromString(schedule_data.get("end_time", "23:59:59"), Qt.DateFormat.ISODate)
-                    if not (start_time <= current_time <= end_time):
-                        self._log_to_console(f"Skipping '{bot_name}': Current time {current_time.toString('HH:mm:ss')} is outside boundary.")
-                        continue
-                
-                due_bots.append({
-                    "name": bot_name,
-                    "schedule": schedule_data,
-                    "start_datetime": start_datetime
-                })
-
-        if not due_bots:
-            return
-
-        bot_to_run = due_bots[0]
-        bot_name = bot_to_run["name"]
-        schedule_data = bot_to_run["schedule"]
-        start_datetime = bot_to_run["start_datetime"]
-        
+            if self.bot_dispatcher.is_pending(bot_name):
+                # The previous run is still queued or going. Catch-up retries shortly;
+                # otherwise this fire time is skipped in favour of the next regular one.
+                if schedule_data.get("missed_run_policy") == MISSED_CATCH_UP:
+                    self.schedule_queue.defer(bot_name, due, anchor, now + timedelta(seconds=self.SCHEDULER_RETRY_S))
+                else:
+                    self._log_to_console(f"Scheduler: '{bot_name}' is still running; skipping its {due.strftime('%H:%M')} run.")
+                    self._reschedule_bot(bot_name, schedule_data, anchor, policy=MISSED_SKIP)
+                continue
+            # Save the next fire time first: it rewrites the bot's CSV, which a
+            # background worker reads as soon as it is submitted.
+            dispatched_schedule = dict(schedule_data)
+            self._reschedule_bot(bot_name, schedule_data, anchor)
+            self._dispatch_scheduled_bot(bot_name, dispatched_schedule, due)
+        self._start_next_desktop_bot()
+        self._arm_schedule_timer()
+
+    def _dispatch_scheduled_bot(self, bot_name: str, schedule_data: Dict[str, Any], due: datetime) -> None:
+        """Sends one due bot to the desktop queue or to a background worker process."""
         file_path = os.path.join(self.bot_steps_directory, f"{bot_name}.csv")
-
+        loaded_data = self._load_data_from_csv(file_path)
+        if not loaded_data:
+            self._log_to_console(f"CRITICAL: Could not load data for scheduled bot '{bot_name}'. Skipping.")
+            return
+        if self.bot_dispatcher.wants_desktop(schedule_data, loaded_data[1]):
+            self.bot_dispatcher.queue_desktop(bot_name, file_path, schedule_data, due)
+            self._log_to_console(f"Scheduler: queued desktop bot '{bot_name}' ({self._format_queue_depth()}).")
+        else:
+            wait_config = self.wait_time_between_steps
+            wait_seconds = wait_config['value'] if wait_config.get('type') == 'hardcoded' else 0
+            lag = self.bot_dispatcher.submit_background(bot_name, file_path, schedule_data, due, wait_seconds)
+            self._log_to_console(f"Scheduler: started '{bot_name}' in a background process, start lag {lag:.1f}s ({self._format_queue_depth()}).")
+            if not self.background_bot_timer.isActive(): self.background_bot_timer.start(1000)
+
+    def _format_queue_depth(self) -> str:
+        depth = self.bot_dispatcher.queue_depth()
+        return (f"desktop: {depth['desktop_running']} running, {depth['desktop_waiting']} waiting; "
+                f"background: {depth['background_running']} running")
+
+    def _start_next_desktop_bot(self) -> None:
+        """Runs the next queued desktop bot in the GUI if nothing else holds the desktop."""
+        if self.is_bot_running:
+            return
+        acquired = self.bot_dispatcher.acquire_desktop()
+        if acquired is None:
+            return
+        entry, lag = acquired
+        self._log_to_console(f"Scheduler: desktop lock taken by '{entry['name']}', start lag {lag:.1f}s ({self._format_queue_depth()}).")
+        if not self._run_scheduled_bot_in_gui(entry["name"], entry["schedule"], entry["file_path"]):
+            self._finish_scheduled_desktop_bot(False)
+
+    def _finish_scheduled_desktop_bot(self, ok: bool) -> None:
+        """Releases the desktop lock after a GUI run and hands the desktop to the next queued bot."""
+        released = self.bot_dispatcher.release_desktop(ok)
+        if released is not None:
+            bot_name, stats = released
+            self._log_to_console(f"Scheduler: {format_bot_stats(bot_name, stats)}")
+            self._write_scheduler_stats()
+        # Manual runs also hold the desktop, so queued bots get their turn after those too.
+        QTimer.singleShot(0, self._start_next_desktop_bot)
+
+    def _poll_background_bots(self) -> None:
+        """Logs background bots that have finished and stops polling once none are left."""
+        for bot_name, result, stats in self.bot_dispatcher.collect_finished():
+            status = "COMPLETED" if result["ok"] else f"FAILED ({result.get('error')})"
+            self._log_to_console(f"Scheduler: background bot '{bot_name}' {status} in {result['elapsed_s']:.1f}s.")
+            self._log_to_console(f"Scheduler: {format_bot_stats(bot_name, stats)}")
+            self._write_scheduler_stats()
+        if not self.bot_dispatcher.background:
+            self.background_bot_timer.stop()
+
+    def _write_scheduler_stats(self) -> None:
+        try: self.bot_dispatcher.write_stats(self.scheduler_stats_file)
+        except OSError as e: self._log_to_console(f"Could not write scheduler stats: {e}")
+
+    def _run_scheduled_bot_in_gui(self, bot_name: str, schedule_data: Dict[str, Any], file_path: str) -> bool:
+        """Loads a scheduled bot into the canvas and runs it in focus mode. Returns False if it could not start."""
         self._log_to_console(f"Executing scheduled bot: '{bot_name}'")
 
         if self.added_steps_data:
@@ -8773,7 +8669,7 @@ class MainWindow(QMainWindow):
         loaded_data = self._load_data_from_csv(file_path)
         if not loaded_data:
             self._log_to_console(f"CRITICAL: Could not load data for scheduled bot '{bot_name}'. Skipping.")
-            return
+            return False
         
         loaded_vars, loaded_steps = loaded_data
         
@@ -8830,68 +8726,29 @@ class MainWindow(QMainWindow):
             global_variables_ref=loaded_vars,
             wait_config=self.wait_time_between_steps,
             bot_name=bot_name,
-            email_config=schedule_data
+            email_config=schedule_data,
+            bot_steps_directory=self.bot_steps_directory,
+            # A scheduled bot interrupted by a crash or reboot picks up where it left off.
+            resume_from_checkpoint=True
         )
         
         self._connect_worker_signals()
         self.worker.start()
         
-        # --- START: MODIFIED INTELLIGENT RESCHEDULING LOGIC ---
-        repeat_mode = schedule_data.get("repeat")
-        if repeat_mode != "Do not repeat":
-            
-            base_time = QDateTime.currentDateTime()
-            next_run_time = base_time # Initialize
-            
-            # 1. Calculate the simple next run time
-            if repeat_mode == "Every 5 minutes":
-                next_run_time = base_time.addSecs(300) # 5 * 60
-            elif repeat_mode == "Every 15 minutes":
-                next_run_time = base_time.addSecs(900) # 15 * 60
-            elif repeat_mode == "Every 30 minutes":
-                next_run_time = base_time.addSecs(1800) # 30 * 60
-            elif repeat_mode == "Hourly":
-                next_run_time = base_time.addSecs(3600)
-            elif repeat_mode == "Daily":
-                next_run_time = base_time.addDays(1)
-            elif repeat_mode == "Monthly":
-                next_run_time = base_time.addMonths(1)
-            
-            # 2. Check if boundaries apply and adjust if necessary
-            if schedule_data.get("time_boundary_enabled", False):
-                start_time = QTime.fromString(schedule_data.get("start_time", "00:00:00"), Qt.DateFormat.ISODate)
-                end_time = QTime.fromString(schedule_data.get("end_time", "23:59:59"), Qt.DateFormat.ISODate)
-                
-                # If the next run time is after today's end time...
-                if next_run_time.time() > end_time:
-                    self._log_to_console(f"Next run at {next_run_time.time().toString('HH:mm')} is after end time {end_time.toString('HH:mm')}. Finding next valid day.")
-                    # ...move to the next day and set the time to the start of the boundary
-                    next_run_time = next_run_time.addDays(1)
-                    next_run_time.setTime(start_time)
-
-            # 3. Find the next valid day of the week if specified
-            selected_days = schedule_data.get("selected_days", [])
-            if selected_days and repeat_mode != "Monthly": # Day of week is less relevant for monthly
-                # Keep adding one day until we land on a selected day
-                while next_run_time.toString("ddd") not in selected_days:
-                    next_run_time = next_run_time.addDays(1)
-                    # When jumping to a new day, always reset to the start time if boundary is enabled
-                    if schedule_data.get("time_boundary_enabled", False):
-                        next_run_time.setTime(QTime.fromString(schedule_data.get("start_time"), Qt.DateFormat.ISODate))
-            
-            schedule_data["start_datetime"] = next_run_time.toString(Qt.DateFormat.ISODate)
-
-        else: # "Do not repeat"
-            schedule_data["enabled"] = False
-        # --- END: MODIFIED INTELLIGENT RESCHEDULING LOGIC ---
-        
+        return True
+
+    def _reschedule_bot(self, bot_name: str, schedule_data: Dict[str, Any], anchor: datetime, policy: Optional[str] = None) -> None:
+        """Moves a bot's schedule to the fire time after 'anchor' (or disables a one-off schedule) and saves it."""
+        next_fire = self.schedule_queue.reschedule(bot_name, schedule_data, anchor, datetime.now(), policy)
+
+        file_path = os.path.join(self.bot_steps_directory, f"{bot_name}.csv")
         self.schedules[bot_name] = schedule_data
         self.save_schedules()
         self._write_schedule_to_csv(file_path, schedule_data)
         self.load_saved_steps_to_tree()
 
-        if repeat_mode != "Do not repeat":
-            self._log_to_console(f"Rescheduled '{bot_name}' to run next at {schedule_data['start_datetime']}")
+        if next_fire is not None:
+            self._log_to_console(f"Rescheduled '{bot_name}' to run next at {next_fire.isoformat(timespec='seconds')}")
         else:
             self._log_to_console(f"Disabled non-repeating schedule for '{bot_name}'.")
 
@@ -8913,15 +8770,19 @@ class MainWindow(QMainWindow):
             return None
 
     def _write_schedule_to_csv(self, file_path: str, schedule_data: Dict[str, Any]) -> bool:
-        """Writes or updates the schedule info in a bot's CSV file."""
+        """
+        Writes or updates the schedule info in a bot's CSV file. The file is written to a
+        temporary file and swapped in, so a bot process reading it never sees it half-written.
+        """
         lines = []
         schedule_written = False
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
         try:
             if os.path.exists(file_path):
                 with open(file_path, 'r', newline='', encoding='utf-8') as f:
                     lines = list(csv.reader(f))
 
-            with open(file_path, 'w', newline='', encoding='utf-8') as f:
+            with open(temp_path, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
                 
                 try:
@@ -8937,9 +8798,13 @@ class MainWindow(QMainWindow):
                     writer.writerow(["__SCHEDULE_INFO__"])
                     writer.writerow([json.dumps(schedule_data)])
                     writer.writerows(lines)
+            os.replace(temp_path, file_path)
             return True
         except Exception as e:
             self._log_to_console(f"Error writing schedule to {file_path}: {e}")
+            if os.path.exists(temp_path):
+                try: os.remove(temp_path)
+                except OSError: pass
             return False
             
     def _log_to_console(self, message: str) -> None:
@@ -9142,27 +9007,12 @@ class MainWindow(QMainWindow):
 
     def _get_image_filenames(self) -> List[str]:
             """Gets a sorted list of image names, including relative paths from subfolders."""
-            relative_paths: List[str] = []
             if not os.path.exists(self.click_image_dir):
                 return []
                 
-            for root, _, files in os.walk(self.click_image_dir):
-                for filename in files:
-                    if filename.lower().endswith(".txt"):
-                        full_path = os.path.join(root, filename)
-                        # Get the path relative to click_image_dir
-                        relative_path = os.path.relpath(full_path, self.click_image_dir)
-                        
-                        # If the file is in the root, relpath is "filename.txt"
-                        # If in subfolder, it's "Subfolder/filename.txt"
-                        
-                        # Remove the .txt extension
-                        relative_path_no_ext = os.path.splitext(relative_path)[0]
-                        
-                        # Standardize on '/' for path separators
-                        relative_paths.append(relative_path_no_ext.replace(os.sep, '/'))
-                            
-            return sorted(relative_paths)
+            # "filename" for root files, "Subfolder/filename" otherwise, from .txt files
+            # and template packs alike
+            return list_template_names(self.click_image_dir)
         
     def _set_step_execution_status(self, step_data: Dict[str, Any], status: str):
             """Sets the execution status for a step in both tree and workflow views."""
@@ -23,6 +23,7 @@ import pyautogui
 import re # Needed for RPA step parsing if you re-add it, or for file list parsing
 import time # Added this import, as it was used but not imported in Old_utility
 from PyQt6.QtCore import pyqtSlot
+from my_lib.template_pack import TemplatePack, list_template_names, read_template_data, split_template_name
 
 # ... (The Old_utility class is unchanged) ...
 class Old_utility:
@@ -567,15 +568,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow_Base):
                 folder_name = os.path.relpath(root, self.click_image_dir).replace(os.sep, '/')
                 self._folder_list.append(folder_name)
                 
-            # Add files
-            for file in files:
-                if file.lower().endswith(".txt"):
-                    full_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(full_path, self.click_image_dir)
-                    # Get path without extension and standardize separators
-                    path_no_ext = os.path.splitext(relative_path)[0].replace(os.sep, '/')
-                    self._all_image_paths.append(path_no_ext)
-                    
+        # Add files (.txt templates and the templates inside each folder's pack)
+        self._all_image_paths = list_template_names(self.click_image_dir)
         self._all_image_paths.sort()
         self._folder_list.sort()
 
@@ -759,6 +753,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow_Base):
             relative_path_no_ext = file_name
             
         file_path_txt = os.path.join(self.click_image_dir, relative_path_no_ext + ".txt")
+        # Folders that were imported into a template pack are saved to the pack instead
+        pack = TemplatePack.for_folder(os.path.join(self.click_image_dir, selected_folder))
         # ---
 
         file_name_exists_in_all_paths = relative_path_no_ext in self._all_image_paths
@@ -780,8 +776,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow_Base):
 
         if load_existing:
             try:
-                with open(file_path_txt, 'r') as json_file:
-                    self.img_data = json.load(json_file)
+                self.img_data = read_template_data(self.click_image_dir, relative_path_no_ext)
             except (FileNotFoundError, json.JSONDecodeError):
                 self.img_data = {} # If file is missing/corrupt, start new
 
@@ -804,9 +799,17 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow_Base):
             # Ensure the subfolder exists (it should, but check)
             os.makedirs(os.path.dirname(file_path_txt), exist_ok=True)
             
-            with open(file_path_txt, 'w') as outfile:
-                json.dump(self.img_data, outfile, indent=4)
-            self.show_info_messagebox(f"Image saved as '{new_image_key}' in '{relative_path_no_ext}.txt'")
+            if pack.exists():
+                if load_existing and pack.refresh() and file_name in pack:
+                    pack.add_variant(file_name, new_image_key, self.current_pic) # Only the new variant is written
+                else:
+                    # New, or still a .txt file: write every variant, so none of the .txt ones is left behind
+                    pack.put_template(file_name, self.img_data)
+                self.show_info_messagebox(f"Image saved as '{new_image_key}' in '{relative_path_no_ext}' (template pack)")
+            else:
+                with open(file_path_txt, 'w') as outfile:
+                    json.dump(self.img_data, outfile, indent=4)
+                self.show_info_messagebox(f"Image saved as '{new_image_key}' in '{relative_path_no_ext}.txt'")
 
             # If the file_name was new, add it to our lists
             if not file_name_exists_in_all_paths:
@@ -845,9 +848,23 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow_Base):
                 self.KPI_botcomment_txt.takeItem(self.KPI_botcomment_txt.row(selected_item))
                 
                 file_path_txt = os.path.join(self.click_image_dir, file_name_with_path + ".txt")
+                folder, base_name = split_template_name(file_name_with_path)
+                pack = TemplatePack.for_folder(os.path.join(self.click_image_dir, folder))
 
                 try:
-                    if self.img_data:
+                    if pack.refresh() and base_name in pack:
+                        # Drops the variant (and the template with its last variant) from the pack index
+                        pack.remove_variant(base_name, item_key_to_delete)
+                    if self.img_data and base_name in pack:
+                        self.show_info_messagebox(f"Image '{item_key_to_delete}' deleted successfully.")
+                        if self.KPI_botcomment_txt.count() > 0:
+                            self.KPI_botcomment_txt.setCurrentRow(0)
+                            self.KPI_txt()
+                        else: 
+                            self.current_pic = '' 
+                            self.click_img.clear()
+                            self.screenshotSaved.emit("")
+                    elif self.img_data:
                         # Save the file with the item removed
                         with open(file_path_txt, 'w') as outfile:
                             json.dump(self.img_data, outfile, indent=4)
@@ -861,7 +878,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow_Base):
                             self.screenshotSaved.emit("")
                     else: 
                         # If img_data became empty, remove the file
-                        os.remove(file_path_txt)
+                        if os.path.exists(file_path_txt) or not pack.exists():
+                            os.remove(file_path_txt)
                         self.show_info_messagebox(f"Image '{item_key_to_delete}' deleted and file '{file_name_with_path}.txt' removed as it is now empty.")
                         self.current_pic = ''
                         self.click_img.clear()
@@ -905,10 +923,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow_Base):
         # --- END OF ADDED BLOCK ---
         
         if current_file_name:
-            file_path_txt = os.path.join(self.click_image_dir, current_file_name + ".txt")
             try:
-                with open(file_path_txt, 'r') as json_file:
-                    self.img_data = json.load(json_file) # Update instance attribute
+                self.img_data = read_template_data(self.click_image_dir, current_file_name) # Update instance attribute
                 if self.img_data:
                     for imge_name, data in self.img_data.items():
                         self.KPI_botcomment_txt.addItem(imge_name)
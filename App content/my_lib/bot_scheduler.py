@@ -0,0 +1,176 @@
+# bot_scheduler.py
+import os
+import json
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from my_lib.step_engine import run_bot_file
+
+
+# Schedule 'run_mode' values.
+RUN_MODE_AUTO = "auto"
+RUN_MODE_DESKTOP = "desktop"
+RUN_MODE_BACKGROUND = "background"
+
+
+# Modules that drive the mouse, keyboard, screen or a browser window. Bots using them wait
+# for the desktop lock; file, data and API modules run fine in a background process.
+DESKTOP_MODULES = {"Gui_Automate", "Mouse_Key_Automate", "Bot_GUI_Control", "Chrome_selenium"}
+
+
+def bot_uses_desktop(steps: List[Dict[str, Any]]) -> bool:
+    """True if any step calls a module that drives the mouse, keyboard, screen or a browser."""
+    return any(step.get("type") == "step" and step.get("module_name") in DESKTOP_MODULES for step in steps)
+
+
+def run_scheduled_bot(file_path: str, module_directory: str, wait_seconds: float = 0,
+                      email_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Entry point for a background bot inside a worker process. Runs the bot headless
+    (resuming from a checkpoint if one exists) and returns a picklable summary,
+    since the ExecutionContext itself cannot cross the process boundary.
+    """
+    started = time.perf_counter()
+    try:
+        context, stopped_by_error, _ = run_bot_file(
+            file_path, module_directory=module_directory, wait_seconds=wait_seconds,
+            email_config=email_config, resume_from_checkpoint=True
+        )
+        logs = list(context.logs)
+        error = next((line for line in reversed(logs) if "Error at step" in line), None) if stopped_by_error else None
+        return {"ok": not stopped_by_error, "error": error, "elapsed_s": time.perf_counter() - started, "log_tail": logs[-20:]}
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}", "elapsed_s": time.perf_counter() - started, "log_tail": []}
+
+
+class BotDispatcher:
+    """
+    Decides where each due scheduled bot runs and keeps per-bot throughput stats.
+
+    Bots that drive the desktop share one "desktop lock": they wait in a FIFO
+    queue and the GUI runs them one at a time, as before. All other bots run
+    headless in a pool of worker processes, so a long desktop bot no longer
+    starves short data bots. The dispatcher holds no Qt objects; MainWindow
+    polls it from its timers.
+    """
+    def __init__(self, module_directory: str, max_background_workers: int = 4):
+        self.module_directory = module_directory
+        self.max_background_workers = max_background_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Entries are dicts with 'name', 'file_path', 'schedule', 'due', 'queued_at'.
+        self.desktop_queue: Deque[Dict[str, Any]] = deque()
+        self.active_desktop: Optional[Dict[str, Any]] = None
+        self.background: Dict[str, Tuple[Dict[str, Any], Future]] = {}
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def wants_desktop(schedule_data: Dict[str, Any], steps: List[Dict[str, Any]]) -> bool:
+        """Applies the schedule's run_mode, falling back to inspecting the bot's steps."""
+        run_mode = schedule_data.get("run_mode", RUN_MODE_AUTO)
+        if run_mode == RUN_MODE_DESKTOP: return True
+        if run_mode == RUN_MODE_BACKGROUND: return False
+        return bot_uses_desktop(steps)
+
+    def is_pending(self, bot_name: str) -> bool:
+        """True if the bot is queued, running on the desktop or running in the background."""
+        if self.active_desktop and self.active_desktop["name"] == bot_name: return True
+        if bot_name in self.background: return True
+        return any(entry["name"] == bot_name for entry in self.desktop_queue)
+
+    def queue_depth(self) -> Dict[str, int]:
+        return {"desktop_waiting": len(self.desktop_queue), "desktop_running": 1 if self.active_desktop else 0,
+                "background_running": len(self.background)}
+
+    def _entry(self, bot_name: str, file_path: str, schedule_data: Dict[str, Any], due: datetime) -> Dict[str, Any]:
+        return {"name": bot_name, "file_path": file_path, "schedule": schedule_data, "due": due, "queued_at": datetime.now()}
+
+    def _record_start(self, entry: Dict[str, Any]) -> float:
+        lag = max(0.0, (datetime.now() - entry["due"]).total_seconds())
+        stats = self.stats.setdefault(entry["name"], {"runs": 0, "failures": 0, "total_lag_s": 0.0, "max_lag_s": 0.0,
+                                                      "last_lag_s": 0.0, "total_run_s": 0.0, "last_status": None})
+        stats["runs"] += 1
+        stats["total_lag_s"] += lag
+        stats["max_lag_s"] = max(stats["max_lag_s"], lag)
+        stats["last_lag_s"] = lag
+        stats["last_started"] = datetime.now().isoformat(timespec="seconds")
+        stats["mode"] = "desktop" if entry is self.active_desktop else "background"
+        return lag
+
+    def _record_finish(self, bot_name: str, ok: bool, elapsed_s: float) -> Dict[str, Any]:
+        stats = self.stats.get(bot_name, {})
+        if stats:
+            stats["total_run_s"] += elapsed_s
+            stats["last_run_s"] = elapsed_s
+            stats["last_status"] = "COMPLETED" if ok else "FAILED"
+            if not ok: stats["failures"] += 1
+        return stats
+
+    # --- Background (worker process) bots ---
+    def submit_background(self, bot_name: str, file_path: str, schedule_data: Dict[str, Any],
+                          due: datetime, wait_seconds: float = 0) -> float:
+        """Starts a bot in a worker process and returns its start lag in seconds."""
+        if self._pool is None:
+            # 'spawn' keeps the Qt state of the parent out of the children on every platform.
+            self._pool = ProcessPoolExecutor(max_workers=self.max_background_workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        entry = self._entry(bot_name, file_path, schedule_data, due)
+        future = self._pool.submit(run_scheduled_bot, file_path, self.module_directory, wait_seconds, schedule_data)
+        self.background[bot_name] = (entry, future)
+        return self._record_start(entry)
+
+    def collect_finished(self) -> List[Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+        """Returns (bot name, result summary, stats) for each background bot that has finished since the last call."""
+        finished = []
+        for bot_name, (entry, future) in list(self.background.items()):
+            if not future.done():
+                continue
+            del self.background[bot_name]
+            try:
+                result = future.result()
+            except Exception as e:  # The worker process itself died.
+                result = {"ok": False, "error": f"{type(e).__name__}: {e}", "elapsed_s": (datetime.now() - entry["queued_at"]).total_seconds(), "log_tail": []}
+            finished.append((bot_name, result, self._record_finish(bot_name, result["ok"], result["elapsed_s"])))
+        return finished
+
+    # --- Desktop bots (serialized behind the desktop lock) ---
+    def queue_desktop(self, bot_name: str, file_path: str, schedule_data: Dict[str, Any], due: datetime) -> None:
+        self.desktop_queue.append(self._entry(bot_name, file_path, schedule_data, due))
+
+    def acquire_desktop(self) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Takes the desktop lock for the next queued bot; returns (entry, start lag) or None if busy/empty."""
+        if self.active_desktop is not None or not self.desktop_queue:
+            return None
+        self.active_desktop = self.desktop_queue.popleft()
+        return self.active_desktop, self._record_start(self.active_desktop)
+
+    def release_desktop(self, ok: bool) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Releases the desktop lock after the GUI run finishes; returns (bot name, stats) or None."""
+        entry, self.active_desktop = self.active_desktop, None
+        if entry is None:
+            return None
+        elapsed = (datetime.now() - datetime.fromisoformat(self.stats[entry["name"]]["last_started"])).total_seconds()
+        return entry["name"], self._record_finish(entry["name"], ok, elapsed)
+
+    def write_stats(self, file_path: str) -> None:
+        """Writes per-bot lag/run statistics and the current queue depth as JSON."""
+        payload = {"updated_at": datetime.now().isoformat(timespec="seconds"), "queue_depth": self.queue_depth(), "bots": self.stats}
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=4)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def format_bot_stats(bot_name: str, stats: Dict[str, Any]) -> str:
+    """One log line summarizing a bot's scheduling history."""
+    runs = stats.get("runs", 0) or 1
+    return (f"'{bot_name}': {stats.get('runs', 0)} run(s), {stats.get('failures', 0)} failed, "
+            f"start lag last {stats.get('last_lag_s', 0.0):.1f}s / avg {stats.get('total_lag_s', 0.0) / runs:.1f}s / "
+            f"max {stats.get('max_lag_s', 0.0):.1f}s, avg run {stats.get('total_run_s', 0.0) / runs:.1f}s")
@@ -0,0 +1,134 @@
+# checkpoint.py
+import os
+import json
+import glob
+import pickle
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+
+CHECKPOINT_VERSION = 1
+
+
+def steps_fingerprint(steps: List[Dict[str, Any]]) -> str:
+    """
+    Hashes the structure of a step list (markers, ids and called methods), so a
+    checkpoint is only resumed against the same bot it was taken from. Runtime
+    keys the GUI adds to steps (execution status, row index) are ignored.
+    """
+    digest = hashlib.sha1()
+    for step in steps:
+        key = (step.get("type"), step.get("loop_id"), step.get("if_id"), step.get("group_id"),
+               step.get("module_name"), step.get("class_name"), step.get("method_name"))
+        digest.update(repr(key).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _json_safe(value: Any) -> bool:
+    """True if value survives a JSON round trip unchanged in type (tuples and sets do not)."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return True
+    if isinstance(value, list):
+        return all(_json_safe(v) for v in value)
+    if isinstance(value, dict):
+        return all(isinstance(k, str) and _json_safe(v) for k, v in value.items())
+    return False
+
+
+class CheckpointStore:
+    """
+    Saves and restores the execution state of one bot run on disk.
+
+    A checkpoint lives in '<bot name>.checkpoint/' next to the bot file and holds
+    'state.json' (step index, loop/IF/group stacks and JSON-friendly variables)
+    plus one pickle sidecar per variable that JSON cannot hold, such as a
+    DataFrame. Sidecars carry the checkpoint's generation number and state.json
+    is replaced atomically, so a crash while writing leaves the previous
+    checkpoint intact.
+    """
+    def __init__(self, directory: str, bot_name: str):
+        safe_name = "".join(c if c not in '\\/:*?"<>|' else "_" for c in bot_name)
+        self.path = os.path.join(directory, f"{safe_name}.checkpoint")
+        self.state_file = os.path.join(self.path, "state.json")
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.state_file)
+
+    def _read_state(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def describe(self) -> Optional[Dict[str, Any]]:
+        """Returns the saved state without loading any sidecar, or None if there is no checkpoint."""
+        state = self._read_state()
+        if not state or state.get("version") != CHECKPOINT_VERSION:
+            return None
+        return state
+
+    def save(self, state: Dict[str, Any], variables: Dict[str, Any]) -> List[str]:
+        """
+        Writes a new checkpoint. 'state' must be JSON-serializable. Returns the names
+        of variables that could not be saved (neither JSON nor picklable).
+        """
+        os.makedirs(self.path, exist_ok=True)
+        previous = self._read_state() or {}
+        generation = previous.get("generation", 0) + 1
+
+        inline, sidecars, skipped = {}, {}, []
+        for index, (name, value) in enumerate(variables.items()):
+            if _json_safe(value):
+                inline[name] = value
+                continue
+            file_name = f"var{index}.g{generation}.pkl"
+            try:
+                with open(os.path.join(self.path, file_name), "wb") as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                sidecars[name] = file_name
+            except Exception:
+                skipped.append(name)
+
+        payload = dict(state)
+        payload.update({
+            "version": CHECKPOINT_VERSION,
+            "generation": generation,
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+            "variables": inline,
+            "sidecars": sidecars,
+            "skipped_variables": skipped,
+        })
+        temp_file = self.state_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(temp_file, self.state_file)
+
+        # Only now is it safe to drop the sidecars of the previous generation.
+        for old_file in glob.glob(os.path.join(self.path, "*.pkl")):
+            if not old_file.endswith(f".g{generation}.pkl"):
+                try: os.remove(old_file)
+                except OSError: pass
+        return skipped
+
+    def load(self) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Returns (state, variables) with sidecars unpickled, or None if there is no usable checkpoint."""
+        state = self.describe()
+        if state is None:
+            return None
+        variables = dict(state.get("variables", {}))
+        for name, file_name in state.get("sidecars", {}).items():
+            with open(os.path.join(self.path, file_name), "rb") as f:
+                variables[name] = pickle.load(f)
+        return state, variables
+
+    def clear(self) -> None:
+        """Deletes the checkpoint, e.g. after the run it belongs to has completed."""
+        if not os.path.isdir(self.path):
+            return
+        for file_path in glob.glob(os.path.join(self.path, "*")):
+            try: os.remove(file_path)
+            except OSError: pass
+        try: os.rmdir(self.path)
+        except OSError: pass
@@ -0,0 +1,113 @@
+# execution_plan.py
+from typing import Any, Dict, List, Optional
+
+
+BLOCK_START_TYPES = ("loop_start", "IF_START", "group_start")
+BLOCK_END_TYPES = ("loop_end", "IF_END", "group_end")
+
+# Maps each block start marker to (id key, matching end marker type).
+_BLOCK_MARKERS = {
+    "loop_start": ("loop_id", "loop_end"),
+    "IF_START": ("if_id", "IF_END"),
+    "group_start": ("group_id", "group_end"),
+}
+_END_TO_START = {end_type: start_type for start_type, (_, end_type) in _BLOCK_MARKERS.items()}
+
+
+class ExecutionPlan:
+    """
+    A precompiled view of a flat step list, built once before a run starts.
+
+    It pairs every loop_start/loop_end, IF_START/ELSE/IF_END and
+    group_start/group_end marker so the ExecutionWorker can jump between
+    them with a dictionary lookup instead of re-scanning the step list
+    every time a loop finishes or a branch is taken.
+    """
+    def __init__(self, steps: List[Dict[str, Any]]):
+        self.steps = steps
+        # start marker index -> matching end marker index
+        self.block_end: Dict[int, int] = {}
+        # end marker index -> matching start marker index
+        self.block_start: Dict[int, int] = {}
+        # IF_START index -> ELSE index (only for IF blocks that have an ELSE)
+        self.else_index: Dict[int, int] = {}
+        # ELSE index -> owning IF_START index
+        self.else_owner: Dict[int, int] = {}
+        # index -> innermost enclosing block start index (-1 for top level)
+        self.parent_index: List[int] = []
+        self._compile()
+
+    def _compile(self) -> None:
+        open_blocks: List[int] = []
+        for index, step in enumerate(self.steps):
+            step_type = step.get("type")
+            self.parent_index.append(open_blocks[-1] if open_blocks else -1)
+
+            if step_type in _BLOCK_MARKERS:
+                open_blocks.append(index)
+            elif step_type == "ELSE":
+                start_index = self._find_open_block(open_blocks, "IF_START", step.get("if_id"))
+                if start_index != -1:
+                    self.else_index[start_index] = index
+                    self.else_owner[index] = start_index
+            elif step_type in BLOCK_END_TYPES:
+                start_type = _END_TO_START[step_type]
+                id_key = _BLOCK_MARKERS[start_type][0]
+                start_index = self._find_open_block(open_blocks, start_type, step.get(id_key))
+                if start_index != -1:
+                    # Anything opened after the matching start was never closed; drop it.
+                    del open_blocks[open_blocks.index(start_index):]
+                    self.block_end[start_index] = index
+                    self.block_start[index] = start_index
+                    # The end marker belongs to the same level as its start marker.
+                    self.parent_index[index] = self.parent_index[start_index]
+
+    def _find_open_block(self, open_blocks: List[int], start_type: str, block_id: Any) -> int:
+        """Returns the innermost open block of the given type and id, or -1."""
+        id_key = _BLOCK_MARKERS[start_type][0]
+        for start_index in reversed(open_blocks):
+            start_step = self.steps[start_index]
+            if start_step.get("type") == start_type and start_step.get(id_key) == block_id:
+                return start_index
+        return -1
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def loop_end_for(self, loop_start_index: int) -> int:
+        """Returns the index of the loop_end paired with a loop_start, or -1."""
+        return self.block_end.get(loop_start_index, -1)
+
+    def false_branch_target(self, if_start_index: int) -> int:
+        """Returns the ELSE (or IF_END when there is no ELSE) for an IF_START, or -1."""
+        if if_start_index in self.else_index:
+            return self.else_index[if_start_index]
+        return self.block_end.get(if_start_index, -1)
+
+    def if_end_for_else(self, else_index: int) -> int:
+        """Returns the IF_END that closes the IF block an ELSE belongs to, or -1."""
+        if_start_index = self.else_owner.get(else_index)
+        if if_start_index is None:
+            return -1
+        return self.block_end.get(if_start_index, -1)
+
+    def block_contains(self, start_index: int, target_index: int) -> bool:
+        """True if target_index lies within the block opened at start_index (markers included)."""
+        end_index = self.block_end.get(start_index)
+        if end_index is None:
+            return False
+        return start_index <= target_index <= end_index
+
+    def trim_stack_for_jump(self, stack: List[Dict[str, Any]], target_index: int) -> List[Dict[str, Any]]:
+        """
+        Pops stack frames (loop, IF or group) whose block does not contain the jump
+        target, innermost first. Frames without a recorded 'start_index' are kept.
+        Returns the list of frames that were removed.
+        """
+        removed = []
+        while stack:
+            start_index: Optional[int] = stack[-1].get("start_index")
+            if start_index is None or self.block_contains(start_index, target_index):
+                break
+            removed.append(stack.pop())
+        return removed
@@ -0,0 +1,119 @@
+# hit_memory.py
+import os
+import json
+import time
+import atexit
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+# (width, height, dpi) of the screen a hit was recorded on.
+ScreenInfo = Tuple[int, int, int]
+
+# Pixels searched around a remembered hit, so a button that shifted slightly is still found there.
+HIT_REGION_PADDING = 48
+# Changed entries are written at most this often (and once more at exit).
+FLUSH_INTERVAL_S = 5.0
+
+
+class HitRegionMemory:
+    """
+    Remembers where each Click_image template was last found on screen.
+
+    Lookups try a padded region around the last hit before searching the
+    whole screen; in SAP GUI and browser flows the same button is usually in
+    the same place every time. Entries record the template file's mtime and
+    the screen resolution and DPI, and are dropped when either differs. The
+    memory is kept in a small JSON sidecar next to Click_image/ and is only
+    rewritten when a hit moves.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty = False
+        self._last_flush = 0.0
+        self.region_hits = 0
+        self.region_misses = 0
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f).get("templates", {})
+            except (OSError, ValueError, AttributeError):
+                self._entries = {}
+        return self._entries
+
+    def lookup(self, image_name: str, stamp: Optional[int], screen: ScreenInfo) -> Optional[Dict[str, Any]]:
+        """Returns the remembered hit for a template, or None (dropping it if the template or screen changed)."""
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(image_name)
+            if entry is None:
+                return None
+            if entry.get("stamp") != stamp or tuple(entry.get("screen", ())) != tuple(screen):
+                del entries[image_name]
+                self._dirty = True
+                return None
+            return entry
+
+    def search_region(self, entry: Dict[str, Any], screen: ScreenInfo) -> Tuple[int, int, int, int]:
+        """The padded (left, top, width, height) around a remembered hit, clipped to the screen."""
+        left = max(0, entry["left"] - HIT_REGION_PADDING)
+        top = max(0, entry["top"] - HIT_REGION_PADDING)
+        right = min(screen[0], entry["left"] + entry["width"] + HIT_REGION_PADDING)
+        bottom = min(screen[1], entry["top"] + entry["height"] + HIT_REGION_PADDING)
+        return left, top, max(0, right - left), max(0, bottom - top)
+
+    def remember(self, image_name: str, stamp: Optional[int], screen: ScreenInfo, match: Dict[str, Any]) -> None:
+        entry = {"left": match["left"], "top": match["top"], "width": match["width"], "height": match["height"],
+                 "stamp": stamp, "screen": list(screen)}
+        with self._lock:
+            entries = self._load()
+            if entries.get(image_name) != entry:
+                entries[image_name] = entry
+                self._dirty = True
+            if self._dirty and time.monotonic() - self._last_flush >= FLUSH_INTERVAL_S:
+                self.flush()
+
+    def flush(self) -> None:
+        """Writes the memory to disk if it changed; a failed write is retried on the next flush."""
+        with self._lock:
+            if not self._dirty or self._entries is None:
+                return
+            self._last_flush = time.monotonic()
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                temp_file = f"{self.path}.{os.getpid()}.tmp"
+                with open(temp_file, "w", encoding="utf-8") as f:
+                    json.dump({"templates": self._entries}, f)
+                os.replace(temp_file, self.path)
+                self._dirty = False
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"region_hits": self.region_hits, "region_misses": self.region_misses,
+                    "remembered": len(self._load())}
+
+
+_memories: Dict[str, HitRegionMemory] = {}
+_memories_lock = threading.Lock()
+
+
+def hit_memory_for(click_image_dir: str) -> HitRegionMemory:
+    """Returns the process-wide memory for a Click_image folder, stored as '<folder>_hits.json' beside it."""
+    path = os.path.normpath(click_image_dir) + "_hits.json"
+    with _memories_lock:
+        memory = _memories.get(path)
+        if memory is None:
+            memory = _memories[path] = HitRegionMemory(path)
+        return memory
+
+
+@atexit.register
+def _flush_all() -> None:
+    for memory in list(_memories.values()):
+        memory.flush()
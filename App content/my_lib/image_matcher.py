@@ -0,0 +1,339 @@
+# image_matcher.py
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+import PIL.Image
+
+from my_lib.template_cache import TemplateVariant
+from my_lib.hit_memory import HitRegionMemory, ScreenInfo
+from my_lib.polling import AdaptiveBackoff
+
+
+# (left, top, width, height) in screen pixels, as used by pyautogui.
+Region = Tuple[int, int, int, int]
+# Returns a grayscale uint8 frame of the given region (or of the whole screen for None).
+FrameSource = Callable[[Optional[Region]], np.ndarray]
+
+
+def screen_frame_source(region: Optional[Region] = None) -> np.ndarray:
+    """Grabs the primary screen (the same surface pyautogui clicks on) as a grayscale array."""
+    from PIL import ImageGrab
+    bbox = None if region is None else (region[0], region[1], region[0] + region[2], region[1] + region[3])
+    return np.asarray(ImageGrab.grab(bbox=bbox).convert("L"))
+
+
+_screen_info_cache: Tuple[float, Optional[ScreenInfo]] = (0.0, None)
+
+
+def desktop_screen_info() -> ScreenInfo:
+    """(width, height, dpi) of the primary screen; DPI is 0 where the system does not report it."""
+    global _screen_info_cache
+    try:
+        import ctypes
+        user32 = ctypes.windll.user32
+        dpi = user32.GetDpiForSystem() if hasattr(user32, "GetDpiForSystem") else 96
+        return user32.GetSystemMetrics(0), user32.GetSystemMetrics(1), int(dpi)
+    except (AttributeError, OSError):
+        # Not on Windows: measure a screenshot, at most every few seconds.
+        checked_at, info = _screen_info_cache
+        if info is None or time.monotonic() - checked_at > 5:
+            from PIL import ImageGrab
+            width, height = ImageGrab.grab().size
+            info = (width, height, 0)
+            _screen_info_cache = (time.monotonic(), info)
+        return info
+
+
+class StoredFrameSource:
+    """
+    Serves stored screenshots instead of the live screen, one per capture
+    (repeating the last one), so lookups can be replayed on any platform.
+    """
+    def __init__(self, frames: Sequence[Any]):
+        self._frames = [self._to_gray(frame) for frame in frames]
+        self.captures = 0
+
+    @staticmethod
+    def _to_gray(frame: Any) -> np.ndarray:
+        if isinstance(frame, str):
+            with PIL.Image.open(frame) as img:
+                return np.array(img.convert("L"))
+        if isinstance(frame, PIL.Image.Image):
+            return np.array(frame.convert("L"))
+        frame = np.asarray(frame)
+        return frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+
+    def __call__(self, region: Optional[Region] = None) -> np.ndarray:
+        frame = self._frames[min(self.captures, len(self._frames) - 1)]
+        self.captures += 1
+        if region is None:
+            return frame
+        left, top, width, height = region
+        return frame[top:top + height, left:left + width]
+
+    def screen_info(self) -> ScreenInfo:
+        height, width = self._frames[min(self.captures, len(self._frames) - 1)].shape
+        return width, height, 0
+
+
+# A set of templates to look for: (image name, its decoded variants).
+TemplateSet = List[Tuple[str, List[TemplateVariant]]]
+
+# Matching backends, selectable per step.
+BACKEND_FULL = "full"        # exact NCC over the full-resolution frame
+BACKEND_PYRAMID = "pyramid"  # NCC on a downscaled frame, refined at full resolution around the peaks
+MATCH_BACKENDS = (BACKEND_FULL, BACKEND_PYRAMID)
+
+# Templates smaller than this (in pixels, after halving) are matched at full resolution.
+PYRAMID_MIN_TEMPLATE = 16
+# Halving blurs fine detail and a 1-pixel shift, so the true spot can score well below
+# the confidence on the coarse level; the best few peaks above this floor are all refined.
+PYRAMID_COARSE_FLOOR = 0.4
+PYRAMID_MAX_CANDIDATES = 10
+
+
+def _match_variant(frame: np.ndarray, template: np.ndarray) -> Tuple[float, Tuple[int, int]]:
+    """Best normalized cross-correlation score of one template over a frame and its top-left position."""
+    if template.shape[0] > frame.shape[0] or template.shape[1] > frame.shape[1]:
+        return 0.0, (0, 0)
+    result = cv2.matchTemplate(frame, template, cv2.TM_CCOEFF_NORMED)
+    _, score, _, top_left = cv2.minMaxLoc(result)
+    return (float(score), top_left) if np.isfinite(score) else (0.0, (0, 0))
+
+
+def _match_variant_pyramid(frame: np.ndarray, small_frame: np.ndarray, template: np.ndarray) -> Tuple[float, Tuple[int, int]]:
+    """
+    Coarse-to-fine match: finds candidate peaks on the downscaled frame, then
+    re-scores only a small window around each at full resolution, so the
+    returned score means the same as a full-resolution match.
+    """
+    height, width = template.shape
+    if min(height, width) // 2 < PYRAMID_MIN_TEMPLATE or height > frame.shape[0] or width > frame.shape[1]:
+        return _match_variant(frame, template)
+    small_template = cv2.pyrDown(template)
+    small_height, small_width = small_template.shape
+    if small_height > small_frame.shape[0] or small_width > small_frame.shape[1]:
+        return _match_variant(frame, template)
+    coarse = cv2.matchTemplate(small_frame, small_template, cv2.TM_CCOEFF_NORMED)
+    coarse = np.nan_to_num(coarse, nan=0.0, posinf=0.0, neginf=0.0)
+
+    pad = 4
+    best_score, best_top_left = 0.0, (0, 0)
+    for _ in range(PYRAMID_MAX_CANDIDATES):
+        _, peak, _, (px, py) = cv2.minMaxLoc(coarse)
+        if peak < PYRAMID_COARSE_FLOOR:
+            break
+        # Suppress this peak's neighbourhood so the next candidate is a different spot.
+        coarse[max(0, py - small_height // 2):py + small_height // 2 + 1,
+               max(0, px - small_width // 2):px + small_width // 2 + 1] = 0
+        left, top = max(0, 2 * px - pad), max(0, 2 * py - pad)
+        window = frame[top:top + height + 2 * pad, left:left + width + 2 * pad]
+        score, (wx, wy) = _match_variant(window, template)
+        if score > best_score:
+            best_score, best_top_left = score, (left + wx, top + wy)
+    # Every candidate is refined, so the best full-resolution score wins as in a full search.
+    return best_score, best_top_left
+
+
+# Matching threads per lookup. cv2.matchTemplate releases the GIL, so variants run on separate cores.
+DEFAULT_MATCH_WORKERS = max(1, min(4, os.cpu_count() or 1))
+# Smaller frames (e.g. a remembered hit's region) are matched on the calling thread; handing
+# them to the pool would cost more than it saves.
+PARALLEL_MIN_PIXELS = 640 * 480
+
+_match_pools: Dict[int, ThreadPoolExecutor] = {}
+_match_pools_lock = threading.Lock()
+
+
+def _match_pool(workers: int) -> ThreadPoolExecutor:
+    """One process-wide pool per size, shared by every ImageMatcher."""
+    with _match_pools_lock:
+        pool = _match_pools.get(workers)
+        if pool is None:
+            pool = _match_pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image_match")
+        return pool
+
+
+# Frames are averaged over blocks of this many pixels (per side) before hashing.
+FRAME_SIGNATURE_BLOCK = 8
+
+
+def frame_signature(frame: np.ndarray) -> bytes:
+    """
+    A cheap fingerprint of a frame: the hash of a heavily downscaled copy.
+    Two captures with the same signature show the same screen, so template
+    matching can be skipped for the second one.
+    """
+    height, width = frame.shape[:2]
+    size = (max(1, width // FRAME_SIGNATURE_BLOCK), max(1, height // FRAME_SIGNATURE_BLOCK))
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return hashlib.blake2b(np.ascontiguousarray(small).tobytes(), digest_size=16).digest()
+
+
+def _make_match(image_name: str, variant: str, template: np.ndarray, top_left: Tuple[int, int],
+                score: float, origin: Tuple[int, int]) -> Dict[str, Any]:
+    height, width = template.shape
+    left, top = top_left[0] + origin[0], top_left[1] + origin[1]
+    return {"image": image_name, "variant": variant, "score": score, "left": left, "top": top,
+            "width": width, "height": height, "x": left + width // 2, "y": top + height // 2}
+
+
+class ImageMatcher:
+    """
+    Finds Click_image templates on the screen with a single capture per attempt.
+
+    Every variant of every requested image is matched against the same
+    grayscale frame and the best-scoring match above the confidence wins, so
+    a 10-variant lookup costs one screenshot instead of ten. Scores are
+    OpenCV's TM_CCOEFF_NORMED, the measure pyautogui uses for 'confidence'.
+    The frame source is pluggable, e.g. a StoredFrameSource for replaying
+    saved screenshots. The 'pyramid' backend trades a small risk of missing
+    low-contrast templates for a much cheaper search on large screens.
+    With a HitRegionMemory attached, each image is first looked for around
+    the spot it was last found.
+
+    With max_workers > 1, the variants of a lookup are scored in parallel.
+    Every variant is still scored and the best score wins (the earlier variant
+    on a tie), so the match does not depend on the pool size.
+    """
+    def __init__(self, frame_source: Optional[FrameSource] = None, hit_memory: Optional[HitRegionMemory] = None,
+                 max_workers: Optional[int] = None):
+        self.frame_source = frame_source or screen_frame_source
+        self.hit_memory = hit_memory
+        self.max_workers = max(1, int(max_workers)) if max_workers else DEFAULT_MATCH_WORKERS
+        # Wait loops: frames that were matched vs. skipped because the screen had not changed.
+        self.frames_matched = 0
+        self.frames_skipped = 0
+
+    def capture(self, region: Optional[Region] = None) -> np.ndarray:
+        return self.frame_source(region)
+
+    def screen_info(self) -> ScreenInfo:
+        return getattr(self.frame_source, "screen_info", desktop_screen_info)()
+
+    def match_frame(self, frame: np.ndarray, templates: TemplateSet, confidence: float,
+                    origin: Tuple[int, int] = (0, 0), backend: str = BACKEND_FULL) -> Optional[Dict[str, Any]]:
+        """
+        Returns the best match across all images and variants as a dict
+        (image, variant, score, left, top, width, height, x, y: centre in screen
+        pixels), or None if no score reaches the confidence. 'origin' is the
+        screen position of the frame's top-left corner.
+        """
+        if backend not in MATCH_BACKENDS:
+            raise ValueError(f"Unknown match backend '{backend}'. Use one of: {', '.join(MATCH_BACKENDS)}.")
+        small_frame = None
+        if backend == BACKEND_PYRAMID:
+            small_frame = cv2.pyrDown(frame)
+
+        def score_variant(job):
+            template = job[2]
+            if small_frame is not None:
+                return _match_variant_pyramid(frame, small_frame, template)
+            return _match_variant(frame, template)
+
+        jobs = [(image_name, variant, template) for image_name, variants in templates for variant, template in variants]
+        workers = min(self.max_workers, len(jobs))
+        if workers <= 1 or frame.shape[0] * frame.shape[1] < PARALLEL_MIN_PIXELS:
+            scores = map(score_variant, jobs)
+        else:
+            scores = _match_pool(workers).map(score_variant, jobs)
+        best = None
+        # map() yields in job order, so ties go to the earlier variant either way.
+        for (image_name, variant, template), (score, top_left) in zip(jobs, scores):
+            if score >= confidence and (best is None or score > best["score"]):
+                best = _make_match(image_name, variant, template, top_left, score, origin)
+        return best
+
+    def locate(self, templates: TemplateSet, confidence: float, region: Optional[Region] = None,
+               backend: str = BACKEND_FULL, stamps: Optional[Dict[str, Optional[int]]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Captures the screen (or region) once and returns the best match, or None.
+        'stamps' maps image names to their template file's mtime; it enables the
+        hit memory for whole-screen searches.
+        """
+        use_memory = region is None and self.hit_memory is not None and stamps is not None
+        if use_memory:
+            screen = self.screen_info()
+            match = self._locate_remembered(templates, confidence, screen, stamps)
+            if match is not None:
+                return match
+        frame = self.capture(region)
+        origin = (region[0], region[1]) if region else (0, 0)
+        match = self.match_frame(frame, templates, confidence, origin, backend)
+        if use_memory and match is not None:
+            self.hit_memory.remember(match["image"], stamps.get(match["image"]), screen, match)
+        return match
+
+    def wait(self, templates: TemplateSet, confidence: float, timeout: float, appear: bool = True,
+             backend: str = BACKEND_FULL, stamps: Optional[Dict[str, Optional[int]]] = None) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Polls the screen until any template is visible (appear=True) or none is
+        (appear=False). Frames whose signature matches the previous attempt are
+        not matched again, and the delay between attempts backs off while the
+        screen stays the same. Returns (condition met before the timeout, last match).
+        """
+        backoff = AdaptiveBackoff(timeout)
+        use_memory = self.hit_memory is not None and stamps is not None
+        last_signature, match, decided = None, None, False
+        while True:
+            changed = False
+            try:
+                frame = self.capture()
+            except OSError:
+                frame = None  # e.g. a locked session; keep waiting rather than guess
+            if frame is not None:
+                signature = frame_signature(frame)
+                changed = signature != last_signature
+                if changed:
+                    last_signature, decided = signature, True
+                    self.frames_matched += 1
+                    match = None
+                    if use_memory:
+                        screen = self.screen_info()
+                        match = self._locate_remembered(templates, confidence, screen, stamps, frame)
+                    if match is None:
+                        match = self.match_frame(frame, templates, confidence, (0, 0), backend)
+                        if use_memory and match is not None:
+                            self.hit_memory.remember(match["image"], stamps.get(match["image"]), screen, match)
+                else:
+                    self.frames_skipped += 1
+            if decided and (match is not None) == appear:
+                return True, match
+            if not backoff.wait(changed):
+                return False, match
+
+    def _locate_remembered(self, templates: TemplateSet, confidence: float, screen: ScreenInfo,
+                           stamps: Dict[str, Optional[int]], frame: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
+        """
+        Searches only the padded regions around remembered hits, cut from 'frame'
+        or captured on their own; None means a full search is needed.
+        """
+        best = None
+        searched = False
+        for image_name, variants in templates:
+            entry = self.hit_memory.lookup(image_name, stamps.get(image_name), screen)
+            if entry is None:
+                continue
+            region = self.hit_memory.search_region(entry, screen)
+            if region[2] <= 0 or region[3] <= 0:
+                continue
+            searched = True
+            left, top, width, height = region
+            region_frame = self.capture(region) if frame is None else frame[top:top + height, left:left + width]
+            # The region is small, so a full-resolution search is already cheap there.
+            match = self.match_frame(region_frame, [(image_name, variants)], confidence, region[:2])
+            if match is not None and (best is None or match["score"] > best["score"]):
+                best = match
+        if searched:
+            if best is None:
+                self.hit_memory.region_misses += 1
+            else:
+                self.hit_memory.region_hits += 1
+                self.hit_memory.remember(best["image"], stamps.get(best["image"]), screen, best)
+        return best
@@ -0,0 +1,107 @@
+# module_cache.py
+import os
+import sys
+import inspect
+import importlib
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+
+class ModuleResolutionCache:
+    """
+    Caches Bot_module imports, class lookups and 'context' signature checks
+    for the step interpreter.
+
+    Entries are keyed by the module's file path and are only refreshed
+    (via importlib.reload) when that file's modification time changes, so a
+    step inside a 10k-iteration loop no longer re-executes its whole module
+    on every pass. Edits made to a Bot_module file while the app is open are
+    still picked up on the next step that uses it.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        # module name -> (file path, mtime, module object)
+        self._modules: Dict[str, Tuple[Optional[str], Optional[float], Any]] = {}
+        # class object -> {method name ('__init__' included): accepts 'context'}
+        self._signatures: "weakref.WeakKeyDictionary[type, Dict[str, bool]]" = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @staticmethod
+    def _get_mtime(path: Optional[str]) -> Optional[float]:
+        if not path:
+            return None
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def get_module(self, module_name: str) -> Any:
+        """
+        Returns the imported module, importing it on first use and reloading it
+        only if its source file has been modified since it was last loaded.
+
+        A module that is already in sys.modules before its first lookup (imported
+        by the GUI or an earlier run) is reloaded once, since there is no telling
+        whether its file changed after that import.
+        """
+        with self._lock:
+            entry = self._modules.get(module_name)
+            if entry is not None:
+                path, mtime, module = entry
+                current_mtime = self._get_mtime(path)
+                if current_mtime == mtime and sys.modules.get(module_name) is module:
+                    self.hits += 1
+                    return module
+                module = importlib.reload(module)
+                self.reloads += 1
+            elif module_name in sys.modules:
+                module = importlib.reload(sys.modules[module_name])
+                self.misses += 1
+            else:
+                module = importlib.import_module(module_name)
+                self.misses += 1
+            path = getattr(module, "__file__", None)
+            self._modules[module_name] = (path, self._get_mtime(path), module)
+            return module
+
+    def get_class(self, module_name: str, class_name: str) -> type:
+        """Returns the class object from the (possibly refreshed) module."""
+        return getattr(self.get_module(module_name), class_name)
+
+    def accepts_context(self, class_obj: type, method_name: str = "__init__") -> bool:
+        """
+        Returns True if class_obj.<method_name> has a 'context' parameter.
+        The result is cached per class object, so a reloaded class is inspected afresh.
+        """
+        with self._lock:
+            methods = self._signatures.get(class_obj)
+            if methods is None:
+                methods = {}
+                self._signatures[class_obj] = methods
+            if method_name not in methods:
+                func = getattr(class_obj, method_name)
+                try:
+                    methods[method_name] = 'context' in inspect.signature(func).parameters
+                except (TypeError, ValueError):
+                    methods[method_name] = False
+            return methods[method_name]
+
+    def invalidate(self, module_name: Optional[str] = None) -> None:
+        """Marks one module (or every module) as stale so the next lookup reloads it."""
+        with self._lock:
+            names = list(self._modules) if module_name is None else [module_name]
+            for name in names:
+                if name in self._modules:
+                    path, _, module = self._modules[name]
+                    self._modules[name] = (path, -1.0, module)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns hit/miss/reload counters, useful for logging at the end of a run."""
+        return {"hits": self.hits, "misses": self.misses, "reloads": self.reloads}
+
+
+# Shared by every ExecutionWorker in the process, so runs reuse each other's imports.
+module_cache = ModuleResolutionCache()
@@ -0,0 +1,39 @@
+# polling.py
+import time
+
+
+class AdaptiveBackoff:
+    """
+    Paces a wait loop: checks again quickly right after something changed and
+    backs off exponentially while nothing does, never sleeping past the
+    timeout. Replaces busy loops that pinned a CPU core for the whole wait.
+
+        backoff = AdaptiveBackoff(timeout)
+        while not condition():
+            if not backoff.wait(changed):
+                break  # timed out
+    """
+    def __init__(self, timeout: float, min_delay: float = 0.05, max_delay: float = 0.5, factor: float = 2.0):
+        self.deadline = time.monotonic() + float(timeout)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.delay = min_delay
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def wait(self, changed: bool) -> bool:
+        """
+        Sleeps before the next check, resetting to the shortest delay if the last
+        check saw a change. Returns False once the timeout has passed; the last
+        sleep ends exactly at the deadline, so there is always a final check there.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            return False
+        if changed:
+            self.delay = self.min_delay
+        time.sleep(min(self.delay, remaining))
+        self.delay = min(self.delay * self.factor, self.max_delay)
+        return True
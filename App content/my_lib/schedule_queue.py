@@ -0,0 +1,233 @@
+# schedule_queue.py
+import json
+import heapq
+import itertools
+import calendar
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+
+REPEAT_ONCE = "Do not repeat"
+REPEAT_MONTHLY = "Monthly"
+REPEAT_INTERVALS = {
+    "Every 5 minutes": timedelta(minutes=5),
+    "Every 15 minutes": timedelta(minutes=15),
+    "Every 30 minutes": timedelta(minutes=30),
+    "Hourly": timedelta(hours=1),
+    "Daily": timedelta(days=1),
+}
+
+# What to do with fire times that passed while the app was closed (or the bot was still running).
+MISSED_SKIP = "skip"          # wait for the next regular fire time
+MISSED_RUN_ONCE = "run_once"  # run once now, then continue the regular cadence
+MISSED_CATCH_UP = "catch_up"  # run every missed fire time, one after another
+MAX_CATCH_UP_RUNS = 24
+
+# A fire time this close behind 'now' is late, not missed.
+MISSED_GRACE = timedelta(seconds=60)
+
+_DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def parse_schedule_time(text: Optional[str]) -> Optional[datetime]:
+    """Parses the ISO date-time strings QDateTime writes into schedules.json."""
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text.rstrip("Z"))
+    except ValueError:
+        return None
+
+
+def _parse_time(text: Optional[str], default: str):
+    try:
+        return datetime.strptime(text or default, "%H:%M:%S").time()
+    except ValueError:
+        return datetime.strptime(default, "%H:%M:%S").time()
+
+
+def _add_months(t: datetime, months: int) -> datetime:
+    month_index = t.month - 1 + months
+    year, month = t.year + month_index // 12, month_index % 12 + 1
+    return t.replace(year=year, month=month, day=min(t.day, calendar.monthrange(year, month)[1]))
+
+
+def _uses_day_rules(schedule: Dict[str, Any]) -> bool:
+    # Selected days and the time boundary only apply to schedules that repeat within a month.
+    return schedule.get("repeat") not in (REPEAT_ONCE, REPEAT_MONTHLY)
+
+
+def _is_allowed(schedule: Dict[str, Any], t: datetime) -> bool:
+    """True if t falls on a selected day and inside the time boundary (when those are set)."""
+    if not _uses_day_rules(schedule):
+        return True
+    selected_days = schedule.get("selected_days") or []
+    if selected_days and _DAY_NAMES[t.weekday()] not in selected_days:
+        return False
+    if schedule.get("time_boundary_enabled", False):
+        start_time = _parse_time(schedule.get("start_time"), "00:00:00")
+        end_time = _parse_time(schedule.get("end_time"), "23:59:59")
+        return start_time <= t.time() <= end_time
+    return True
+
+
+def _align(schedule: Dict[str, Any], t: datetime) -> Optional[datetime]:
+    """Returns the first allowed time at or after t, moving to the next boundary start / selected day."""
+    boundary_enabled = schedule.get("time_boundary_enabled", False)
+    start_time = _parse_time(schedule.get("start_time"), "00:00:00")
+    for _ in range(400):
+        if _is_allowed(schedule, t):
+            return t
+        day_ok = _is_allowed(dict(schedule, time_boundary_enabled=False), t)
+        if boundary_enabled and day_ok and t.time() < start_time:
+            t = datetime.combine(t.date(), start_time)
+        else:
+            t = t + timedelta(days=1)
+            if boundary_enabled: t = datetime.combine(t.date(), start_time)
+    return None  # e.g. a boundary whose start is after its end
+
+
+def next_occurrence(schedule: Dict[str, Any], fire_time: datetime) -> Optional[datetime]:
+    """Returns the first allowed fire time strictly after fire_time, or None for a one-off schedule."""
+    repeat_mode = schedule.get("repeat")
+    if repeat_mode == REPEAT_MONTHLY:
+        return _add_months(fire_time, 1)
+    interval = REPEAT_INTERVALS.get(repeat_mode)
+    if interval is None:
+        return None
+    return _align(schedule, fire_time + interval)
+
+
+def _signature(schedule: Dict[str, Any]) -> str:
+    return json.dumps(schedule, sort_keys=True, default=str)
+
+
+class ScheduleQueue:
+    """
+    A min-heap of precomputed next fire times, one live entry per enabled schedule.
+
+    The scheduler pops due entries and sleeps until the head of the heap
+    instead of re-evaluating every schedule on a fixed tick. Entries are
+    replaced lazily: stale heap items are skipped when popped. Each entry keeps
+    the cadence anchor (the regular fire time it stands for), so a run that
+    starts late or is replayed under the missed-run policy does not shift
+    later fire times.
+    """
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, str]] = []
+        # bot name -> {'fire', 'due', 'anchor', 'seq' (None while the bot is dispatched), 'signature'}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return sum(1 for entry in self._entries.values() if entry["seq"] is not None)
+
+    def _push(self, bot_name: str, fire: datetime, due: datetime, anchor: datetime, signature: str) -> None:
+        seq = next(self._counter)
+        self._entries[bot_name] = {"fire": fire, "due": due, "anchor": anchor, "seq": seq, "signature": signature}
+        heapq.heappush(self._heap, (fire, seq, bot_name))
+
+    def _plan(self, schedule: Dict[str, Any], candidate: Optional[datetime], now: datetime,
+              policy: Optional[str] = None) -> Tuple[Optional[Tuple[datetime, datetime, datetime]], Optional[str]]:
+        """
+        Applies the schedule's missed-run policy to its next regular fire time.
+        Returns ((fire, due, anchor) or None, an optional message describing what was missed).
+        """
+        if candidate is None or candidate >= now - MISSED_GRACE:
+            return ((candidate, candidate, candidate) if candidate else None), None
+        missed = [candidate]
+        following = next_occurrence(schedule, candidate)
+        while following is not None and following < now:
+            missed.append(following)
+            if len(missed) > MAX_CATCH_UP_RUNS: missed.pop(0)
+            following = next_occurrence(schedule, following)
+        policy = policy or schedule.get("missed_run_policy", MISSED_RUN_ONCE)
+        message = f"missed fire time(s) up to {missed[-1].isoformat(timespec='seconds')}"
+        if policy == MISSED_SKIP:
+            return ((following, following, following) if following else None), f"{message}; skipped, next at {following.isoformat(timespec='seconds') if following else 'never'}"
+        if policy == MISSED_CATCH_UP:
+            return (missed[0], missed[0], missed[0]), f"{message}; catching up {len(missed)} run(s)"
+        return (now, missed[-1], missed[-1]), f"{message}; running once now"
+
+    def sync(self, schedules: Dict[str, Dict[str, Any]], now: datetime) -> List[str]:
+        """
+        Brings the heap in line with the schedules: new or edited schedules are
+        (re)planned, removed or disabled ones dropped, unchanged ones kept as they
+        are. Returns log messages about missed runs.
+        """
+        messages = []
+        for bot_name in list(self._entries):
+            schedule = schedules.get(bot_name)
+            if not (schedule and schedule.get("enabled")):
+                del self._entries[bot_name]
+        for bot_name, schedule in schedules.items():
+            if not (schedule and schedule.get("enabled")):
+                continue
+            signature = _signature(schedule)
+            entry = self._entries.get(bot_name)
+            if entry is not None and entry["signature"] == signature:
+                continue
+            start = parse_schedule_time(schedule.get("start_datetime"))
+            if start is None:
+                messages.append(f"'{bot_name}': invalid start time '{schedule.get('start_datetime')}'; not scheduled.")
+                continue
+            plan, message = self._plan(schedule, _align(schedule, start) if _uses_day_rules(schedule) else start, now)
+            if message: messages.append(f"'{bot_name}': {message}.")
+            if plan is None:
+                self._entries.pop(bot_name, None)
+                continue
+            self._push(bot_name, *plan, signature)
+        return messages
+
+    def pop_due(self, now: datetime) -> Optional[Tuple[str, datetime, datetime]]:
+        """
+        Pops the earliest due entry and returns (bot name, due time, cadence anchor),
+        or None if nothing is due. The bot keeps a placeholder entry until it is
+        rescheduled, so a sync in between does not plan it a second time.
+        """
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, bot_name = heapq.heappop(self._heap)
+            entry = self._entries.get(bot_name)
+            if entry is None or entry["seq"] != seq:
+                continue  # Stale item left behind by a replaced entry.
+            entry["seq"] = None
+            return bot_name, entry["due"], entry["anchor"]
+        return None
+
+    def reschedule(self, bot_name: str, schedule: Dict[str, Any], anchor: datetime, now: datetime,
+                   policy: Optional[str] = None) -> Optional[datetime]:
+        """
+        Plans the run after the one anchored at 'anchor' and writes it into the
+        schedule's 'start_datetime' (disabling a schedule that has no next run).
+        'policy' overrides the schedule's missed-run policy. Returns the next fire time, or None.
+        """
+        plan, _ = self._plan(schedule, next_occurrence(schedule, anchor), now, policy)
+        if plan is None:
+            schedule["enabled"] = False
+            self._entries.pop(bot_name, None)
+            return None
+        fire, due, next_anchor = plan
+        # Persist the regular fire time; the heap may hold an earlier 'now' for a run-once replay.
+        schedule["start_datetime"] = next_anchor.isoformat(timespec="seconds")
+        self._push(bot_name, fire, due, next_anchor, _signature(schedule))
+        return fire
+
+    def defer(self, bot_name: str, due: datetime, anchor: datetime, until: datetime) -> None:
+        """Puts a popped entry back to be retried at 'until' (e.g. its previous run is still going)."""
+        entry = self._entries.get(bot_name)
+        if entry is not None:
+            self._push(bot_name, until, due, anchor, entry["signature"])
+
+    def next_fire_time(self) -> Optional[datetime]:
+        """Returns the earliest live fire time, discarding stale heap items on the way."""
+        while self._heap:
+            fire, seq, bot_name = self._heap[0]
+            entry = self._entries.get(bot_name)
+            if entry is not None and entry["seq"] == seq:
+                return fire
+            heapq.heappop(self._heap)
+        return None
+
+    def seconds_until_next(self, now: datetime) -> Optional[float]:
+        fire = self.next_fire_time()
+        return None if fire is None else max(0.0, (fire - now).total_seconds())
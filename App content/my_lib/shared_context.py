@@ -1,9 +1,82 @@
 # shared_context.py
+import os
+import sys
 import time
 import random 
+import queue
+import atexit
+import logging
+import threading
+import collections
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from datetime import datetime
 from PyQt6.QtCore import QObject, pyqtSignal
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
+
+
+# Messages with this prefix make the main window preview the template that was not found.
+IMAGE_NOT_FOUND_PREFIX = "Image not found: "
+
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+
+def _infer_log_level(message: str) -> int:
+    """Bot modules log plain strings; treat the usual 'Error'/'WARNING'/'CRITICAL' prefixes as levels."""
+    head = message[:10].upper()
+    if head.startswith("CRITICAL"): return LOG_LEVELS["CRITICAL"]
+    if head.startswith("ERROR"): return LOG_LEVELS["ERROR"]
+    if head.startswith("WARNING"): return LOG_LEVELS["WARNING"]
+    return LOG_LEVELS["INFO"]
+
+
+class _TolerantRotatingFileHandler(RotatingFileHandler):
+    """
+    Keeps writing to the current file when a rollover fails, e.g. on Windows while
+    another process still has the log open; the next record tries again.
+    """
+    def doRollover(self):
+        try:
+            super().doRollover()
+        except OSError:
+            if self.stream is None:
+                self.stream = self._open()
+
+
+# One rotating log file per path for the whole process. Records are put on a queue
+# and written by a QueueListener thread, so add_log never waits on disk I/O.
+# Processes should not share a path: rotation renames the file under the others.
+_file_sinks: Dict[str, logging.Logger] = {}
+_file_sinks_lock = threading.Lock()
+
+
+def get_file_sink(file_path: str, max_bytes: int = 5 * 1024 * 1024, backup_count: int = 5) -> logging.Logger:
+    """Returns a logger that writes to file_path on a background thread with size-based rotation."""
+    file_path = os.path.abspath(file_path)
+    with _file_sinks_lock:
+        sink = _file_sinks.get(file_path)
+        if sink is None:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            file_handler = _TolerantRotatingFileHandler(file_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+            file_handler.setFormatter(logging.Formatter("%(message)s"))
+            record_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+            listener = QueueListener(record_queue, file_handler)
+            listener.start()
+            sink = logging.getLogger(f"automatetask.bot_log.{len(_file_sinks)}")
+            sink.setLevel(logging.DEBUG)
+            sink.propagate = False
+            sink.addHandler(QueueHandler(record_queue))
+            sink._automatetask_listener = listener
+            _file_sinks[file_path] = sink
+        return sink
+
+
+@atexit.register
+def _stop_file_sinks():
+    """Drains the file sink queues so the last lines of a run reach disk on exit."""
+    with _file_sinks_lock:
+        for sink in _file_sinks.values():
+            sink._automatetask_listener.stop()
+        _file_sinks.clear()
 
 
 class GuiCommunicator(QObject):
@@ -27,11 +100,24 @@ class ExecutionContext:
     during execution. It allows steps to store and retrieve data/results,
     and provides a bridge to the GUI and global variables.
     """
+    # --- Logging pipeline defaults (can be changed per context) ---
+    max_log_lines = 10000       # size of the in-memory ring buffer (self.logs)
+    gui_frame_rate = 10         # batched GUI deliveries per second; 0 emits every line immediately
+    log_level = "INFO"          # messages below this level are dropped before formatting
+
     def __init__(self):
         # --- Existing properties ---
         self.results = {}
         self.data = {}
-        self.logs = []
+        self.logs = collections.deque(maxlen=self.max_log_lines)
+        self.module_log_levels: Dict[str, str] = {}
+        self._file_sink: Optional[logging.Logger] = None
+        self._gui_lock = threading.Lock()
+        self._gui_emit_lock = threading.Lock()
+        self._gui_pending: List[str] = []
+        self._gui_last_message: Optional[str] = None
+        self._gui_last_image_message: Optional[str] = None
+        self._gui_flusher: Optional[threading.Thread] = None
         self.start_time = datetime.now()
         self.gui_communicator = None
         self.click_image_base_dir = ""
@@ -69,7 +155,7 @@ class ExecutionContext:
         # This directly modifies the dictionary that was passed by reference
         # from the main application's worker thread.
         self.global_variables_ref[name] = value
-        self.add_log(f"Global variable '@{name}' set to: {value}")
+        self.add_log("Global variable '@%s' set to: %s", name, value)
         
     def get_result(self, key):
         """Retrieves a result stored by a previous step."""
@@ -100,18 +186,98 @@ class ExecutionContext:
         if self.gui_communicator:
             self.gui_communicator.update_click_signal.emit(click_status)        
         
-    def add_log(self, message):
+    def set_log_level(self, level: str, module_name: Optional[str] = None):
+        """
+        Sets the minimum level ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL') for this
+        context, or only for messages logged from the given Bot_module (e.g. 'Gui_Automate').
+        """
+        level = level.upper()
+        if level not in LOG_LEVELS: raise ValueError(f"Unknown log level: {level}")
+        if module_name: self.module_log_levels[module_name] = level
+        else: self.log_level = level
+
+    def enable_file_log(self, file_path: str):
+        """Also writes every accepted log entry to a rotating file on a background thread."""
+        self._file_sink = get_file_sink(file_path)
+
+    def share_file_log(self, other: "ExecutionContext"):
+        """Writes log entries to the same file as other, e.g. a parallel loop iteration to its bot's log."""
+        self._file_sink = other._file_sink
+
+    def add_log(self, message, *args, level: Optional[str] = None):
         """
         Adds a log entry to the context and optionally emits a signal
         to the GUI for real-time log display.
+
+        Extra args are %-formatted into message only if the entry passes the
+        level filters, so suppressed messages cost almost nothing. Entries go to
+        a bounded ring buffer, the optional file sink, and are delivered to the
+        GUI in batches at gui_frame_rate.
         """
+        level_no = LOG_LEVELS.get(level.upper(), 20) if level else _infer_log_level(str(message))
+        threshold = LOG_LEVELS[self.log_level]
+        if self.module_log_levels:
+            caller_module = sys._getframe(1).f_globals.get("__name__", "")
+            if caller_module in self.module_log_levels:
+                threshold = LOG_LEVELS[self.module_log_levels[caller_module]]
+        if level_no < threshold:
+            return
+
+        if args:
+            try: message = message % args
+            except (TypeError, ValueError): message = " ".join(str(part) for part in (message,) + args)
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_entry = f"{timestamp} - {message}"
         self.logs.append(log_entry)
-        
+        if self._file_sink is not None:
+            self._file_sink.info(log_entry)
+
         if self.gui_communicator:
-            self.gui_communicator.log_message_signal.emit(log_entry)
-            self.gui_communicator.update_module_info_signal.emit(message)
+            if not self.gui_frame_rate:
+                self.gui_communicator.log_message_signal.emit(log_entry)
+                self.gui_communicator.update_module_info_signal.emit(message)
+                return
+            with self._gui_lock:
+                self._gui_pending.append(log_entry)
+                self._gui_last_message = message
+                if message.startswith(IMAGE_NOT_FOUND_PREFIX):
+                    self._gui_last_image_message = message
+                if self._gui_flusher is None:
+                    self._gui_flusher = threading.Thread(target=self._gui_flush_loop, name="ContextLogFlusher", daemon=True)
+                    self._gui_flusher.start()
+
+    def flush_logs(self):
+        """Delivers any batched log lines to the GUI now (call at the end of a run)."""
+        # Held across swap and emit so batches reach the GUI in order.
+        with self._gui_emit_lock:
+            with self._gui_lock:
+                pending, last_message, image_message = self._gui_pending, self._gui_last_message, self._gui_last_image_message
+                self._gui_pending, self._gui_last_message, self._gui_last_image_message = [], None, None
+            if pending and self.gui_communicator:
+                self.gui_communicator.log_message_signal.emit("\n".join(pending))
+                # The info label only shows the latest message, but a failed-template preview
+                # must not be lost to a line that landed in the same frame: it goes last.
+                if last_message != image_message:
+                    self.gui_communicator.update_module_info_signal.emit(last_message)
+                if image_message is not None:
+                    self.gui_communicator.update_module_info_signal.emit(image_message)
+        return bool(pending)
+
+    def _gui_flush_loop(self):
+        """Background delivery loop; exits after a second without new log lines."""
+        idle_ticks = 0
+        interval = 1.0 / self.gui_frame_rate
+        while True:
+            time.sleep(interval)
+            if self.flush_logs():
+                idle_ticks = 0
+                continue
+            idle_ticks += 1
+            if idle_ticks >= self.gui_frame_rate:
+                with self._gui_lock:
+                    if self._gui_pending: continue
+                    self._gui_flusher = None
+                return
 
     # --- ADD THESE TWO NEW METHODS ---
     def hide_main_gui(self):
@@ -0,0 +1,736 @@
+# step_engine.py
+import os
+import sys
+import csv
+import json
+import ast
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Tuple
+
+from my_lib.shared_context import ExecutionContext
+from my_lib.execution_plan import ExecutionPlan
+from my_lib.module_cache import module_cache
+from my_lib.step_profiler import StepProfiler, format_profile_summary
+from my_lib.checkpoint import CheckpointStore, steps_fingerprint
+from my_lib.template_warmup import warmup_templates, format_warmup_report
+
+
+# Modules that drive the mouse, keyboard, screen or a browser window; they cannot
+# share the desktop between concurrent iterations of a parallel for-each loop.
+PARALLEL_UNSAFE_MODULES = {"Gui_Automate", "Mouse_Key_Automate", "Bot_GUI_Control", "Chrome_selenium"}
+
+
+class EngineSignal:
+    """
+    A minimal stand-in for pyqtSignal used when the engine runs without Qt.
+    Callbacks registered with connect() are invoked synchronously by emit().
+    """
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def disconnect(self, slot=None):
+        if slot is None: self._slots.clear()
+        elif slot in self._slots: self._slots.remove(slot)
+
+    def emit(self, *args):
+        for slot in list(self._slots):
+            slot(*args)
+
+
+class EngineSignals:
+    """The set of signals a StepEngine reports progress through, without Qt."""
+    def __init__(self):
+        self.execution_started = EngineSignal()
+        self.execution_progress = EngineSignal()
+        self.execution_item_started = EngineSignal()
+        self.execution_item_finished = EngineSignal()
+        self.execution_error = EngineSignal()
+        self.execution_finished_all = EngineSignal()
+        self.loop_iteration_started = EngineSignal()
+
+
+class HeadlessCommunicator:
+    """
+    Duck-typed replacement for GuiCommunicator when no GUI exists.
+    Bot modules keep calling context.add_log()/send_click_status() as usual;
+    log lines are forwarded to an optional callback (e.g. print).
+    """
+    def __init__(self, log_callback=None):
+        self.log_message_signal = EngineSignal()
+        self.update_module_info_signal = EngineSignal()
+        self.update_click_signal = EngineSignal()
+        self.hide_gui_signal = EngineSignal()
+        self.show_gui_signal = EngineSignal()
+        if log_callback is not None:
+            self.log_message_signal.connect(log_callback)
+
+
+def bot_log_file_path(module_directory: str, bot_name: str) -> str:
+    """
+    logs/bot_runs.log for bots run by the app itself. Background bots run in worker
+    processes, which must not rotate a file the app also has open, so each writes
+    logs/bot_runs.<bot name>.log instead.
+    """
+    logs_dir = os.path.normpath(os.path.join(module_directory, "..", "logs"))
+    if multiprocessing.parent_process() is None:
+        return os.path.join(logs_dir, "bot_runs.log")
+    safe_name = "".join(c if c.isalnum() or c in "-_ " else "_" for c in bot_name).strip() or "bot"
+    return os.path.join(logs_dir, f"bot_runs.{safe_name}.log")
+
+
+def load_bot_file(file_path: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Loads a saved bot from Bot_steps/ and returns (global_variables, steps).
+    Accepts both the official .csv format and the .json backup format.
+    """
+    if file_path.lower().endswith(".json"):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            json_data = json.load(f)
+        return json_data.get("global_variables", {}), json_data.get("added_steps_data", [])
+
+    section = None
+    loaded_variables, loaded_steps = {}, []
+    with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        for row in reader:
+            if not row: continue
+            header = row[0]
+            if header == "__SCHEDULE_INFO__":
+                section = "SCHEDULE"
+                continue
+            elif header == "__GLOBAL_VARIABLES__":
+                section = "VARIABLES"
+                continue
+            elif header == "__BOT_STEPS__":
+                section = "STEPS"
+                next(reader, None)  # Skip the header row
+                continue
+
+            if section == "VARIABLES":
+                if len(row) == 2:
+                    loaded_variables[row[0]] = json.loads(row[1])
+            elif section == "STEPS":
+                if len(row) == 2:
+                    loaded_steps.append(json.loads(row[1]))
+    return loaded_variables, loaded_steps
+
+
+class StepEngine:
+    """
+    The step interpreter behind ExecutionWorker, free of any Qt dependency.
+
+    It walks a flat list of steps (loop/IF/group markers and module method
+    calls) against a shared global-variable dictionary and reports progress
+    through a signals object. ExecutionWorker passes itself (its pyqtSignals)
+    so the GUI is updated as before; the headless runner uses EngineSignals.
+    """
+    # Pause after announcing each step so the GUI can paint its status.
+    step_settle_ms = 50
+    # Record per-step timings for full runs and append a report to Bot_steps/.
+    profiling_enabled = True
+    # Allow loops with 'checkpoint_every' set to save resumable state for full runs.
+    checkpoints_enabled = True
+    # Decode every Click_image template the steps use before the first step runs, and
+    # report missing or unreadable ones up front (not for single-step runs).
+    template_warmup_enabled = True
+
+    def __init__(self, steps_to_execute: List[Dict[str, Any]], module_directory: str, gui_communicator: Any,
+                 global_variables_ref: Dict[str, Any],
+                 wait_config: Dict[str, Any],
+                 signals: Any = None,
+                 single_step_mode: bool = False,
+                 selected_start_index: int = 0,
+                 selected_end_index: Optional[int] = None,
+                 bot_name: str = "Untitled Bot",
+                 email_config: Optional[Dict[str, Any]] = None,
+                 bot_steps_directory: Optional[str] = None,
+                 resume_from_checkpoint: bool = False,
+                 is_child: bool = False):
+        self.steps_to_execute = steps_to_execute
+        self.module_directory = module_directory
+        self.click_image_dir = os.path.normpath(os.path.join(module_directory, "..", "Click_image"))
+        # Profile reports and checkpoints are written next to the bot file.
+        self.bot_steps_directory = bot_steps_directory or os.path.normpath(os.path.join(module_directory, "..", "Bot_steps"))
+        self.log_file_path = bot_log_file_path(module_directory, bot_name)
+        self.profiler: Optional[StepProfiler] = None
+        self.resume_from_checkpoint = resume_from_checkpoint
+        self.checkpoint_store: Optional[CheckpointStore] = None
+        self._steps_fingerprint: Optional[str] = None
+        self.instantiated_objects: Dict[Tuple[str, str], Any] = {}
+        self.context = ExecutionContext()
+        self.context.set_gui_communicator(gui_communicator)
+        self.signals = signals if signals is not None else EngineSignals()
+        self.global_variables = global_variables_ref
+        self._is_stopped = False
+        self.loop_stack: List[Dict[str, Any]] = []
+        self.conditional_stack: List[Dict[str, Any]] = []
+        self.group_stack: List[Dict[str, Any]] = []
+        self.execution_plan: Optional[ExecutionPlan] = None
+        self.single_step_mode = single_step_mode
+        self.selected_start_index = selected_start_index
+        self.selected_end_index = selected_end_index
+        self.next_step_index_to_select: int = -1
+        self._is_paused = False
+        self.wait_config = wait_config
+        # --- STORE NEW ATTRIBUTES ---
+        self.bot_name = bot_name
+        self.email_config = email_config or {}
+        self.error_message: Optional[str] = None # To store the specific error
+        self.template_warmup_report: Optional[Dict[str, Any]] = None
+        # Engines running the iterations of a parallel for-each loop, so stop() reaches them.
+        self._child_engines: List["StepEngine"] = []
+        self._child_lock = threading.Lock()
+        # A child engine runs one parallel loop iteration on a pool thread inside its
+        # parent's run(): it leaves sys.path, the log file and template warmup to the
+        # parent, and does not pause, profile or checkpoint on its own.
+        self.is_child = is_child
+        if is_child:
+            self.step_settle_ms = 0
+            self.profiling_enabled = False
+            self.checkpoints_enabled = False
+            self.template_warmup_enabled = False
+
+    def _sleep_ms(self, milliseconds: int) -> None:
+        time.sleep(milliseconds / 1000.0)
+
+    def _resolve_loop_count(self, loop_config: Dict[str, Any]) -> int:
+        count_config = loop_config["iteration_count_config"]
+        if count_config["type"] == "variable":
+            var_name = count_config["value"]
+            var_value = self.global_variables.get(var_name)
+            if isinstance(var_value, int) and var_value >= 1: return var_value
+            else: self.context.add_log(f"Warning: Global variable '{var_name}' for loop count is not a valid positive integer (value: {var_value}). Defaulting to 1 iteration."); return 1
+        else: return count_config.get("value", 1)
+
+    def _resolve_operand_value(self, operand_config: Dict[str, Any]) -> Any:
+        if operand_config["type"] == "variable":
+            var_name = operand_config["value"]
+            if var_name not in self.global_variables: raise ValueError(f"Global variable '{var_name}' not found for condition operand.")
+            return self.global_variables[var_name]
+        else: return operand_config["value"]
+
+    def _evaluate_condition(self, condition_config: Dict[str, Any]) -> bool:
+        left_val = self._resolve_operand_value(condition_config["left_operand"])
+        right_val = self._resolve_operand_value(condition_config["right_operand"])
+        operator = condition_config["operator"]
+        try:
+            if operator == '==': return left_val == right_val
+            elif operator == '!=': return left_val != right_val
+            elif operator == '<': return left_val < right_val
+            elif operator == '>': return left_val > right_val
+            elif operator == '<=': return left_val <= right_val
+            elif operator == '>=': return left_val >= right_val
+            elif operator == 'in': return left_val in right_val
+            elif operator == 'not in': return left_val not in right_val
+            elif operator == 'is': return left_val is right_val
+            elif operator == 'is not': return left_val is not right_val
+            else: raise ValueError(f"Unknown operator: {operator}")
+        except Exception as e: raise ValueError(f"Error evaluating condition '{left_val} {operator} {right_val}': {e}")
+        
+    def _send_notification_email(self):
+        """Sends an email based on the execution result and configuration."""
+        if not self.email_config.get("email_notification_enabled"):
+            return
+
+        is_error = self.error_message is not None
+        should_send = False
+
+        if is_error and self.email_config.get("notify_on_error"):
+            should_send = True
+        elif not is_error and self.email_config.get("notify_on_success"):
+            should_send = True
+
+        if should_send:
+            status = "Failed with Error" if is_error else "Completed Successfully"
+            recipient = self.email_config.get("recipient_email")
+            
+            try:
+                from my_lib.Emailer import Emailer  # Outlook/pywin32 is only needed when notifying
+                emailer = Emailer()
+                # --- THIS IS THE KEY CHANGE ---
+                # Check the return value of the send function.
+                was_sent = emailer.send_outlook_notification(
+                    recipient_email=recipient,
+                    bot_name=self.bot_name,
+                    status=status,
+                    error_message=self.error_message or ""
+                )
+                
+                if was_sent:
+                    self.context.add_log(f"Notification email sent to {recipient}.")
+                else:
+                    # If it fails, log a warning instead of crashing.
+                    self.context.add_log(f"WARNING: Could not send notification email to {recipient}. Outlook may not be installed or available.")
+                # --- END OF KEY CHANGE ---
+            except Exception as e:
+                # Log to the context if email sending fails for any other reason
+                self.context.add_log(f"CRITICAL: Failed to send notification email. Error: {e}")
+
+    def _parallel_loop_items(self, source_variable: str) -> Tuple[Any, List[Any]]:
+        """Returns (source value, list of items) for a parallel loop's DataFrame or list variable."""
+        if source_variable not in self.global_variables:
+            raise ValueError(f"Global variable '{source_variable}' not found for parallel loop items.")
+        source = self.global_variables[source_variable]
+        if isinstance(source, str):
+            try: source = ast.literal_eval(source)
+            except (ValueError, SyntaxError): raise ValueError(f"Global variable '{source_variable}' is a string that is not a list.")
+        if hasattr(source, "to_dict") and hasattr(source, "columns"):
+            return source, source.to_dict("records")
+        if isinstance(source, (list, tuple)):
+            return source, list(source)
+        raise ValueError(f"Global variable '{source_variable}' must be a DataFrame or a list for a parallel loop (got {type(source).__name__}).")
+
+    def _run_parallel_iteration(self, body_steps: List[Dict[str, Any]], item: Any, iteration: int,
+                                parallel_config: Dict[str, Any], loop_config: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Runs the loop body once in its own variable scope and returns (collected variables, error).
+        The scope is a shallow copy: assigning a variable only affects this iteration, but
+        objects held by the global variables (DataFrames, lists, dicts) are shared with
+        the other iterations and must not be modified in place.
+        """
+        scope = dict(self.global_variables)
+        scope[parallel_config["item_variable"]] = item
+        if isinstance(item, dict):
+            # Row columns that match an existing global variable are bound directly,
+            # so steps configured against those variables see the current row's value.
+            for column, value in item.items():
+                if column in self.global_variables: scope[column] = value
+        assign_var = loop_config.get("assign_iteration_to_variable")
+        if assign_var: scope[assign_var] = iteration
+
+        child = StepEngine(body_steps, self.module_directory, self.context.gui_communicator, scope,
+                           {'type': 'hardcoded', 'value': 0}, bot_name=f"{self.bot_name} [iteration {iteration}]", is_child=True)
+        child.context.share_file_log(self.context)
+        with self._child_lock:
+            if self._is_stopped: return {}, "Stopped before start."
+            self._child_engines.append(child)
+        try:
+            child.run()
+        finally:
+            with self._child_lock: self._child_engines.remove(child)
+        collected = {name: scope.get(name) for name in parallel_config.get("result_variables", [])}
+        return collected, child.error_message
+
+    def _run_parallel_loop(self, step_data: Dict[str, Any], start_index: int, end_index: int) -> str:
+        """
+        Runs the body of a parallel for-each loop on a bounded thread pool, one
+        iteration per item of a DataFrame or list variable. Each iteration gets a
+        shallow copy of the global variables; the variables named in 'result_variables'
+        are collected into a DataFrame, in the original item order.
+        """
+        import pandas as pd
+
+        loop_id, loop_config = step_data["loop_id"], step_data["loop_config"]
+        parallel_config = loop_config["parallel_config"]
+        body_steps = self.steps_to_execute[start_index + 1:end_index]
+        unsafe = sorted({s.get("module_name") for s in body_steps if s.get("type") == "step" and s.get("module_name") in PARALLEL_UNSAFE_MODULES})
+        if unsafe:
+            raise ValueError(f"Parallel loop '{loop_id}' contains GUI steps ({', '.join(unsafe)}); use a normal loop for those.")
+
+        source, items = self._parallel_loop_items(parallel_config["source_variable"])
+        max_workers = max(1, int(parallel_config.get("max_workers", 4)))
+        self.context.add_log(f"Parallel loop '{loop_id}': {len(items)} item(s) on {max_workers} worker(s).")
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{loop_id}") as pool:
+            futures = [pool.submit(self._run_parallel_iteration, body_steps, item, iteration, parallel_config, loop_config)
+                       for iteration, item in enumerate(items, 1)]
+            outcomes = [future.result() for future in futures]
+
+        if self._is_stopped:
+            return "Parallel Loop Stopped"
+        for iteration, (_, error) in enumerate(outcomes, 1):
+            if error: raise ValueError(f"Parallel loop '{loop_id}' iteration {iteration} failed: {error}")
+
+        result_variables = parallel_config.get("result_variables", [])
+        results_df = pd.DataFrame([collected for collected, _ in outcomes], columns=result_variables)
+        if isinstance(source, pd.DataFrame):
+            base_df = source.drop(columns=[c for c in result_variables if c in source.columns]).reset_index(drop=True)
+            results_df = pd.concat([base_df, results_df], axis=1)
+        output_var = parallel_config.get("output_variable")
+        if output_var:
+            self.global_variables[output_var] = results_df
+            self.context.add_log(f"Parallel loop '{loop_id}' results ({len(results_df)} rows) assigned to @{output_var}")
+        return f"Parallel Loop Finished: {len(items)} item(s)"
+
+    def _write_profile_report(self, profiler: StepProfiler) -> None:
+        """Logs a short summary of the run's profile and appends the full report next to the bot."""
+        try:
+            report = profiler.report()
+            for line in format_profile_summary(report):
+                self.context.add_log(line)
+            file_path = profiler.write_report(self.bot_steps_directory, report)
+            self.context.add_log(f"Profile report appended to {file_path}")
+        except Exception as e:
+            self.context.add_log(f"WARNING: Could not write profile report: {e}")
+
+    def _warmup_templates(self, steps: List[Dict[str, Any]]) -> None:
+        try:
+            self.template_warmup_report = warmup_templates(steps, self.click_image_dir)
+        except Exception as e:
+            # Warmup only saves time; the steps still load their templates themselves.
+            self.context.add_log(f"WARNING: Template warmup failed: {e}")
+            return
+        if self.template_warmup_report["loaded"] or self.template_warmup_report["missing"] or self.template_warmup_report["unreadable"]:
+            for line in format_warmup_report(self.template_warmup_report):
+                self.context.add_log(line)
+
+    def _save_checkpoint(self, resume_index: int) -> None:
+        """
+        Saves the state needed to continue the run at resume_index: the loop, IF and
+        group stacks and the global variables. Jumps take effect immediately, so
+        there is no pending jump state to record beyond the step index.
+        """
+        started = time.perf_counter()
+        state = {
+            "bot_name": self.bot_name,
+            "fingerprint": self._steps_fingerprint,
+            "step_index": resume_index,
+            "row": self.steps_to_execute[resume_index].get("original_listbox_row_index", resume_index) + 1 if resume_index < len(self.steps_to_execute) else resume_index + 1,
+            "loop_stack": self.loop_stack,
+            "conditional_stack": self.conditional_stack,
+            "group_stack": self.group_stack,
+        }
+        try:
+            skipped = self.checkpoint_store.save(state, self.global_variables)
+        except Exception as e:
+            self.context.add_log(f"WARNING: Could not save checkpoint: {e}")
+            return
+        if skipped:
+            self.context.add_log(f"WARNING: Checkpoint could not store variable(s) {', '.join('@' + n for n in skipped)}; they will be missing after a resume.")
+        if self.profiler: self.profiler.add_overhead('checkpoint', time.perf_counter() - started)
+
+    def _maybe_checkpoint(self, resume_index: int, loop_config: Dict[str, Any], iteration: int) -> None:
+        """Saves a checkpoint every 'checkpoint_every' iterations of a loop (0 or missing = never)."""
+        if self.checkpoint_store is None:
+            return
+        try: every = int(loop_config.get("checkpoint_every", 0) or 0)
+        except (ValueError, TypeError): every = 0
+        if every > 0 and iteration % every == 0:
+            self._save_checkpoint(resume_index)
+
+    def _restore_checkpoint(self) -> Optional[int]:
+        """Restores stacks and variables from the bot's checkpoint and returns the step index to resume at."""
+        try:
+            loaded = self.checkpoint_store.load()
+        except Exception as e:
+            self.context.add_log(f"WARNING: Could not read checkpoint in {self.checkpoint_store.path}: {e}. Starting from the beginning.")
+            return None
+        if loaded is None:
+            return None
+        state, variables = loaded
+        if state.get("fingerprint") != self._steps_fingerprint:
+            self.context.add_log("WARNING: The saved checkpoint belongs to a different version of this bot's steps. Starting from the beginning.")
+            return None
+        self.global_variables.update(variables)
+        self.loop_stack = state.get("loop_stack", [])
+        self.conditional_stack = state.get("conditional_stack", [])
+        self.group_stack = state.get("group_stack", [])
+        self.context.add_log(f"Resuming from checkpoint saved at {state.get('saved_at')}: continuing at step {state.get('row')}.")
+        return state["step_index"]
+
+    def run(self) -> None:
+        self.signals.execution_started.emit("Starting execution...")
+        if not self.steps_to_execute:
+            self.signals.execution_finished_all.emit(self.context, False, -1)
+            return
+            
+        if self.selected_end_index is not None:
+            actual_end_index = min(self.selected_end_index + 1, len(self.steps_to_execute))
+        else:
+            actual_end_index = len(self.steps_to_execute)
+        
+        total_steps_for_progress = (actual_end_index - self.selected_start_index) if not self.single_step_mode else 1
+        if total_steps_for_progress == 0: total_steps_for_progress = 1
+            
+        current_execution_item_count = 0
+        original_sys_path = sys.path[:]
+        
+        # sys.path is process-wide; child engines run while their parent holds it.
+        if not self.is_child and self.module_directory not in sys.path:
+            sys.path.insert(0, self.module_directory)
+            
+        self.context.set_click_image_base_dir(self.click_image_dir)
+        self.context.set_global_variables_ref(self.global_variables)     
+        if not self.is_child:
+            try: self.context.enable_file_log(self.log_file_path)
+            except OSError as e: self.context.add_log(f"WARNING: Could not open log file {self.log_file_path}: {e}")
+        
+        self.loop_stack = []
+        self.conditional_stack = []
+        self.group_stack = []
+        # Pair all block markers once up front instead of re-scanning on every branch.
+        self.execution_plan = ExecutionPlan(self.steps_to_execute)
+        if self.template_warmup_enabled and not self.single_step_mode:
+            self._warmup_templates(self.steps_to_execute[self.selected_start_index:actual_end_index])
+        self.profiler = StepProfiler(self.bot_name) if self.profiling_enabled and not self.single_step_mode else None
+        profiler = self.profiler
+        step_index = self.selected_start_index
+        # Checkpoints only make sense for a full run of the bot; a step range or a
+        # single step would resume into a context it never had.
+        is_full_run = not self.single_step_mode and self.selected_start_index == 0 and self.selected_end_index is None
+        self.checkpoint_store = CheckpointStore(self.bot_steps_directory, self.bot_name) if self.checkpoints_enabled and is_full_run else None
+        if self.checkpoint_store is not None:
+            self._steps_fingerprint = steps_fingerprint(self.steps_to_execute)
+            if self.resume_from_checkpoint:
+                resume_index = self._restore_checkpoint()
+                if resume_index is not None: step_index = resume_index
+            else:
+                # A fresh full run supersedes whatever an earlier interrupted run left behind.
+                self.checkpoint_store.clear()
+        original_listbox_row_index = 0
+        
+        # Define the jump signal prefix
+        JUMP_PREFIX = "_JUMP_TO_STEP_::"
+
+        try:
+            while step_index < actual_end_index:
+                if profiler: profiler.end_step()
+                if self._is_paused:
+                    pause_started = time.perf_counter()
+                    while self._is_paused:
+                        if self._is_stopped: break
+                        self._sleep_ms(100)
+                    if profiler: profiler.add_overhead('pause', time.perf_counter() - pause_started)
+                
+                if self._is_stopped: break
+                if self.single_step_mode and current_execution_item_count >= 1: break
+                
+                if current_execution_item_count > 0 and not self.single_step_mode:
+                    wait_seconds = 0
+                    if self.wait_config['type'] == 'variable':
+                        var_name = self.wait_config['value']
+                        var_value = self.global_variables.get(var_name, 0)
+                        try: wait_seconds = float(var_value)
+                        except (ValueError, TypeError):
+                            self.context.add_log(f"Warning: Global variable '@{var_name}' does not contain a valid number for wait time. Using 0."); wait_seconds = 0
+                    else: wait_seconds = self.wait_config['value']
+
+                    if wait_seconds > 0:
+                        self.context.add_log(f"Waiting for {wait_seconds:.2f} second(s)..."); self._sleep_ms(int(wait_seconds * 1000))
+                        if profiler: profiler.add_overhead('wait', wait_seconds)
+                
+                step_data = self.steps_to_execute[step_index]
+                step_type = step_data["type"]
+                original_listbox_row_index = step_data.get("original_listbox_row_index", step_index)
+                current_execution_item_count += 1
+                progress_percentage = int((current_execution_item_count / total_steps_for_progress) * 100)
+                self.signals.execution_progress.emit(min(progress_percentage, 100))
+                
+                is_skipping = False
+                if self.conditional_stack:
+                    current_if_context = self.conditional_stack[-1]
+                    is_in_false_if_branch = not current_if_context.get('condition_result', True) and not current_if_context.get('else_taken', False)
+                    is_in_true_else_branch = current_if_context.get('condition_result', False) and current_if_context.get('else_taken', False)
+                    if is_in_false_if_branch and not (step_type == "ELSE" and step_data.get("if_id") == current_if_context["if_id"]): is_skipping = True
+                    elif is_in_true_else_branch and not (step_type == "IF_END" and step_data.get("if_id") == current_if_context["if_id"]): is_skipping = True
+                
+                if is_skipping:
+                    self.signals.execution_item_started.emit(step_data, original_listbox_row_index)
+                    if step_type == "IF_START": self.conditional_stack.append({'if_id': step_data['if_id'], 'start_index': step_index, 'skipped_marker': True})
+                    elif step_type == "loop_start": self.loop_stack.append({'loop_id': step_data['loop_id'], 'start_index': step_index, 'skipped_marker': True})
+                    elif step_type == "group_start": self.group_stack.append({'group_id': step_data['group_id'], 'start_index': step_index, 'skipped_marker': True})
+                    elif step_type == "IF_END" and self.conditional_stack and self.conditional_stack[-1].get('skipped_marker'): self.conditional_stack.pop()
+                    elif step_type == "loop_end" and self.loop_stack and self.loop_stack[-1].get('skipped_marker'): self.loop_stack.pop()
+                    elif step_type == "group_end" and self.group_stack and self.group_stack[-1].get('skipped_marker'): self.group_stack.pop()
+                    self.signals.execution_item_finished.emit(step_data, "SKIPPED", original_listbox_row_index); step_index += 1; continue
+                
+                if profiler: profiler.begin_step(step_index, step_data)
+                self.signals.execution_item_started.emit(step_data, original_listbox_row_index); self._sleep_ms(self.step_settle_ms)
+                if profiler: profiler.mark_overhead('settle')
+                if step_type in ["group_start", "group_end"]: self.signals.execution_item_finished.emit(step_data, "Organizational Step", original_listbox_row_index)
+                elif step_type == "loop_start" and (step_data["loop_config"].get("parallel_config") or {}).get("enabled"):
+                    loop_end_index = self.execution_plan.loop_end_for(step_index)
+                    if loop_end_index == -1: raise ValueError(f"Mismatched loop_start for ID: {step_data['loop_id']}, no loop_end found.")
+                    summary = self._run_parallel_loop(step_data, step_index, loop_end_index)
+                    step_index = loop_end_index
+                    self.signals.execution_item_finished.emit(step_data, summary, original_listbox_row_index)
+                elif step_type == "loop_start":
+                    loop_id, loop_config = step_data["loop_id"], step_data["loop_config"]
+                    is_new_loop = not (self.loop_stack and self.loop_stack[-1].get('loop_id') == loop_id)
+                    if is_new_loop: total_iterations = self._resolve_loop_count(loop_config); self.loop_stack.append({'loop_id': loop_id, 'start_index': step_index, 'current_iteration': 1, 'total_iterations': total_iterations, 'loop_config': loop_config}); self.signals.loop_iteration_started.emit(loop_id, 1)
+                    else: current_loop_info = self.loop_stack[-1]; current_loop_info['current_iteration'] += 1; current_loop_info['total_iterations'] = self._resolve_loop_count(loop_config); self.signals.loop_iteration_started.emit(loop_id, current_loop_info['current_iteration'])
+                    current_loop_info = self.loop_stack[-1]
+                    if profiler: profiler.loop_iteration(loop_id, current_loop_info['current_iteration'])
+                    if current_loop_info['current_iteration'] > current_loop_info['total_iterations']:
+                        self.loop_stack.pop()
+                        loop_end_index = self.execution_plan.loop_end_for(step_index)
+                        if loop_end_index != -1: step_index = loop_end_index
+                        if profiler: profiler.loop_finished(loop_id)
+                        self.signals.execution_item_finished.emit(step_data, "Loop Finished", original_listbox_row_index)
+                    else:
+                        assign_var = loop_config.get("assign_iteration_to_variable")
+                        if assign_var: self.global_variables[assign_var] = current_loop_info['current_iteration']; self.context.add_log(f"Assigned iteration {current_loop_info['current_iteration']} to @{assign_var}")
+                        # Resuming replays this iteration from its first body step.
+                        self._maybe_checkpoint(step_index + 1, loop_config, current_loop_info['current_iteration'])
+                        self.signals.execution_item_finished.emit(step_data, f"Iter {current_loop_info['current_iteration']}/{current_loop_info['total_iterations']}", original_listbox_row_index)
+                elif step_type == "loop_end":
+                    if not self.loop_stack or self.loop_stack[-1].get('loop_id') != step_data['loop_id']: raise ValueError(f"Mismatched loop_end for ID: {step_data['loop_id']}")
+                    step_index = self.loop_stack[-1]['start_index'] - 1; self.signals.execution_item_finished.emit(step_data, "Looping...", original_listbox_row_index)
+                elif step_type == "step":
+                    class_name, method_name, module_name, parameters_config, assign_to_variable_name = step_data["class_name"], step_data["method_name"], step_data["module_name"], step_data["parameters_config"], step_data["assign_to_variable_name"]
+                    resolved_parameters, params_str_debug = {}, []
+                    for param_name, config in parameters_config.items():
+                        if param_name == "original_listbox_row_index": continue
+                        if config['type'] == 'hardcoded': resolved_parameters[param_name] = config['value']; params_str_debug.append(f"{param_name}={repr(config['value'])}")
+                        elif config['type'] == 'hardcoded_file': resolved_parameters[param_name] = config['value']; params_str_debug.append(f"{param_name}=FILE('{config['value']}')")
+                        elif config['type'] == 'variable':
+                            var_name = config['value']
+                            if var_name in self.global_variables:
+                                val = self.global_variables[var_name]
+                                val_repr = repr(val)
+                                if len(val_repr) > 100: val_repr = val_repr[:100] + "..."
+                                resolved_parameters[param_name] = val
+                                params_str_debug.append(f"{param_name}=@{var_name}({val_repr})")
+                            else: raise ValueError(f"Global variable '{var_name}' not found for parameter '{param_name}'.")
+                    self.context.add_log(f"Executing: {class_name}.{method_name}({', '.join(params_str_debug)})")
+                    if profiler: profiler.mark('resolve')
+                    try:
+                        # Imports, reloads and signature checks are cached; a module is only
+                        # reloaded when its file has actually been edited since the last step.
+                        class_obj = module_cache.get_class(module_name, class_name)
+                        instance_key = (class_name, module_name)
+                        if instance_key not in self.instantiated_objects:
+                            init_kwargs = {};
+                            if module_cache.accepts_context(class_obj, '__init__'): init_kwargs['context'] = self.context
+                            self.instantiated_objects[instance_key] = class_obj(**init_kwargs)
+                        instance = self.instantiated_objects[instance_key]; method_func = getattr(instance, method_name); method_kwargs = {k:v for k,v in resolved_parameters.items()}
+                        if module_cache.accepts_context(type(instance), method_name): method_kwargs['context'] = self.context
+                        
+                        # Execute the method and get the result
+                        result = method_func(**method_kwargs)
+                        if profiler: profiler.mark('call')
+                        
+                        # ===============================================
+                        # === NEW JUMP LOGIC STARTS HERE ===
+                        # ===============================================
+                        if isinstance(result, str) and result.startswith(JUMP_PREFIX):
+                            try:
+                                # 1. Parse the target step number from the result string
+                                target_step_1_based = int(result.replace(JUMP_PREFIX, ""))
+                                # 2. Convert to 0-based index for our list
+                                target_index_0_based = target_step_1_based - 1
+
+                                # 3. Validate the target index
+                                if 0 <= target_index_0_based < len(self.steps_to_execute):
+                                    # 4. Leave any loop/IF/group block the target lies outside of,
+                                    #    so stale frames don't mis-drive the markers we land on.
+                                    for stack in (self.loop_stack, self.conditional_stack, self.group_stack):
+                                        self.execution_plan.trim_stack_for_jump(stack, target_index_0_based)
+                                    # 5. Set the main step_index to the new target.
+                                    #    We subtract 1 because the loop will auto-increment it.
+                                    step_index = target_index_0_based - 1
+                                    self.context.add_log(f"Jumping to step {target_step_1_based}.")
+                                    self.signals.execution_item_finished.emit(step_data, f"Jumping to step {target_step_1_based}", original_listbox_row_index)
+                                else:
+                                    # The jump target is out of bounds, treat as an error
+                                    raise ValueError(f"Jump target step {target_step_1_based} is out of bounds (1-{len(self.steps_to_execute)}).")
+                            except (ValueError, TypeError) as jump_error:
+                                # Catch errors from parsing or invalid numbers
+                                raise ValueError(f"Invalid JumpTo instruction: {jump_error}")
+                            
+                            # After setting the new index, continue to the next loop iteration
+                            # to immediately process the target step.
+                            step_index += 1
+                            continue 
+                        # ===============================================
+                        # === NEW JUMP LOGIC ENDS HERE ===
+                        # ===============================================
+                        
+                        # --- This is the original logic for normal steps ---
+                        if assign_to_variable_name: 
+                            self.global_variables[assign_to_variable_name] = result
+                            result_msg = f"Result: {result} (Assigned to @{assign_to_variable_name})"
+                        else: 
+                            result_msg = f"Result: {result}"
+                            
+                        self.signals.execution_item_finished.emit(step_data, result_msg, original_listbox_row_index)
+                        
+                    except Exception as e: raise e
+                elif step_type == "IF_START":
+                    condition_config, if_id = step_data["condition_config"], step_data["if_id"]; condition_result = self._evaluate_condition(condition_config["condition"])
+                    self.context.add_log(f"IF '{if_id}' evaluated: {condition_result}"); self.conditional_stack.append({'if_id': if_id, 'start_index': step_index, 'condition_result': condition_result, 'else_taken': False})
+                    self.signals.execution_item_finished.emit(step_data, f"Condition: {condition_result}", original_listbox_row_index)
+                    if not condition_result:
+                        target_index = self.execution_plan.false_branch_target(step_index)
+                        if target_index != -1: step_index = target_index - 1
+                        else: raise ValueError(f"Mismatched IF_START for ID: {if_id}, no ELSE or IF_END found.")
+                elif step_type == "ELSE":
+                    if not self.conditional_stack or self.conditional_stack[-1].get('if_id') != step_data['if_id']: raise ValueError(f"Mismatched ELSE for ID: {step_data['if_id']}")
+                    current_if = self.conditional_stack[-1]; current_if['else_taken'] = True; self.signals.execution_item_finished.emit(step_data, "Branching", original_listbox_row_index)
+                    if current_if.get('condition_result', False):
+                        target_index = self.execution_plan.if_end_for_else(step_index)
+                        if target_index != -1: step_index = target_index - 1
+                        else: raise ValueError(f"Mismatched ELSE for ID: {current_if['if_id']}, no IF_END found.")
+                elif step_type == "IF_END":
+                    if not self.conditional_stack or self.conditional_stack[-1].get('if_id') != step_data['if_id']: raise ValueError(f"Mismatched IF_END for ID: {step_data['if_id']}")
+                    self.conditional_stack.pop(); self.signals.execution_item_finished.emit(step_data, "End of Conditional", original_listbox_row_index)
+                step_index += 1
+        except Exception as e:
+            self.error_message = f"Error at step {original_listbox_row_index+1}: {type(e).__name__}: {e}"
+            self.context.add_log(self.error_message)
+            self.signals.execution_error.emit(self.steps_to_execute[step_index] if step_index < len(self.steps_to_execute) else {}, self.error_message, original_listbox_row_index)
+            self._is_stopped = True
+        finally:
+            if not self.is_child: sys.path = original_sys_path
+            if profiler: self._write_profile_report(profiler)
+            if self.checkpoint_store is not None and self.checkpoint_store.exists():
+                if self._is_stopped: self.context.add_log(f"Checkpoint kept in {self.checkpoint_store.path}; the next run can resume from it.")
+                else: self.checkpoint_store.clear()
+            if self.single_step_mode:
+                next_index = -1
+                if not self._is_stopped and step_index < len(self.steps_to_execute): next_index = self.steps_to_execute[step_index].get("original_listbox_row_index", -1)
+                self.next_step_index_to_select = next_index
+            
+            if not self.single_step_mode:
+                self._send_notification_email()
+            
+            self.context.flush_logs()
+            self.signals.execution_finished_all.emit(self.context, self._is_stopped, self.next_step_index_to_select)
+
+
+    def pause(self): self._is_paused = True; self.context.add_log("Execution PAUSED."); self.signals.execution_started.emit("Execution PAUSED.")
+    def resume(self): self._is_paused = False; self.context.add_log("Execution RESUMED."); self.signals.execution_started.emit("Execution RESUMED.")
+    def stop(self):
+        self._is_stopped = True; self.context.add_log("Execution STOP requested by user."); self.signals.execution_started.emit("Execution STOPPED.")
+        with self._child_lock:
+            for child in self._child_engines: child._is_stopped = True
+
+
+def run_bot_file(file_path: str, module_directory: Optional[str] = None,
+                 variable_overrides: Optional[Dict[str, Any]] = None,
+                 wait_seconds: float = 0, log_callback=None,
+                 email_config: Optional[Dict[str, Any]] = None,
+                 resume_from_checkpoint: bool = False) -> Tuple[ExecutionContext, bool, Dict[str, Any]]:
+    """
+    Loads a saved bot and executes it to completion on the calling thread,
+    without a QApplication. Returns (context, stopped_by_error, global_variables).
+    With resume_from_checkpoint, a checkpoint left by an interrupted run is picked up.
+    This is a plain top-level function so it can also be handed to a process pool.
+    """
+    if module_directory is None:
+        module_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Bot_module")
+    global_variables, steps = load_bot_file(file_path)
+    if variable_overrides:
+        global_variables.update(variable_overrides)
+    for index, step_data in enumerate(steps):
+        step_data.setdefault("original_listbox_row_index", index)
+
+    bot_name = os.path.splitext(os.path.basename(file_path))[0]
+    engine = StepEngine(
+        steps, module_directory, HeadlessCommunicator(log_callback), global_variables,
+        {'type': 'hardcoded', 'value': wait_seconds},
+        bot_name=bot_name,
+        email_config=email_config,
+        bot_steps_directory=os.path.dirname(os.path.abspath(file_path)),
+        resume_from_checkpoint=resume_from_checkpoint
+    )
+    # There is no GUI to repaint between steps.
+    engine.step_settle_ms = 0
+    engine.run()
+    return engine.context, engine._is_stopped, global_variables
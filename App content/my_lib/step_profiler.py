@@ -0,0 +1,183 @@
+# step_profiler.py
+import os
+import json
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+# Raw per-step records kept for inspection; totals cover every step regardless.
+MAX_RECENT_RECORDS = 1000
+
+
+class StepProfiler:
+    """
+    Collects per-step timings for one bot run and turns them into a report.
+
+    For each executed step it records wall time, CPU time of the executing
+    thread, the split between parameter resolution and the method call, and
+    the fixed delays spent around it (GUI settle pause, wait_config delay,
+    time paused by the user). Loops are aggregated per iteration.
+
+    Per-method and per-loop totals are updated as each step finishes, so a
+    bot that loops for hours holds a fixed amount of profile data; only the
+    last MAX_RECENT_RECORDS raw step records are kept.
+    """
+    def __init__(self, bot_name: str):
+        self.bot_name = bot_name
+        self.started_at = datetime.now()
+        self._run_start = time.perf_counter()
+        self._run_cpu_start = time.thread_time()
+        self.records: Deque[Dict[str, Any]] = deque(maxlen=MAX_RECENT_RECORDS)
+        self.steps_executed = 0
+        # (module, class, method) -> running totals for the report
+        self._methods: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._overhead_totals: Dict[str, float] = {}
+        self._current: Optional[Dict[str, Any]] = None
+        self._last_mark = 0.0
+        # Overhead measured before a step starts (e.g. the wait between steps) is
+        # attributed to the step that follows it.
+        self._pending_overhead: Dict[str, float] = {}
+        # loop_id -> (start of current iteration, totals of the finished iterations)
+        self._loops: Dict[str, Tuple[Optional[float], Dict[str, float]]] = {}
+        self._loop_stack: List[Tuple[str, int]] = []
+
+    def begin_step(self, step_index: int, step_data: Dict[str, Any]) -> None:
+        """Starts timing a step, closing the previous one if it is still open."""
+        self.end_step()
+        now = time.perf_counter()
+        step_type = step_data.get("type", "")
+        self._current = {
+            "index": step_index,
+            "row": step_data.get("original_listbox_row_index", step_index) + 1,
+            "type": step_type,
+            "module": step_data.get("module_name", "") if step_type == "step" else "",
+            "class": step_data.get("class_name", "") if step_type == "step" else "",
+            "method": step_data.get("method_name", "") if step_type == "step" else step_type,
+            "loop": self._loop_stack[-1][0] if self._loop_stack else None,
+            "iteration": self._loop_stack[-1][1] if self._loop_stack else None,
+            "resolve_s": 0.0,
+            "call_s": 0.0,
+            "overhead": dict(self._pending_overhead),
+            # Delays that happened before the step began still count towards its wall time.
+            "_wall_start": now - sum(self._pending_overhead.values()),
+            "_cpu_start": time.thread_time(),
+        }
+        self._pending_overhead = {}
+        self._last_mark = now
+
+    def mark(self, phase: str) -> None:
+        """Attributes the time since the previous mark to 'resolve' or 'call'."""
+        if self._current is None:
+            return
+        now = time.perf_counter()
+        self._current[f"{phase}_s"] += now - self._last_mark
+        self._last_mark = now
+
+    def mark_overhead(self, kind: str) -> None:
+        """Records the time since the previous mark as a fixed delay of the current step (e.g. 'settle')."""
+        if self._current is None:
+            return
+        now = time.perf_counter()
+        self.add_overhead(kind, now - self._last_mark)
+        self._last_mark = now
+
+    def add_overhead(self, kind: str, seconds: float) -> None:
+        """Records a fixed delay ('settle', 'wait', 'pause') against the current or next step."""
+        target = self._current["overhead"] if self._current is not None else self._pending_overhead
+        target[kind] = target.get(kind, 0.0) + seconds
+
+    def end_step(self) -> None:
+        if self._current is None:
+            return
+        record = self._current
+        record["wall_s"] = time.perf_counter() - record.pop("_wall_start")
+        record["cpu_s"] = time.thread_time() - record.pop("_cpu_start")
+        self.records.append(record)
+        self.steps_executed += 1
+        self._current = None
+
+        key = (record["module"], record["class"], record["method"])
+        row = self._methods.get(key)
+        if row is None:
+            row = self._methods[key] = {
+                "module": key[0], "class": key[1], "method": key[2], "calls": 0,
+                "total_wall_s": 0.0, "max_wall_s": 0.0, "total_cpu_s": 0.0,
+                "resolve_s": 0.0, "call_s": 0.0, "overhead_s": 0.0,
+            }
+        row["calls"] += 1
+        row["total_wall_s"] += record["wall_s"]
+        row["max_wall_s"] = max(row["max_wall_s"], record["wall_s"])
+        row["total_cpu_s"] += record["cpu_s"]
+        row["resolve_s"] += record["resolve_s"]
+        row["call_s"] += record["call_s"]
+        for kind, seconds in record["overhead"].items():
+            row["overhead_s"] += seconds
+            self._overhead_totals[kind] = self._overhead_totals.get(kind, 0.0) + seconds
+
+    def loop_iteration(self, loop_id: str, iteration: int) -> None:
+        """Called when a loop starts an iteration; closes the previous iteration's timing."""
+        now = time.perf_counter()
+        start, totals = self._loops.get(loop_id, (None, {"iterations": 0, "total_s": 0.0, "min_s": 0.0, "max_s": 0.0}))
+        if start is not None:
+            duration = now - start
+            totals["min_s"] = min(totals["min_s"], duration) if totals["iterations"] else duration
+            totals["max_s"] = max(totals["max_s"], duration)
+            totals["iterations"] += 1
+            totals["total_s"] += duration
+        self._loops[loop_id] = (now, totals)
+        if self._loop_stack and self._loop_stack[-1][0] == loop_id:
+            self._loop_stack[-1] = (loop_id, iteration)
+        else:
+            self._loop_stack.append((loop_id, iteration))
+
+    def loop_finished(self, loop_id: str) -> None:
+        if loop_id in self._loops:
+            # The last "iteration" start is the check that ended the loop; it has no body.
+            self._loops[loop_id] = (None, self._loops[loop_id][1])
+        if self._loop_stack and self._loop_stack[-1][0] == loop_id:
+            self._loop_stack.pop()
+
+    def report(self) -> Dict[str, Any]:
+        """Builds the run report: per-method aggregates (slowest first) and per-loop iteration stats."""
+        self.end_step()
+        methods = [dict(row, mean_wall_s=row["total_wall_s"] / row["calls"]) for row in self._methods.values()]
+        loops = [{"loop_id": loop_id, "iterations": totals["iterations"], "total_s": totals["total_s"],
+                  "mean_s": totals["total_s"] / totals["iterations"], "min_s": totals["min_s"], "max_s": totals["max_s"]}
+                 for loop_id, (_, totals) in self._loops.items() if totals["iterations"]]
+
+        return {
+            "bot_name": self.bot_name,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "total_wall_s": time.perf_counter() - self._run_start,
+            "total_cpu_s": time.thread_time() - self._run_cpu_start,
+            "steps_executed": self.steps_executed,
+            "overhead_s": dict(self._overhead_totals),
+            "methods": sorted(methods, key=lambda r: r["total_wall_s"], reverse=True),
+            "loops": sorted(loops, key=lambda r: r["total_s"], reverse=True),
+        }
+
+    def write_report(self, output_dir: str, report: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Appends the report as one JSON line to '<bot name>.profile.jsonl' in output_dir,
+        so successive runs of the same bot can be compared. Returns the file path.
+        """
+        report = report or self.report()
+        safe_name = "".join(c if c not in '\\/:*?"<>|' else "_" for c in self.bot_name)
+        os.makedirs(output_dir, exist_ok=True)
+        file_path = os.path.join(output_dir, f"{safe_name}.profile.jsonl")
+        with open(file_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report, default=str) + "\n")
+        return file_path
+
+
+def format_profile_summary(report: Dict[str, Any], top: int = 5) -> List[str]:
+    """Returns a few human-readable log lines for the slowest methods in a report."""
+    lines = [f"Profile: {report['steps_executed']} step(s) in {report['total_wall_s']:.2f}s wall, {report['total_cpu_s']:.2f}s CPU."]
+    for row in report["methods"][:top]:
+        name = ".".join(part for part in (row["class"], row["method"]) if part)
+        lines.append(f"  {name}: {row['calls']} call(s), {row['total_wall_s']:.3f}s total "
+                     f"(resolve {row['resolve_s']:.3f}s, call {row['call_s']:.3f}s, waits {row['overhead_s']:.3f}s)")
+    return lines
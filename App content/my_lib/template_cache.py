@@ -0,0 +1,144 @@
+# template_cache.py
+import os
+import io
+import json
+import base64
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import PIL.Image
+
+from my_lib.template_pack import TemplatePack, split_template_name
+
+
+TEMPLATE_EXTENSION = ".txt"
+
+# One decoded variant: (variant key from the .txt file, read-only grayscale uint8 array).
+TemplateVariant = Tuple[str, np.ndarray]
+
+
+def decode_variant(data: str) -> np.ndarray:
+    """Decodes one base64 PNG variant into a read-only grayscale (uint8, 2-D) array."""
+    with PIL.Image.open(io.BytesIO(base64.b64decode(data))) as img:
+        gray = np.array(img.convert("L"))
+    gray.flags.writeable = False
+    return gray
+
+
+def load_template_file(path: str) -> List[TemplateVariant]:
+    """Reads a Click_image .txt file ({variant key: base64 PNG}) and decodes every variant."""
+    with open(path) as json_file:
+        image_file = json.load(json_file)
+    return [(key, decode_variant(data)) for key, data in image_file.items()]
+
+
+class TemplateCache:
+    """
+    An LRU cache of decoded Click_image templates for the image steps.
+
+    Entries are keyed by the template file's path and only re-read when its
+    modification time changes, so a polling loop or a 12-variant SAP button no
+    longer pays json.load plus a PNG decode per variant on every attempt. Each
+    entry holds ready-to-match grayscale arrays; they are shared between
+    callers and marked read-only.
+
+    Templates of a folder that has a template pack are served from the pack
+    (no decode at all) and stamped with the template's version in the pack
+    instead of an mtime; the .txt file is only used when the pack lacks it.
+    """
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        # path (or 'pack path#name') -> (mtime_ns or pack version, variants)
+        self._entries: "OrderedDict[str, Tuple[int, List[TemplateVariant]]]" = OrderedDict()
+        self._packs: Dict[str, TemplatePack] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def template_path(base_dir: str, image_name: str) -> str:
+        """Maps a step's image name (e.g. 'SAP GUI/SAP_logon_button') to its .txt file."""
+        return os.path.join(base_dir, image_name) + TEMPLATE_EXTENSION
+
+    def get(self, path: str) -> List[TemplateVariant]:
+        """
+        Returns the decoded variants of a template file, decoding it on first use
+        or after the file has changed. Raises OSError if the file does not exist.
+        """
+        path = os.path.normpath(path)
+        return self._get_or_load(path, os.stat(path).st_mtime_ns, lambda: load_template_file(path))
+
+    def _get_or_load(self, key: str, stamp: int, load: Callable[[], List[TemplateVariant]]) -> List[TemplateVariant]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        # Decode outside the lock; a concurrent miss on the same file just decodes twice.
+        variants = load()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (stamp, variants)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return variants
+
+    def _pack_for(self, base_dir: str, image_name: str) -> Tuple[Optional[TemplatePack], str]:
+        """
+        The folder's pack if it holds the template or removed it (None if the .txt
+        file applies instead) and the template's name in the pack.
+        """
+        folder, base = split_template_name(image_name)
+        folder_path = os.path.normpath(os.path.join(base_dir, folder))
+        with self._lock:
+            pack = self._packs.get(folder_path)
+            if pack is None:
+                pack = self._packs[folder_path] = TemplatePack.for_folder(folder_path)
+            if pack.refresh() and (base in pack or pack.is_removed(base)):
+                return pack, base
+        return None, base
+
+    def get_template(self, base_dir: str, image_name: str) -> List[TemplateVariant]:
+        pack, base = self._pack_for(base_dir, image_name)
+        if pack is not None:
+            if base not in pack:
+                raise FileNotFoundError(f"Template '{image_name}' was removed from {pack.path}.")
+            return self._get_or_load(f"{pack.path}#{base}", pack.version(base), lambda: pack.variants(base))
+        return self.get(self.template_path(base_dir, image_name))
+
+    def stamp(self, path: str) -> Optional[int]:
+        """The mtime_ns the cached entry was decoded from (None if not cached), without touching the disk."""
+        with self._lock:
+            entry = self._entries.get(os.path.normpath(path))
+            return entry[0] if entry is not None else None
+
+    def template_stamp(self, base_dir: str, image_name: str) -> Optional[int]:
+        """stamp() for a step's image name, whether it lives in a pack or in a .txt file."""
+        pack, base = self._pack_for(base_dir, image_name)
+        if pack is not None:
+            return self.stamp(f"{pack.path}#{base}") if base in pack else None
+        return self.stamp(self.template_path(base_dir, image_name))
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Drops one template (or all of them) so the next lookup decodes it again."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.normpath(path), None)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns hit/miss/eviction counters and the number of cached templates."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries)}
+
+
+# Shared by every Bot_utility in the process, so steps and runs reuse each other's decodes.
+template_cache = TemplateCache()
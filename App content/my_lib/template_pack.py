@@ -0,0 +1,353 @@
+# template_pack.py
+import os
+import io
+import sys
+import json
+import mmap
+import base64
+import struct
+import argparse
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import PIL.Image
+
+
+PACK_FILE_NAME = "templates.tpack"
+PACK_MAGIC = b"TPK1"
+PACK_VERSION = 1
+# magic, format version, offset and length of the current JSON index
+_HEADER = struct.Struct("<4sIQQ")
+
+
+def pack_path(folder: str) -> str:
+    return os.path.join(folder, PACK_FILE_NAME)
+
+
+def _empty_index() -> Dict[str, Any]:
+    # 'removed' lists templates deleted from the pack, so a leftover .txt file of
+    # the same name does not bring them back.
+    return {"generation": 0, "templates": {}, "removed": []}
+
+
+def _decode_gray(png: bytes) -> np.ndarray:
+    with PIL.Image.open(io.BytesIO(png)) as img:
+        return np.ascontiguousarray(np.array(img.convert("L")))
+
+
+class TemplatePack:
+    """
+    One binary file per Click_image folder holding every template of that folder.
+
+    Each variant is stored twice: as raw grayscale pixels, which are read
+    through mmap straight into numpy arrays with no decode step, and as the
+    original PNG, for the screenshot tool's preview and for exporting back to
+    the .txt format. The file is append-only: a save writes the new records
+    and a new JSON index at the end, then points the fixed-size header at that
+    index. Readers that already mapped the file keep a consistent view, and an
+    interrupted save leaves the previous index in place. compact() drops the
+    records no index refers to any more.
+
+    A template removed from the pack stays listed as removed until it is
+    written again; the folder's .txt file of that name is then ignored.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._mm: Optional[mmap.mmap] = None
+        self._index: Dict[str, Any] = _empty_index()
+        self._signature: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    def for_folder(cls, folder: str) -> "TemplatePack":
+        return cls(pack_path(folder))
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    # --- Reading ---
+    def refresh(self) -> bool:
+        """Maps the file again if it changed on disk. Returns False if there is no pack file."""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                self._mm, self._index, self._signature = None, _empty_index(), None
+                return False
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signature == self._signature:
+                return True
+            with open(self.path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, offset, length = _HEADER.unpack_from(mm, 0)
+            if magic != PACK_MAGIC or version != PACK_VERSION:
+                raise ValueError(f"'{self.path}' is not a version {PACK_VERSION} template pack.")
+            index = json.loads(mm[offset:offset + length].decode("utf-8")) if length else _empty_index()
+            # Arrays handed out earlier keep the previous map alive until they are dropped.
+            self._mm, self._index, self._signature = mm, index, signature
+            return True
+
+    def names(self) -> List[str]:
+        with self._lock:
+            self.refresh()
+            return sorted(self._index["templates"])
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._index["templates"]
+
+    def is_removed(self, name: str) -> bool:
+        """True if the template was removed from the pack (and not written again since)."""
+        with self._lock:
+            return name in self._index.get("removed", ())
+
+    def removed_names(self) -> List[str]:
+        with self._lock:
+            self.refresh()
+            return sorted(self._index.get("removed", ()))
+
+    def version(self, name: str) -> Optional[int]:
+        """Changes whenever the template is rewritten; used like a file mtime."""
+        with self._lock:
+            self.refresh()
+            entry = self._index["templates"].get(name)
+            return entry["version"] if entry else None
+
+    def variants(self, name: str) -> List[Tuple[str, np.ndarray]]:
+        """Returns (variant key, read-only grayscale array) pairs that view the mapped file directly."""
+        with self._lock:
+            self.refresh()
+            entry = self._index["templates"].get(name)
+            if entry is None:
+                raise KeyError(name)
+            return [(record["key"], np.frombuffer(self._mm, dtype=np.uint8, count=record["width"] * record["height"],
+                                                  offset=record["offset"]).reshape(record["height"], record["width"]))
+                    for record in entry["variants"]]
+
+    def png_variants(self, name: str) -> Dict[str, str]:
+        """Returns {variant key: base64 PNG}, the same shape as a Click_image .txt file."""
+        with self._lock:
+            self.refresh()
+            entry = self._index["templates"].get(name)
+            if entry is None:
+                raise KeyError(name)
+            return {record["key"]: base64.b64encode(self._mm[record["png_offset"]:record["png_offset"] + record["png_length"]]).decode("ascii")
+                    for record in entry["variants"]}
+
+    # --- Writing ---
+    def _commit(self, edit: Callable[[Dict[str, Any], Callable[[str, str], Dict[str, Any]]], None],
+                removed: Tuple[str, ...] = (), after_generation: int = 0) -> None:
+        """
+        Runs edit(templates, write_variant) against the latest on-disk index and
+        commits the result. write_variant(key, base64 PNG) appends one record
+        and returns its index entry. Templates the edit drops (and the names in
+        removed) are recorded as removed; templates it writes no longer are.
+
+        Every commit gets a new generation number, higher than after_generation,
+        and templates the edit leaves with version None get that number as their
+        version. Versions therefore only ever increase, also for a template that
+        is removed and added again, so a stamp cached earlier is never reused.
+        """
+        with self._lock:
+            if not self.exists():
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "wb") as f:
+                    f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, 0))
+            with open(self.path, "r+b") as f:
+                magic, version, offset, length = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != PACK_MAGIC or version != PACK_VERSION:
+                    raise ValueError(f"'{self.path}' is not a version {PACK_VERSION} template pack.")
+                index = _empty_index()
+                if length:
+                    f.seek(offset)
+                    index = json.loads(f.read(length).decode("utf-8"))
+                index["generation"] = max(index["generation"], after_generation) + 1
+                f.seek(0, os.SEEK_END)
+
+                def write_variant(key: str, data: str) -> Dict[str, Any]:
+                    png = base64.b64decode(data)
+                    gray = _decode_gray(png)
+                    record = {"key": key, "width": int(gray.shape[1]), "height": int(gray.shape[0]), "offset": f.tell()}
+                    f.write(gray.tobytes())
+                    record["png_offset"], record["png_length"] = f.tell(), len(png)
+                    f.write(png)
+                    return record
+
+                before = set(index["templates"])
+                edit(index["templates"], write_variant)
+                after = set(index["templates"])
+                for entry in index["templates"].values():
+                    if entry["version"] is None:
+                        entry["version"] = index["generation"]
+                index["removed"] = sorted((set(index.get("removed", ())) | (before - after) | set(removed)) - after)
+                index_bytes = json.dumps(index).encode("utf-8")
+                index_offset = f.tell()
+                f.write(index_bytes)
+                f.flush()
+                os.fsync(f.fileno())
+                # Only now does the header point at the new index.
+                f.seek(0)
+                f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, index_offset, len(index_bytes)))
+                f.flush()
+                os.fsync(f.fileno())
+            self.refresh()
+
+    def put_templates(self, templates: Dict[str, Dict[str, str]]) -> None:
+        """Writes (or replaces) several templates, each given as {variant key: base64 PNG}, in one commit."""
+        def edit(index_templates, write_variant):
+            for name, data in templates.items():
+                index_templates[name] = {"version": None, "variants": [write_variant(key, value) for key, value in data.items()]}
+        self._commit(edit)
+
+    def put_template(self, name: str, data: Dict[str, str]) -> None:
+        self.put_templates({name: data})
+
+    def add_variant(self, name: str, key: str, data: str) -> None:
+        """Appends one variant to a template (creating it), without rewriting the others."""
+        def edit(index_templates, write_variant):
+            entry = index_templates.get(name, {"variants": []})
+            variants = [record for record in entry["variants"] if record["key"] != key] + [write_variant(key, data)]
+            index_templates[name] = {"version": None, "variants": variants}
+        self._commit(edit)
+
+    def remove_variant(self, name: str, key: str) -> None:
+        """Drops one variant; the template itself is removed with its last variant."""
+        def edit(index_templates, write_variant):
+            entry = index_templates.get(name)
+            if entry is None:
+                return
+            variants = [record for record in entry["variants"] if record["key"] != key]
+            if variants:
+                index_templates[name] = {"version": None, "variants": variants}
+            else:
+                del index_templates[name]
+        self._commit(edit)
+
+    def remove_template(self, name: str) -> None:
+        self._commit(lambda index_templates, write_variant: index_templates.pop(name, None))
+
+    def compact(self) -> None:
+        """
+        Rewrites the pack with only its live records. Versions, the removed list and
+        the generation count carry over. On Windows this fails while another
+        process has the pack mapped; it is safe to retry later.
+        """
+        with self._lock:
+            self.refresh()
+            live = {name: (self.version(name), self.png_variants(name)) for name in self.names()}
+            temp = TemplatePack(self.path + ".tmp")
+            if temp.exists():
+                os.remove(temp.path)
+
+            def edit(index_templates, write_variant):
+                for name, (version, data) in live.items():
+                    index_templates[name] = {"version": version, "variants": [write_variant(key, value) for key, value in data.items()]}
+            temp._commit(edit, removed=tuple(self.removed_names()), after_generation=self._index["generation"])
+            self._mm, self._signature = None, None
+            os.replace(temp.path, self.path)
+            self.refresh()
+
+
+# --- Click_image helpers shared by the screenshot tool, the step dialogs and the importer ---
+def split_template_name(image_name: str) -> Tuple[str, str]:
+    """'SAP GUI/SAP_logon_button' -> ('SAP GUI', 'SAP_logon_button')."""
+    folder, _, base = image_name.replace("\\", "/").rpartition("/")
+    return folder, base
+
+
+def list_template_names(click_image_dir: str) -> List[str]:
+    """
+    All template names under Click_image/, from .txt files and packs alike, e.g.
+    'SAP GUI/SAP_logon_button'. A .txt file is skipped if its folder's pack removed that name.
+    """
+    names = set()
+    for root, _, files in os.walk(click_image_dir):
+        folder = os.path.relpath(root, click_image_dir).replace(os.sep, "/")
+        prefix = "" if folder == "." else folder + "/"
+        removed = set()
+        if PACK_FILE_NAME in files:
+            try:
+                pack = TemplatePack(os.path.join(root, PACK_FILE_NAME))
+                names.update(prefix + name for name in pack.names())
+                removed = set(pack.removed_names())
+            except (OSError, ValueError):
+                pass
+        for file_name in files:
+            if file_name.lower().endswith(".txt") and os.path.splitext(file_name)[0] not in removed:
+                names.add(prefix + os.path.splitext(file_name)[0])
+    return sorted(names)
+
+
+def read_template_data(click_image_dir: str, image_name: str) -> Dict[str, str]:
+    """
+    Returns {variant key: base64 PNG} from the folder's pack, else from the .txt file.
+    Raises FileNotFoundError if there is neither, or if the pack removed the template.
+    """
+    folder, base = split_template_name(image_name)
+    pack = TemplatePack.for_folder(os.path.join(click_image_dir, folder))
+    if pack.refresh():
+        if base in pack:
+            return pack.png_variants(base)
+        if pack.is_removed(base):
+            raise FileNotFoundError(f"Template '{image_name}' was removed from {pack.path}.")
+    with open(os.path.join(click_image_dir, image_name) + ".txt", "r") as json_file:
+        return json.load(json_file)
+
+
+def import_folder(folder: str, remove_txt: bool = False) -> int:
+    """Copies every .txt template of one folder (not its subfolders) into the folder's pack."""
+    templates = {}
+    for file_name in sorted(os.listdir(folder)):
+        if file_name.lower().endswith(".txt"):
+            with open(os.path.join(folder, file_name), "r") as json_file:
+                templates[os.path.splitext(file_name)[0]] = json.load(json_file)
+    if templates:
+        TemplatePack.for_folder(folder).put_templates(templates)
+        if remove_txt:
+            for name in templates:
+                os.remove(os.path.join(folder, name + ".txt"))
+    return len(templates)
+
+
+def export_folder(folder: str, output_folder: Optional[str] = None) -> int:
+    """Writes every template of a folder's pack back out as .txt files (into output_folder, default the folder)."""
+    pack = TemplatePack.for_folder(folder)
+    if not pack.refresh():
+        return 0
+    output_folder = output_folder or folder
+    os.makedirs(output_folder, exist_ok=True)
+    names = pack.names()
+    for name in names:
+        with open(os.path.join(output_folder, name + ".txt"), "w") as outfile:
+            json.dump(pack.png_variants(name), outfile, indent=4)
+    return len(names)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    # python -m my_lib.template_pack import "Click_image/SAP GUI" --remove-txt
+    # python -m my_lib.template_pack export "Click_image/SAP GUI" --output "D:/backup/SAP GUI"
+    parser = argparse.ArgumentParser(description="Convert Click_image folders between .txt templates and template packs.")
+    parser.add_argument("command", choices=["import", "export", "compact", "list"])
+    parser.add_argument("folders", nargs="+")
+    parser.add_argument("--remove-txt", action="store_true", help="import: delete the .txt files after packing them")
+    parser.add_argument("--output", default=None, help="export: write the .txt files here instead of the folder")
+    args = parser.parse_args(argv)
+    for folder in args.folders:
+        if args.command == "import":
+            print(f"{folder}: packed {import_folder(folder, args.remove_txt)} template(s) into {pack_path(folder)}")
+        elif args.command == "export":
+            print(f"{folder}: exported {export_folder(folder, args.output)} template(s)")
+        elif args.command == "compact":
+            pack = TemplatePack.for_folder(folder)
+            before = os.path.getsize(pack.path)
+            pack.compact()
+            print(f"{folder}: {before} -> {os.path.getsize(pack.path)} bytes")
+        else:
+            for name in TemplatePack.for_folder(folder).names():
+                print(name)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
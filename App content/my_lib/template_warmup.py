@@ -0,0 +1,86 @@
+# template_warmup.py
+import time
+from typing import Any, Dict, List, Optional
+
+from my_lib.template_cache import TemplateCache, template_cache
+
+
+# Parameters with 'image' in their name that name a file a step writes, not a Click_image template
+# (Bot_utility.screenshot saves to screenshot/<image_link>.png).
+OUTPUT_IMAGE_PARAMETERS = {"image_link"}
+
+
+def _step_row(step: Dict[str, Any], index: int) -> int:
+    """The 1-based row a step is shown at in the GUI."""
+    return int(step.get("original_listbox_row_index", index)) + 1
+
+
+def collect_template_references(steps: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """
+    Statically scans steps for the Click_image templates they use and returns
+    {image name: [step rows]}. Picked files ('hardcoded_file') count, as do
+    typed values of parameters with 'image' in their name; both may be
+    comma-separated lists as taken by image_action_advanced. Parameters bound
+    to a variable are only known at run time and are skipped.
+    """
+    references: Dict[str, List[int]] = {}
+    for index, step in enumerate(steps):
+        if step.get("type") != "step":
+            continue
+        row = _step_row(step, index)
+        for param_name, config in (step.get("parameters_config") or {}).items():
+            if not isinstance(config, dict) or param_name in OUTPUT_IMAGE_PARAMETERS:
+                continue
+            if config.get("type") == "hardcoded_file" or (config.get("type") == "hardcoded" and "image" in param_name):
+                value = config.get("value")
+                if not isinstance(value, str):
+                    continue
+                for image_name in (name.strip() for name in value.split(",")):
+                    if image_name:
+                        rows = references.setdefault(image_name, [])
+                        if row not in rows:
+                            rows.append(row)
+    return references
+
+
+def warmup_templates(steps: List[Dict[str, Any]], click_image_dir: str,
+                     cache: Optional[TemplateCache] = None) -> Dict[str, Any]:
+    """
+    Loads and decodes every template the steps reference into the template
+    cache, so the first click on each image does not pay the file read and
+    decode mid-run. Returns a report:
+    {'loaded': [names], 'variants': n, 'missing': {name: [rows]},
+     'unreadable': {name: {'rows': [rows], 'error': str}}, 'seconds': s}.
+    """
+    cache = cache or template_cache
+    started = time.perf_counter()
+    references = collect_template_references(steps)
+    # Keep the warmed templates from evicting each other.
+    cache.max_entries = max(cache.max_entries, len(references))
+    report: Dict[str, Any] = {"loaded": [], "variants": 0, "missing": {}, "unreadable": {}}
+    for image_name, rows in references.items():
+        try:
+            variants = cache.get_template(click_image_dir, image_name)
+        except FileNotFoundError:
+            report["missing"][image_name] = rows
+            continue
+        except Exception as e:
+            report["unreadable"][image_name] = {"rows": rows, "error": f"{type(e).__name__}: {e}"}
+            continue
+        if not variants:
+            report["unreadable"][image_name] = {"rows": rows, "error": "the file holds no image variants"}
+            continue
+        report["loaded"].append(image_name)
+        report["variants"] += len(variants)
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+def format_warmup_report(report: Dict[str, Any]) -> List[str]:
+    """Log lines for a warmup report: a summary, then one warning per missing or unreadable template."""
+    lines = [f"Template warmup: {len(report['loaded'])} image(s), {report['variants']} variant(s) cached in {report['seconds']:.2f}s."]
+    for image_name, rows in report["missing"].items():
+        lines.append(f"WARNING: Image '{image_name}' (step {', '.join(map(str, rows))}) was not found in Click_image.")
+    for image_name, problem in report["unreadable"].items():
+        lines.append(f"WARNING: Image '{image_name}' (step {', '.join(map(str, problem['rows']))}) could not be read: {problem['error']}")
+    return lines
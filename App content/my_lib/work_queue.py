@@ -0,0 +1,315 @@
+# work_queue.py
+import os
+import json
+import socket
+import sqlite3
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional
+
+
+PENDING, CLAIMED, DONE, FAILED = "pending", "claimed", "done", "failed"
+
+
+def default_worker_id() -> str:
+    """Identifies this bot process in lease_owner, e.g. 'SAP-PC-03:10244'."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _decode_payload(text: Optional[str]) -> Any:
+    if text is None:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+class WorkQueue(ABC):
+    """
+    A backlog of work items in a database table that several bots can drain
+    in parallel without processing an item twice.
+
+    claim() atomically moves up to N pending items to 'claimed' under this
+    worker's name with a lease; heartbeat() extends the lease of items still
+    being worked on; complete() and fail() close them. An item whose lease
+    expires (the bot crashed or the machine rebooted) becomes claimable
+    again. Every update checks lease_owner, so a worker that lost its lease
+    cannot complete an item someone else has reclaimed.
+
+    Subclasses provide the SQL for one database backend.
+    """
+    def __init__(self, queue_name: str = "default", table_name: str = "bot_work_queue", worker_id: Optional[str] = None):
+        if not table_name.replace("_", "").isalnum():
+            raise ValueError(f"Invalid table name '{table_name}'.")
+        self.queue_name = queue_name
+        self.table_name = table_name
+        self.worker_id = worker_id or default_worker_id()
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} '{self.queue_name}' in {self.table_name} as {self.worker_id}>"
+
+    # --- Backend interface ---
+    @abstractmethod
+    def ensure_table(self) -> None:
+        """Creates the queue table and its claim index if they do not exist."""
+
+    @abstractmethod
+    def _insert(self, rows: List[Dict[str, Any]]) -> int:
+        """Inserts rows with queue_name, payload and priority. Returns the number inserted."""
+
+    @abstractmethod
+    def _claim(self, batch_size: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        """Atomically claims up to batch_size claimable items; returns their id, payload and attempts."""
+
+    @abstractmethod
+    def _update_owned(self, item_ids: List[int], set_sql: str, params: Dict[str, Any]) -> int:
+        """Applies set_sql to the given items this worker holds a lease on. Returns the rows updated."""
+
+    @abstractmethod
+    def _counts(self) -> Dict[str, int]:
+        """Returns {status: item count} for this queue."""
+
+    @abstractmethod
+    def _lease_expiry_sql(self) -> str:
+        """SQL for 'now + :lease seconds' in the database's clock."""
+
+    @abstractmethod
+    def _now_sql(self) -> str:
+        """SQL for the current time in the database's clock."""
+
+    # --- Public API ---
+    def enqueue(self, payloads: Iterable[Any], priority: int = 0) -> int:
+        """Adds one work item per payload (any JSON-serializable value). Returns the number added."""
+        rows = [{"queue_name": self.queue_name, "payload": json.dumps(payload, default=str), "priority": int(priority)}
+                for payload in payloads]
+        return self._insert(rows) if rows else 0
+
+    def claim(self, batch_size: int = 1, lease_seconds: int = 300) -> List[Dict[str, Any]]:
+        """
+        Claims up to batch_size items in one round-trip, highest priority and oldest first,
+        including items whose lease has expired. Returns dicts with id, payload and attempts.
+        """
+        items = self._claim(max(1, int(batch_size)), max(1, int(lease_seconds)))
+        for item in items:
+            item["payload"] = _decode_payload(item.get("payload"))
+        return sorted(items, key=lambda item: item["id"])
+
+    def heartbeat(self, item_ids: List[int], lease_seconds: int = 300) -> int:
+        """Extends the lease of items this worker still owns. Returns how many were extended."""
+        return self._update_owned(item_ids, f"lease_expires = {self._lease_expiry_sql()}", {"lease": int(lease_seconds)})
+
+    def complete(self, item_ids: List[int], result: Any = None) -> int:
+        """Marks owned items as done, optionally storing a result. Returns how many were completed."""
+        return self._update_owned(item_ids, f"status = '{DONE}', lease_owner = NULL, lease_expires = NULL, result = :result",
+                                  {"result": None if result is None else json.dumps(result, default=str)})
+
+    def fail(self, item_ids: List[int], error_message: str = "", retry: bool = True, max_attempts: int = 3) -> int:
+        """
+        Releases owned items after an error. With retry, an item that has been attempted
+        fewer than max_attempts times goes back to pending; otherwise it is marked failed.
+        """
+        status_sql = f"CASE WHEN :retry = 1 AND attempts < :max_attempts THEN '{PENDING}' ELSE '{FAILED}' END"
+        return self._update_owned(item_ids, f"status = {status_sql}, lease_owner = NULL, lease_expires = NULL, last_error = :error",
+                                  {"retry": 1 if retry else 0, "max_attempts": int(max_attempts), "error": str(error_message)[:4000]})
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of items per status for this queue."""
+        counts = {PENDING: 0, CLAIMED: 0, DONE: 0, FAILED: 0}
+        counts.update(self._counts())
+        return counts
+
+
+class SqliteWorkQueue(WorkQueue):
+    """
+    WorkQueue on a local SQLite file, for testing bots without a server or for
+    several bot processes on one machine. Each call opens its own connection,
+    so the object can be shared between threads and pickled into checkpoints.
+    """
+    def __init__(self, db_path: str, queue_name: str = "default", table_name: str = "bot_work_queue", worker_id: Optional[str] = None):
+        super().__init__(queue_name, table_name, worker_id)
+        self.db_path = db_path
+        self.ensure_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode; writes that must be atomic open their own BEGIN IMMEDIATE.
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _now_sql(self) -> str:
+        return "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+    def _lease_expiry_sql(self) -> str:
+        return "strftime('%Y-%m-%d %H:%M:%f', 'now', '+' || :lease || ' seconds')"
+
+    def ensure_table(self) -> None:
+        folder = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(folder, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table_name} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    queue_name TEXT NOT NULL,
+                    payload TEXT,
+                    status TEXT NOT NULL DEFAULT '{PENDING}',
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_owner TEXT,
+                    lease_expires TEXT,
+                    result TEXT,
+                    last_error TEXT,
+                    created_at TEXT NOT NULL DEFAULT ({self._now_sql()}),
+                    updated_at TEXT
+                )""")
+            connection.execute(f"CREATE INDEX IF NOT EXISTS ix_{self.table_name}_claim ON {self.table_name} (queue_name, status, priority, id)")
+        finally:
+            connection.close()
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> int:
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(f"INSERT INTO {self.table_name} (queue_name, payload, priority) VALUES (:queue_name, :payload, :priority)", rows)
+            connection.execute("COMMIT")
+            return len(rows)
+        finally:
+            connection.close()
+
+    def _claim(self, batch_size: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        connection = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the database write lock up front, so the select and
+            # the update below are one atomic claim even across processes.
+            connection.execute("BEGIN IMMEDIATE")
+            ids = [row["id"] for row in connection.execute(f"""
+                SELECT id FROM {self.table_name}
+                WHERE queue_name = :queue AND (status = '{PENDING}' OR (status = '{CLAIMED}' AND lease_expires < {self._now_sql()}))
+                ORDER BY priority DESC, id
+                LIMIT :n""", {"queue": self.queue_name, "n": batch_size})]
+            if not ids:
+                connection.execute("COMMIT")
+                return []
+            placeholders = ",".join("?" * len(ids))
+            connection.execute(f"""
+                UPDATE {self.table_name}
+                SET status = '{CLAIMED}', lease_owner = ?, attempts = attempts + 1,
+                    lease_expires = strftime('%Y-%m-%d %H:%M:%f', 'now', '+' || ? || ' seconds'), updated_at = {self._now_sql()}
+                WHERE id IN ({placeholders})""", [self.worker_id, lease_seconds] + ids)
+            rows = connection.execute(f"SELECT id, payload, attempts FROM {self.table_name} WHERE id IN ({placeholders})", ids).fetchall()
+            connection.execute("COMMIT")
+            return [dict(row) for row in rows]
+        except Exception:
+            if connection.in_transaction: connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def _update_owned(self, item_ids: List[int], set_sql: str, params: Dict[str, Any]) -> int:
+        if not item_ids:
+            return 0
+        connection = self._connect()
+        try:
+            id_params = {f"id{i}": int(item_id) for i, item_id in enumerate(item_ids)}
+            cursor = connection.execute(f"""
+                UPDATE {self.table_name} SET {set_sql}, updated_at = {self._now_sql()}
+                WHERE id IN ({",".join(":" + name for name in id_params)}) AND status = '{CLAIMED}' AND lease_owner = :owner""",
+                dict(params, owner=self.worker_id, **id_params))
+            return cursor.rowcount
+        finally:
+            connection.close()
+
+    def _counts(self) -> Dict[str, int]:
+        connection = self._connect()
+        try:
+            rows = connection.execute(f"SELECT status, COUNT(*) AS n FROM {self.table_name} WHERE queue_name = ? GROUP BY status", (self.queue_name,))
+            return {row["status"]: row["n"] for row in rows}
+        finally:
+            connection.close()
+
+
+class MssqlWorkQueue(WorkQueue):
+    """
+    WorkQueue on SQL Server through a SQLAlchemy engine (as created by the
+    MS SQL Database step). A claim is a single UPDATE ... OUTPUT statement over
+    a TOP(N) CTE read with READPAST, so concurrent bots skip each other's locked
+    rows instead of blocking, and the lease clock is the server's, not the bot
+    machine's.
+    """
+    def __init__(self, engine: Any, queue_name: str = "default", table_name: str = "bot_work_queue", worker_id: Optional[str] = None):
+        super().__init__(queue_name, table_name, worker_id)
+        if not hasattr(engine, "connect"):
+            raise TypeError("MssqlWorkQueue needs a SQLAlchemy engine.")
+        self.engine = engine
+        self.ensure_table()
+
+    def _execute(self, sql: str, params: Optional[Dict[str, Any]] = None, fetch: bool = False):
+        from sqlalchemy import text
+        with self.engine.connect() as connection:
+            with connection.begin():
+                result = connection.execute(text(sql), params or {})
+                return [dict(row._mapping) for row in result] if fetch else result.rowcount
+
+    def _now_sql(self) -> str:
+        return "SYSUTCDATETIME()"
+
+    def _lease_expiry_sql(self) -> str:
+        return "DATEADD(second, :lease, SYSUTCDATETIME())"
+
+    def ensure_table(self) -> None:
+        self._execute(f"""
+            IF OBJECT_ID(N'{self.table_name}', N'U') IS NULL
+            BEGIN
+                CREATE TABLE {self.table_name} (
+                    id BIGINT IDENTITY(1,1) PRIMARY KEY,
+                    queue_name NVARCHAR(100) NOT NULL,
+                    payload NVARCHAR(MAX) NULL,
+                    status VARCHAR(20) NOT NULL DEFAULT '{PENDING}',
+                    priority INT NOT NULL DEFAULT 0,
+                    attempts INT NOT NULL DEFAULT 0,
+                    lease_owner NVARCHAR(200) NULL,
+                    lease_expires DATETIME2 NULL,
+                    result NVARCHAR(MAX) NULL,
+                    last_error NVARCHAR(4000) NULL,
+                    created_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+                    updated_at DATETIME2 NULL
+                );
+                CREATE INDEX ix_{self.table_name}_claim ON {self.table_name} (queue_name, status, priority DESC, id);
+            END""")
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> int:
+        from sqlalchemy import text
+        with self.engine.connect() as connection:
+            with connection.begin():
+                connection.execute(text(f"INSERT INTO {self.table_name} (queue_name, payload, priority) VALUES (:queue_name, :payload, :priority)"), rows)
+        return len(rows)
+
+    def _claim(self, batch_size: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        return self._execute(f"""
+            WITH next_items AS (
+                SELECT TOP (:n) *
+                FROM {self.table_name} WITH (ROWLOCK, UPDLOCK, READPAST)
+                WHERE queue_name = :queue
+                  AND (status = '{PENDING}' OR (status = '{CLAIMED}' AND lease_expires < SYSUTCDATETIME()))
+                ORDER BY priority DESC, id
+            )
+            UPDATE next_items
+            SET status = '{CLAIMED}', lease_owner = :owner, attempts = attempts + 1,
+                lease_expires = {self._lease_expiry_sql()}, updated_at = SYSUTCDATETIME()
+            OUTPUT inserted.id, inserted.payload, inserted.attempts;""",
+            {"n": batch_size, "queue": self.queue_name, "owner": self.worker_id, "lease": lease_seconds}, fetch=True)
+
+    def _update_owned(self, item_ids: List[int], set_sql: str, params: Dict[str, Any]) -> int:
+        if not item_ids:
+            return 0
+        id_params = {f"id{i}": int(item_id) for i, item_id in enumerate(item_ids)}
+        return self._execute(f"""
+            UPDATE {self.table_name} SET {set_sql}, updated_at = SYSUTCDATETIME()
+            WHERE id IN ({",".join(":" + name for name in id_params)}) AND status = '{CLAIMED}' AND lease_owner = :owner""",
+            dict(params, owner=self.worker_id, **id_params))
+
+    def _counts(self) -> Dict[str, int]:
+        rows = self._execute(f"SELECT status, COUNT(*) AS n FROM {self.table_name} WHERE queue_name = :queue GROUP BY status",
+                             {"queue": self.queue_name}, fetch=True)
+        return {row["status"]: row["n"] for row in rows}
@@ -0,0 +1,6 @@
+# conftest.py
+import os
+import sys
+
+# Tests import the app's packages (my_lib, ...) the way the app does, from App content/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
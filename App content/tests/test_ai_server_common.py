@@ -0,0 +1,272 @@
+# test_ai_server_common.py
+import asyncio
+import json
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from ai_server_common import LocalExecutor, ModelGate, ResponseCache, merge_invoice_pages, parse_page_ranges
+
+
+class Headers:
+    """The part of a Starlette request ResponseCache.policy() reads."""
+    def __init__(self, **headers):
+        self.headers = {name.replace("_", "-"): value for name, value in headers.items()}
+
+
+# --- ModelGate ---
+def test_model_gate_hands_slots_over_by_priority_then_arrival():
+    async def scenario():
+        gate = ModelGate("m", limit=1, max_queue=8)
+        await gate.acquire(1, timeout=1)
+        order = []
+
+        async def waiter(name, priority):
+            await gate.acquire(priority, timeout=5)
+            order.append(name)
+            gate.release()
+
+        tasks = [asyncio.create_task(waiter(name, priority))
+                 for name, priority in [("batch", 2), ("normal-1", 1), ("interactive", 0), ("normal-2", 1)]]
+        await asyncio.sleep(0)
+        assert gate.queued() == 4
+        gate.release()
+        await asyncio.gather(*tasks)
+        return order, gate.active
+
+    order, active = asyncio.run(scenario())
+    assert order == ["interactive", "normal-1", "normal-2", "batch"]
+    assert active == 0
+
+
+def test_model_gate_rejects_when_the_queue_is_full():
+    async def scenario():
+        gate = ModelGate("m", limit=1, max_queue=1)
+        await gate.acquire(1, timeout=1)
+        waiting = asyncio.create_task(gate.acquire(1, timeout=5))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as error:
+            await gate.acquire(1, timeout=5)
+        waiting.cancel()
+        return error.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 429 and int(error.headers["Retry-After"]) >= 1
+
+
+def test_model_gate_times_out_waiters():
+    async def scenario():
+        gate = ModelGate("m", limit=1, max_queue=4)
+        await gate.acquire(1, timeout=1)
+        with pytest.raises(HTTPException) as error:
+            await gate.acquire(1, timeout=0.05)
+        return error.value, gate.queued(), gate.active
+
+    error, queued, active = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert (queued, active) == (0, 1)
+
+
+def test_model_gate_passes_on_a_slot_granted_to_a_cancelled_waiter():
+    async def scenario():
+        gate = ModelGate("m", limit=1, max_queue=4)
+        await gate.acquire(1, timeout=1)
+        first = asyncio.create_task(gate.acquire(1, timeout=5))
+        second = asyncio.create_task(gate.acquire(1, timeout=5))
+        await asyncio.sleep(0)
+        gate.release()   # grants the slot to 'first' ...
+        first.cancel()   # ... which goes away before it runs
+        outcome, = await asyncio.gather(first, return_exceptions=True)
+        if not isinstance(outcome, BaseException):
+            # Before Python 3.12, wait_for() returns a result that arrived with the cancel,
+            # so the caller got the slot after all and releases it as usual.
+            gate.release()
+        await asyncio.wait_for(second, 1)
+        gate.release()
+        return gate.active, gate.queued()
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+# --- ResponseCache ---
+PAYLOAD = {"model": "qwen2.5vl:7b", "prompt": "find the OK button", "images": ["aGVsbG8="], "stream": False}
+
+
+def _validate_json(reply):
+    json.loads(reply["response"])
+
+
+class FakeOllama:
+    def __init__(self, *replies, delay=0.0):
+        self.replies = list(replies)
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.replies[min(self.calls, len(self.replies)) - 1]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "cache"), ttl=3600, max_bytes=1024 * 1024)
+
+
+def test_cache_key_ignores_stream_but_not_content():
+    assert ResponseCache.key_for(PAYLOAD) == ResponseCache.key_for(dict(PAYLOAD, stream=True))
+    assert ResponseCache.key_for(PAYLOAD) != ResponseCache.key_for(dict(PAYLOAD, prompt="find Cancel"))
+
+
+def test_cache_answers_a_repeat_from_disk(cache, tmp_path):
+    ollama = FakeOllama({"response": '{"x": 1}'})
+    first = asyncio.run(cache.get_or_call(PAYLOAD, "/detect", ollama, validate=_validate_json))
+    second = asyncio.run(cache.get_or_call(PAYLOAD, "/detect", ollama, validate=_validate_json))
+    assert first == second == {"response": '{"x": 1}'}
+    assert ollama.calls == 1
+    assert cache.counters["hits"] == 1 and cache.counters["stored"] == 1
+    # A new instance picks the entry up from disk.
+    reopened = ResponseCache(cache.directory, ttl=3600, max_bytes=1024 * 1024)
+    assert asyncio.run(reopened.get_or_call(PAYLOAD, "/detect", ollama)) == first
+    assert ollama.calls == 1
+
+
+def test_cache_does_not_store_unusable_replies(cache):
+    ollama = FakeOllama({"response": "sorry, no JSON"}, {"response": '{"x": 1}'})
+    asyncio.run(cache.get_or_call(PAYLOAD, "/detect", ollama, validate=_validate_json))
+    assert cache.counters["unusable"] == 1 and cache.counters["stored"] == 0
+    assert asyncio.run(cache.get_or_call(PAYLOAD, "/detect", ollama, validate=_validate_json)) == {"response": '{"x": 1}'}
+    assert ollama.calls == 2
+    assert asyncio.run(cache.get_or_call(PAYLOAD, "/detect", FakeOllama({"response": "  "}))) == {"response": '{"x": 1}'}
+
+
+def test_cache_coalesces_identical_calls_in_flight(cache):
+    async def scenario():
+        ollama = FakeOllama({"response": '{"x": 1}'}, delay=0.05)
+        replies = await asyncio.gather(*(cache.get_or_call(PAYLOAD, "/detect", ollama) for _ in range(3)))
+        return replies, ollama.calls
+
+    replies, calls = asyncio.run(scenario())
+    assert calls == 1 and all(reply == {"response": '{"x": 1}'} for reply in replies)
+    assert cache.counters["coalesced"] == 2
+
+
+def test_cache_waiters_call_again_after_an_unusable_reply(cache):
+    async def scenario():
+        ollama = FakeOllama({"response": "garbage"}, {"response": '{"x": 1}'}, delay=0.05)
+        replies = await asyncio.gather(*(cache.get_or_call(PAYLOAD, "/detect", ollama, validate=_validate_json) for _ in range(2)))
+        return replies, ollama.calls
+
+    replies, calls = asyncio.run(scenario())
+    assert calls == 2
+    assert replies == [{"response": "garbage"}, {"response": '{"x": 1}'}]
+
+
+def test_cache_headers_control_reading_and_writing(cache):
+    ollama = FakeOllama({"response": "a"}, {"response": "b"}, {"response": "c"})
+    asyncio.run(cache.get_or_call(PAYLOAD, "/ocr", ollama, Headers(cache_control="no-store")))
+    assert cache.counters["stored"] == 0
+    asyncio.run(cache.get_or_call(PAYLOAD, "/ocr", ollama, Headers(cache_control="no-cache")))
+    assert cache.counters["stored"] == 1
+    # no-cache skipped the lookup but stored 'b', which a normal request now gets.
+    assert asyncio.run(cache.get_or_call(PAYLOAD, "/ocr", ollama, Headers())) == {"response": "b"}
+    assert asyncio.run(cache.get_or_call(PAYLOAD, "/ocr", ollama, Headers(x_no_cache="1"))) == {"response": "c"}
+    assert cache.counters["bypassed"] == 3
+
+
+def test_cache_expires_entries_past_the_ttl(cache):
+    ollama = FakeOllama({"response": "old"}, {"response": "new"})
+    asyncio.run(cache.get_or_call(PAYLOAD, "/ocr", ollama))
+    path = os.path.join(cache.directory, ResponseCache.key_for(PAYLOAD) + ".json")
+    with open(path) as f:
+        entry = json.load(f)
+    entry["created"] -= 7200
+    with open(path, "w") as f:
+        json.dump(entry, f)
+    assert asyncio.run(cache.get_or_call(PAYLOAD, "/ocr", ollama)) == {"response": "new"}
+    assert cache.counters["expired"] == 1
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache"), ttl=3600, max_bytes=250)
+    payloads = [dict(PAYLOAD, prompt=f"prompt {i}") for i in range(3)]
+    for payload in payloads[:2]:
+        asyncio.run(cache.get_or_call(payload, "/ocr", FakeOllama({"response": "x" * 60})))
+    # Touch the first entry so the second one is the least recently used.
+    asyncio.run(cache.get_or_call(payloads[0], "/ocr", FakeOllama({"response": "unused"})))
+    asyncio.run(cache.get_or_call(payloads[2], "/ocr", FakeOllama({"response": "x" * 60})))
+    remaining = {name[:-5] for name in os.listdir(cache.directory)}
+    assert remaining == {ResponseCache.key_for(payloads[0]), ResponseCache.key_for(payloads[2])}
+    assert cache.counters["evicted"] == 1
+
+
+def test_disabled_cache_always_calls_and_stores_nothing(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache"), ttl=3600, max_bytes=1024, enabled=False)
+    ollama = FakeOllama({"response": "a"})
+    asyncio.run(cache.get_or_call(PAYLOAD, "/ocr", ollama))
+    asyncio.run(cache.get_or_call(PAYLOAD, "/ocr", ollama))
+    assert ollama.calls == 2
+    assert not os.path.exists(cache.directory)
+
+
+# --- parse_page_ranges ---
+@pytest.mark.parametrize("spec, expected", [
+    (None, [0, 1, 2, 3, 4, 5]),
+    ("  ", [0, 1, 2, 3, 4, 5]),
+    ("1-3,5", [0, 1, 2, 4]),
+    ("5,1-2,2", [0, 1, 4]),
+    ("4-", [3, 4, 5]),
+    ("-2", [0, 1]),
+    (" 2 - 3 ,", [1, 2]),
+])
+def test_parse_page_ranges(spec, expected):
+    assert parse_page_ranges(spec, 6) == expected
+
+
+@pytest.mark.parametrize("spec", ["0", "7", "3-2", "a", "1-x", "-", ",", "2-9"])
+def test_parse_page_ranges_rejects_bad_specs(spec):
+    with pytest.raises(HTTPException) as error:
+        parse_page_ranges(spec, 6)
+    assert error.value.status_code == 400
+
+
+# --- merge_invoice_pages ---
+def test_merge_invoice_pages_concatenates_items_and_keeps_the_last_total():
+    pages = [
+        {"invoice_number": "INV-1", "vendor": "", "line_items": [{"sku": "A"}], "subtotal": 10.0, "total_invoice_amount": 10.0},
+        {"invoice_number": "INV-1-cont", "vendor": "ACME", "line_items": [{"sku": "B"}], "total_invoice_amount": 25.0},
+        "not a dict",
+        {"line_items": [], "total_invoice_amount": 0.0},
+    ]
+    assert merge_invoice_pages(pages) == {
+        "invoice_number": "INV-1",
+        "vendor": "ACME",
+        "line_items": [{"sku": "A"}, {"sku": "B"}],
+        "subtotal": 10.0,
+        "total_invoice_amount": 25.0,
+    }
+
+
+def test_merge_invoice_pages_keeps_empty_fields_of_the_first_page():
+    assert merge_invoice_pages([{"po_number": None}, {}]) == {"po_number": None}
+    assert merge_invoice_pages([]) == {}
+
+
+# --- LocalExecutor ---
+def test_local_executor_rejects_past_its_queue_limit():
+    async def scenario():
+        executor = LocalExecutor("test", workers=1, max_queue=1, max_queued_mb=1)
+        running = asyncio.create_task(executor.run(time.sleep, 0.2))
+        while not executor.running:
+            await asyncio.sleep(0.01)
+        # The worker is busy: one job may wait, the next is turned away.
+        jobs = [running] + [asyncio.create_task(executor.run(time.sleep, 0.01)) for _ in range(2)]
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        return results, executor.stats()
+
+    results, stats = asyncio.run(scenario())
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1 and rejected[0].status_code == 429
+    assert stats["completed"] == 2 and stats["rejected"] == 1 and stats["queued"] == 0
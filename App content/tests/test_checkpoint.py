@@ -0,0 +1,106 @@
+# test_checkpoint.py
+import os
+import threading
+
+import pytest
+
+import my_lib.checkpoint as checkpoint
+from my_lib.checkpoint import CheckpointStore, steps_fingerprint
+
+
+class Rows:
+    """A picklable stand-in for a DataFrame: JSON cannot hold it, so it goes to a sidecar."""
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __eq__(self, other):
+        return isinstance(other, Rows) and other.rows == self.rows
+
+
+STATE = {"step_index": 4, "loop_stack": [{"loop_id": "L1", "current_iteration": 2}]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(str(tmp_path), "Invoice bot: daily")
+
+
+def _sidecars(store):
+    return sorted(name for name in os.listdir(store.path) if name.endswith(".pkl"))
+
+
+def test_round_trip_splits_json_and_sidecar_variables(store):
+    variables = {"count": 3, "names": ["a", "b"], "table": Rows([1, 2]), "pair": (1, 2)}
+    assert store.save(STATE, variables) == []
+    state, loaded = store.load()
+    assert state["step_index"] == 4 and state["loop_stack"] == STATE["loop_stack"]
+    assert loaded == variables
+    assert isinstance(loaded["pair"], tuple)
+    assert set(state["variables"]) == {"count", "names"}
+    assert set(state["sidecars"]) == {"table", "pair"}
+
+
+def test_bot_name_is_made_safe_for_the_file_system(store, tmp_path):
+    assert store.path == os.path.join(str(tmp_path), "Invoice bot_ daily.checkpoint")
+
+
+def test_each_save_bumps_the_generation_and_drops_old_sidecars(store):
+    store.save(STATE, {"table": Rows([1])})
+    assert store.describe()["generation"] == 1
+    assert _sidecars(store) == ["var0.g1.pkl"]
+    store.save(STATE, {"table": Rows([1, 2])})
+    assert store.describe()["generation"] == 2
+    assert _sidecars(store) == ["var0.g2.pkl"]
+    assert store.load()[1]["table"] == Rows([1, 2])
+
+
+def test_unpicklable_variables_are_reported_and_skipped(store):
+    skipped = store.save(STATE, {"lock": threading.Lock(), "count": 1})
+    assert skipped == ["lock"]
+    state, variables = store.load()
+    assert variables == {"count": 1}
+    assert state["skipped_variables"] == ["lock"]
+
+
+def test_interrupted_save_keeps_the_previous_checkpoint(store, monkeypatch):
+    store.save(dict(STATE, step_index=1), {"table": Rows([1])})
+
+    def crash(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(checkpoint.os, "replace", crash)
+    with pytest.raises(OSError):
+        store.save(dict(STATE, step_index=2), {"table": Rows([1, 2])})
+    monkeypatch.undo()
+
+    state, variables = store.load()
+    assert state["step_index"] == 1 and state["generation"] == 1
+    assert variables["table"] == Rows([1])
+    # The next successful save clears the orphaned sidecar of the failed generation.
+    store.save(dict(STATE, step_index=3), {"table": Rows([3])})
+    assert store.describe()["generation"] == 2
+    assert _sidecars(store) == ["var0.g2.pkl"]
+
+
+def test_missing_or_foreign_checkpoint_loads_as_none(store):
+    assert not store.exists() and store.load() is None
+    os.makedirs(store.path)
+    with open(store.state_file, "w") as f:
+        f.write('{"version": 999}')
+    assert store.describe() is None and store.load() is None
+
+
+def test_clear_removes_the_checkpoint_folder(store):
+    store.save(STATE, {"table": Rows([1])})
+    store.clear()
+    assert not os.path.exists(store.path)
+    store.clear()
+
+
+def test_fingerprint_ignores_runtime_keys_but_not_structure():
+    steps = [{"type": "loop_start", "loop_id": "L1"},
+             {"type": "step", "module_name": "Excel", "class_name": "Excel", "method_name": "read"},
+             {"type": "loop_end", "loop_id": "L1"}]
+    decorated = [dict(step, execution_status="done", original_listbox_row_index=i) for i, step in enumerate(steps)]
+    assert steps_fingerprint(decorated) == steps_fingerprint(steps)
+    changed = [steps[0], dict(steps[1], method_name="write"), steps[2]]
+    assert steps_fingerprint(changed) != steps_fingerprint(steps)
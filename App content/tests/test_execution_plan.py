@@ -0,0 +1,92 @@
+# test_execution_plan.py
+from my_lib.execution_plan import ExecutionPlan
+
+
+def _step(step_type, **ids):
+    return dict({"type": step_type}, **ids)
+
+
+# 0 loop_start L1
+# 1   IF_START I1
+# 2     step
+# 3   ELSE I1
+# 4     group_start G1
+# 5       step
+# 6     group_end G1
+# 7   IF_END I1
+# 8 loop_end L1
+# 9 step
+STEPS = [
+    _step("loop_start", loop_id="L1"),
+    _step("IF_START", if_id="I1"),
+    _step("step"),
+    _step("ELSE", if_id="I1"),
+    _step("group_start", group_id="G1"),
+    _step("step"),
+    _step("group_end", group_id="G1"),
+    _step("IF_END", if_id="I1"),
+    _step("loop_end", loop_id="L1"),
+    _step("step"),
+]
+
+
+def test_pairs_block_markers():
+    plan = ExecutionPlan(STEPS)
+    assert plan.block_end == {0: 8, 1: 7, 4: 6}
+    assert plan.block_start == {8: 0, 7: 1, 6: 4}
+    assert plan.loop_end_for(0) == 8
+    assert plan.loop_end_for(5) == -1
+
+
+def test_if_branch_targets():
+    plan = ExecutionPlan(STEPS)
+    assert plan.false_branch_target(1) == 3
+    assert plan.if_end_for_else(3) == 7
+    assert plan.if_end_for_else(2) == -1
+    no_else = ExecutionPlan([_step("IF_START", if_id="A"), _step("step"), _step("IF_END", if_id="A")])
+    assert no_else.false_branch_target(0) == 2
+
+
+def test_parent_index_puts_end_markers_at_their_start_level():
+    plan = ExecutionPlan(STEPS)
+    assert plan.parent_index == [-1, 0, 1, 1, 1, 4, 1, 0, -1, -1]
+
+
+def test_same_id_nested_blocks_pair_innermost_first():
+    steps = [_step("loop_start", loop_id="L"), _step("loop_start", loop_id="L"),
+             _step("loop_end", loop_id="L"), _step("loop_end", loop_id="L")]
+    assert ExecutionPlan(steps).block_end == {0: 3, 1: 2}
+
+
+def test_unclosed_inner_block_is_dropped_by_the_outer_end():
+    steps = [_step("loop_start", loop_id="L1"), _step("IF_START", if_id="I1"), _step("step"),
+             _step("loop_end", loop_id="L1"), _step("IF_END", if_id="I1")]
+    plan = ExecutionPlan(steps)
+    assert plan.block_end == {0: 3}
+    assert plan.false_branch_target(1) == -1
+
+
+def test_block_contains_includes_markers():
+    plan = ExecutionPlan(STEPS)
+    assert plan.block_contains(4, 4) and plan.block_contains(4, 6)
+    assert not plan.block_contains(4, 7)
+    assert not plan.block_contains(2, 2)
+
+
+def test_trim_stack_for_jump_pops_frames_not_containing_the_target():
+    plan = ExecutionPlan(STEPS)
+    stack = [{"start_index": 0}, {"start_index": 1}, {"start_index": 4}]
+    removed = plan.trim_stack_for_jump(stack, 2)
+    assert removed == [{"start_index": 4}]
+    assert stack == [{"start_index": 0}, {"start_index": 1}]
+
+    removed = plan.trim_stack_for_jump(stack, 9)
+    assert removed == [{"start_index": 1}, {"start_index": 0}]
+    assert stack == []
+
+
+def test_trim_stack_for_jump_keeps_frames_without_a_start_index():
+    plan = ExecutionPlan(STEPS)
+    stack = [{"start_index": 0}, {"loop_id": "legacy"}, {"start_index": 4}]
+    assert plan.trim_stack_for_jump(stack, 9) == [{"start_index": 4}]
+    assert stack == [{"start_index": 0}, {"loop_id": "legacy"}]
@@ -0,0 +1,81 @@
+# test_image_matcher.py
+import numpy as np
+import pytest
+
+from my_lib.image_matcher import ImageMatcher, StoredFrameSource, BACKEND_FULL, BACKEND_PYRAMID
+
+
+def _screen(seed=1, width=800, height=600):
+    return np.random.default_rng(seed).integers(0, 256, size=(height, width), dtype=np.uint8)
+
+
+def _noisy(patch, seed=2, amount=40):
+    noise = np.random.default_rng(seed).integers(-amount, amount, size=patch.shape)
+    return np.clip(patch.astype(int) + noise, 0, 255).astype(np.uint8)
+
+
+def test_locate_returns_centre_in_screen_pixels():
+    screen = _screen()
+    template = screen[100:140, 200:260].copy()
+    matcher = ImageMatcher(StoredFrameSource([screen]), max_workers=1)
+    match = matcher.locate([("Folder/button", [("0", template)])], confidence=0.9)
+    assert (match["image"], match["variant"]) == ("Folder/button", "0")
+    assert (match["left"], match["top"], match["width"], match["height"]) == (200, 100, 60, 40)
+    assert (match["x"], match["y"]) == (230, 120)
+
+
+def test_locate_in_region_offsets_by_region_origin():
+    screen = _screen()
+    template = screen[300:330, 400:450].copy()
+    matcher = ImageMatcher(StoredFrameSource([screen]), max_workers=1)
+    match = matcher.locate([("img", [("0", template)])], confidence=0.9, region=(350, 250, 200, 150))
+    assert (match["left"], match["top"]) == (400, 300)
+
+
+def test_no_match_below_confidence():
+    screen = _screen()
+    other = _screen(seed=9)[0:40, 0:40].copy()
+    matcher = ImageMatcher(StoredFrameSource([screen]), max_workers=1)
+    assert matcher.locate([("img", [("0", other)])], confidence=0.9) is None
+
+
+@pytest.mark.parametrize("backend", [BACKEND_FULL, BACKEND_PYRAMID])
+def test_best_score_wins_regardless_of_worker_count(backend):
+    screen = _screen()
+    exact = screen[400:460, 500:580].copy()
+    weaker = _noisy(screen[50:110, 50:130])
+    unrelated = _screen(seed=5)[0:60, 0:80].copy()
+    # The weaker match comes first, in what would be the first batch of a 2-worker pool.
+    templates = [("weak", [("0", weaker), ("1", unrelated)]), ("strong", [("0", exact)])]
+    results = []
+    for workers in (1, 2, 4):
+        matcher = ImageMatcher(StoredFrameSource([screen]), max_workers=workers)
+        match = matcher.locate(templates, confidence=0.5, backend=backend)
+        results.append((match["image"], match["left"], match["top"]))
+    assert results == [("strong", 500, 400)] * 3
+
+
+def test_tie_goes_to_earlier_variant():
+    screen = _screen()
+    template = screen[10:50, 10:50].copy()
+    matcher = ImageMatcher(StoredFrameSource([screen]), max_workers=4)
+    match = matcher.locate([("a", [("0", template)]), ("b", [("0", template.copy())])], confidence=0.9)
+    assert match["image"] == "a"
+
+
+def test_stored_frame_source_replays_frames_in_order():
+    first, second = _screen(seed=1, width=64, height=48), _screen(seed=2, width=64, height=48)
+    source = StoredFrameSource([first, second])
+    assert source() is not None and np.array_equal(source(), second)
+    # The last frame repeats once the list is used up.
+    assert np.array_equal(source(), second)
+    assert source.captures == 3
+    assert source.screen_info() == (64, 48, 0)
+    assert source((8, 4, 10, 6)).shape == (6, 10)
+
+
+def test_stored_frame_source_converts_rgb_to_gray():
+    rgb = np.zeros((20, 30, 3), dtype=np.uint8)
+    rgb[..., 1] = 200
+    frame = StoredFrameSource([rgb])()
+    assert frame.shape == (20, 30) and frame.dtype == np.uint8
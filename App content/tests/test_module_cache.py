@@ -0,0 +1,74 @@
+# test_module_cache.py
+import importlib
+import os
+import sys
+
+import pytest
+
+from my_lib.module_cache import ModuleResolutionCache
+
+
+@pytest.fixture
+def bot_module(tmp_path, monkeypatch):
+    """Writes tmp_path/<name>.py and makes it importable; yields a writer for new source."""
+    name = f"cache_probe_{os.getpid()}_{id(tmp_path)}"
+    path = tmp_path / f"{name}.py"
+    monkeypatch.syspath_prepend(str(tmp_path))
+    mtime = [1_000_000]
+
+    def write(value):
+        path.write_text(f"VALUE = {value!r}\n\nclass Probe:\n    def __init__(self, context=None): pass\n    def run(self): return VALUE\n")
+        # Bump the mtime explicitly; two writes within the filesystem's resolution would look unchanged.
+        mtime[0] += 10
+        os.utime(path, (mtime[0], mtime[0]))
+        importlib.invalidate_caches()
+
+    yield name, write
+    sys.modules.pop(name, None)
+
+
+def test_repeat_lookups_hit_the_cache(bot_module):
+    name, write = bot_module
+    write(1)
+    cache = ModuleResolutionCache()
+    first = cache.get_module(name)
+    assert cache.get_module(name) is first
+    assert cache.stats() == {"hits": 1, "misses": 1, "reloads": 0}
+
+
+def test_modified_file_is_reloaded(bot_module):
+    name, write = bot_module
+    write(1)
+    cache = ModuleResolutionCache()
+    assert cache.get_module(name).VALUE == 1
+    write(2)
+    assert cache.get_module(name).VALUE == 2
+    assert cache.reloads == 1
+
+
+def test_first_lookup_reloads_a_module_imported_earlier(bot_module):
+    name, write = bot_module
+    write(1)
+    importlib.import_module(name)
+    write(2)
+    cache = ModuleResolutionCache()
+    assert cache.get_module(name).VALUE == 2
+
+
+def test_invalidate_forces_a_reload(bot_module):
+    name, write = bot_module
+    write(1)
+    cache = ModuleResolutionCache()
+    cache.get_module(name)
+    cache.invalidate(name)
+    cache.get_module(name)
+    assert cache.reloads == 1
+
+
+def test_accepts_context_is_cached_per_class(bot_module):
+    name, write = bot_module
+    write(1)
+    cache = ModuleResolutionCache()
+    probe = cache.get_class(name, "Probe")
+    assert cache.accepts_context(probe) is True
+    assert cache.accepts_context(probe, "run") is False
@@ -0,0 +1,154 @@
+# test_schedule_queue.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from my_lib.schedule_queue import (MAX_CATCH_UP_RUNS, MISSED_CATCH_UP, MISSED_RUN_ONCE, MISSED_SKIP,
+                                   ScheduleQueue, _align, next_occurrence, parse_schedule_time)
+
+# 2024-01-01 is a Monday.
+MONDAY = datetime(2024, 1, 1, 9, 0, 0)
+
+
+def _schedule(repeat="Hourly", start=MONDAY, **extra):
+    return dict({"enabled": True, "repeat": repeat, "start_datetime": start.isoformat()}, **extra)
+
+
+def test_parse_schedule_time_accepts_qt_iso_strings():
+    assert parse_schedule_time("2024-01-01T09:00:00Z") == MONDAY
+    assert parse_schedule_time("2024-01-01T09:00:00.000") == MONDAY
+    assert parse_schedule_time("not a date") is None
+    assert parse_schedule_time(None) is None
+
+
+def test_align_moves_to_the_boundary_start_and_to_selected_days():
+    schedule = _schedule(time_boundary_enabled=True, start_time="08:00:00", end_time="17:00:00",
+                         selected_days=["Mon", "Wed"])
+    assert _align(schedule, MONDAY.replace(hour=6)) == MONDAY.replace(hour=8)
+    assert _align(schedule, MONDAY.replace(hour=12)) == MONDAY.replace(hour=12)
+    # After Monday's boundary closes, the next allowed time is Wednesday's boundary start.
+    assert _align(schedule, MONDAY.replace(hour=18)) == datetime(2024, 1, 3, 8, 0, 0)
+
+
+def test_align_gives_up_on_an_impossible_boundary():
+    schedule = _schedule(time_boundary_enabled=True, start_time="18:00:00", end_time="08:00:00")
+    assert _align(schedule, MONDAY) is None
+
+
+def test_next_occurrence_skips_days_that_are_not_selected():
+    schedule = _schedule("Daily", selected_days=["Mon", "Fri"])
+    assert next_occurrence(schedule, MONDAY) == datetime(2024, 1, 5, 9, 0, 0)
+    assert next_occurrence(_schedule("Do not repeat"), MONDAY) is None
+
+
+@pytest.mark.parametrize("start, expected", [
+    (datetime(2024, 1, 31, 9), datetime(2024, 2, 29, 9)),  # clamped to the end of a leap-year February
+    (datetime(2024, 12, 15, 9), datetime(2025, 1, 15, 9)),  # rolls over into the next year
+])
+def test_monthly_rollover(start, expected):
+    assert next_occurrence(_schedule("Monthly", start), start) == expected
+
+
+def test_monthly_ignores_day_rules():
+    schedule = _schedule("Monthly", selected_days=["Tue"], time_boundary_enabled=True, start_time="12:00:00")
+    assert next_occurrence(schedule, MONDAY) == datetime(2024, 2, 1, 9, 0, 0)
+
+
+def test_plan_on_time_and_within_grace():
+    queue, schedule = ScheduleQueue(), _schedule()
+    assert queue._plan(schedule, MONDAY, MONDAY - timedelta(hours=1)) == ((MONDAY, MONDAY, MONDAY), None)
+    assert queue._plan(schedule, MONDAY, MONDAY + timedelta(seconds=30)) == ((MONDAY, MONDAY, MONDAY), None)
+    assert queue._plan(schedule, None, MONDAY) == (None, None)
+
+
+def test_plan_skip_waits_for_the_next_regular_fire_time():
+    now = MONDAY + timedelta(hours=3, minutes=20)
+    plan, message = ScheduleQueue()._plan(_schedule(), MONDAY, now, MISSED_SKIP)
+    assert plan == (MONDAY + timedelta(hours=4),) * 3
+    assert "skipped" in message
+
+
+def test_plan_run_once_fires_now_and_keeps_the_cadence():
+    now = MONDAY + timedelta(hours=3, minutes=20)
+    plan, message = ScheduleQueue()._plan(_schedule(), MONDAY, now, MISSED_RUN_ONCE)
+    last_missed = MONDAY + timedelta(hours=3)
+    assert plan == (now, last_missed, last_missed)
+    assert "running once now" in message
+
+
+def test_plan_catch_up_starts_at_the_oldest_missed_run():
+    now = MONDAY + timedelta(hours=3, minutes=20)
+    plan, message = ScheduleQueue()._plan(_schedule(), MONDAY, now, MISSED_CATCH_UP)
+    assert plan == (MONDAY,) * 3
+    assert "catching up 4 run(s)" in message
+
+
+def test_plan_catch_up_is_capped():
+    now = MONDAY + timedelta(days=5)
+    plan, message = ScheduleQueue()._plan(_schedule(), MONDAY, now, MISSED_CATCH_UP)
+    assert plan[0] == now - timedelta(hours=MAX_CATCH_UP_RUNS)
+    assert f"catching up {MAX_CATCH_UP_RUNS} run(s)" in message
+
+
+def test_plan_uses_the_schedules_policy_by_default():
+    now = MONDAY + timedelta(hours=3, minutes=20)
+    plan, _ = ScheduleQueue()._plan(_schedule(missed_run_policy=MISSED_SKIP), MONDAY, now)
+    assert plan[0] == MONDAY + timedelta(hours=4)
+
+
+def test_pop_due_and_reschedule_keep_the_cadence():
+    queue = ScheduleQueue()
+    schedules = {"bot": _schedule()}
+    assert queue.sync(schedules, MONDAY - timedelta(minutes=5)) == []
+    assert queue.pop_due(MONDAY - timedelta(minutes=1)) is None
+    assert queue.seconds_until_next(MONDAY - timedelta(minutes=1)) == 60.0
+
+    late = MONDAY + timedelta(minutes=7)
+    assert queue.pop_due(late) == ("bot", MONDAY, MONDAY)
+    assert len(queue) == 0
+    # A sync while the bot is dispatched does not plan it a second time.
+    queue.sync(schedules, late)
+    assert queue.pop_due(late) is None
+
+    assert queue.reschedule("bot", schedules["bot"], MONDAY, late) == MONDAY + timedelta(hours=1)
+    assert schedules["bot"]["start_datetime"] == "2024-01-01T10:00:00"
+    assert queue.next_fire_time() == MONDAY + timedelta(hours=1)
+
+
+def test_reschedule_disables_a_one_off_schedule():
+    queue = ScheduleQueue()
+    schedules = {"bot": _schedule("Do not repeat")}
+    queue.sync(schedules, MONDAY)
+    queue.pop_due(MONDAY)
+    assert queue.reschedule("bot", schedules["bot"], MONDAY, MONDAY) is None
+    assert schedules["bot"]["enabled"] is False
+    assert queue.next_fire_time() is None
+
+
+def test_sync_drops_disabled_and_replans_edited_schedules():
+    queue = ScheduleQueue()
+    schedules = {"a": _schedule(), "b": _schedule(start=MONDAY + timedelta(minutes=30))}
+    queue.sync(schedules, MONDAY - timedelta(hours=1))
+    assert len(queue) == 2
+    schedules["a"]["enabled"] = False
+    schedules["b"]["start_datetime"] = (MONDAY + timedelta(minutes=45)).isoformat()
+    queue.sync(schedules, MONDAY - timedelta(hours=1))
+    assert len(queue) == 1
+    # The stale heap item for the old 'b' fire time is skipped.
+    assert queue.next_fire_time() == MONDAY + timedelta(minutes=45)
+
+
+def test_sync_reports_an_invalid_start_time():
+    queue = ScheduleQueue()
+    messages = queue.sync({"bot": dict(_schedule(), start_datetime="tomorrow")}, MONDAY)
+    assert messages and "invalid start time" in messages[0]
+    assert len(queue) == 0
+
+
+def test_defer_retries_a_popped_entry_later():
+    queue = ScheduleQueue()
+    queue.sync({"bot": _schedule()}, MONDAY)
+    bot_name, due, anchor = queue.pop_due(MONDAY)
+    queue.defer(bot_name, due, anchor, MONDAY + timedelta(seconds=30))
+    assert queue.pop_due(MONDAY + timedelta(seconds=10)) is None
+    assert queue.pop_due(MONDAY + timedelta(seconds=30)) == ("bot", MONDAY, MONDAY)
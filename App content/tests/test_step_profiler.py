@@ -0,0 +1,85 @@
+# test_step_profiler.py
+import time
+
+import pytest
+
+from my_lib import step_profiler
+from my_lib.step_profiler import StepProfiler, format_profile_summary
+
+
+def _step(method, module="Calc"):
+    return {"type": "step", "module_name": module, "class_name": module, "method_name": method}
+
+
+def test_settle_time_is_not_counted_as_resolve_time():
+    profiler = StepProfiler("bot")
+    profiler.begin_step(0, _step("add"))
+    time.sleep(0.05)
+    profiler.mark_overhead("settle")
+    profiler.mark("resolve")
+    time.sleep(0.02)
+    profiler.mark("call")
+    profiler.end_step()
+    record = profiler.records[-1]
+    assert record["overhead"]["settle"] >= 0.05
+    assert record["resolve_s"] < 0.01
+    assert 0.02 <= record["call_s"] < 0.05
+    assert record["wall_s"] >= record["overhead"]["settle"] + record["call_s"]
+
+
+def test_waits_before_a_step_count_towards_it():
+    profiler = StepProfiler("bot")
+    profiler.add_overhead("wait", 1.5)
+    profiler.begin_step(0, _step("add"))
+    profiler.end_step()
+    record = profiler.records[-1]
+    assert record["overhead"] == {"wait": 1.5}
+    assert record["wall_s"] >= 1.5
+
+
+def test_report_aggregates_per_method_and_loop():
+    profiler = StepProfiler("bot")
+    for iteration in (1, 2, 3):
+        profiler.loop_iteration("L1", iteration)
+        profiler.begin_step(1, _step("add"))
+        profiler.add_overhead("settle", 0.05)
+        profiler.begin_step(2, _step("save", module="Excel"))
+    profiler.loop_iteration("L1", 4)
+    profiler.loop_finished("L1")
+    report = profiler.report()
+    assert report["steps_executed"] == 6
+    assert report["overhead_s"] == {"settle": pytest.approx(0.15)}
+    assert {(row["module"], row["method"]): row["calls"] for row in report["methods"]} == {("Calc", "add"): 3, ("Excel", "save"): 3}
+    (loop,) = report["loops"]
+    assert loop["loop_id"] == "L1" and loop["iterations"] == 3
+    assert loop["min_s"] <= loop["mean_s"] <= loop["max_s"]
+    assert format_profile_summary(report)[0].startswith("Profile: 6 step(s)")
+
+
+def test_raw_records_are_bounded(monkeypatch):
+    monkeypatch.setattr(step_profiler, "MAX_RECENT_RECORDS", 10)
+    profiler = StepProfiler("bot")
+    for index in range(50):
+        profiler.begin_step(index, _step("add"))
+    report = profiler.report()
+    assert len(profiler.records) == 10 and profiler.records[-1]["index"] == 49
+    assert report["steps_executed"] == 50 and report["methods"][0]["calls"] == 50
+
+
+def test_engine_reports_settle_separately_from_resolve(tmp_path):
+    pytest.importorskip("PyQt6")
+    from my_lib.step_engine import HeadlessCommunicator, StepEngine
+
+    (tmp_path / "ProfProbe.py").write_text("class ProfProbe:\n    def run(self):\n        return 1\n")
+    steps = [{"type": "step", "module_name": "ProfProbe", "class_name": "ProfProbe", "method_name": "run",
+              "parameters_config": {}, "assign_to_variable_name": None}]
+    engine = StepEngine(steps, str(tmp_path), HeadlessCommunicator(), {}, {"type": "hardcoded", "value": 0},
+                        bot_name="profile probe", bot_steps_directory=str(tmp_path))
+    engine.step_settle_ms = 50
+    engine.checkpoints_enabled = False
+    engine.template_warmup_enabled = False
+    engine.log_file_path = str(tmp_path / "logs" / "bot_runs.log")
+    engine.run()
+    record = engine.profiler.records[-1]
+    assert record["overhead"]["settle"] >= 0.05
+    assert record["resolve_s"] < 0.02
@@ -0,0 +1,154 @@
+# test_template_pack.py
+import base64
+import io
+import json
+import os
+
+import numpy as np
+import PIL.Image
+import pytest
+
+from my_lib.template_cache import TemplateCache
+from my_lib.template_pack import (TemplatePack, export_folder, import_folder, list_template_names,
+                                  read_template_data)
+
+
+def _png(value, width=6, height=4):
+    """A base64 PNG filled with one gray value, as stored in a Click_image .txt file."""
+    buffer = io.BytesIO()
+    PIL.Image.fromarray(np.full((height, width), value, dtype=np.uint8)).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def _write_txt(folder, name, data):
+    with open(os.path.join(folder, name + ".txt"), "w") as outfile:
+        json.dump(data, outfile)
+
+
+@pytest.fixture
+def pack(tmp_path):
+    return TemplatePack.for_folder(str(tmp_path))
+
+
+def test_put_and_read_back(pack):
+    pack.put_templates({"ok": {"ok_0": _png(10), "ok_1": _png(20, width=3)}, "cancel": {"cancel_0": _png(30)}})
+    assert pack.names() == ["cancel", "ok"]
+    variants = dict(pack.variants("ok"))
+    assert variants["ok_0"].shape == (4, 6) and int(variants["ok_0"][0, 0]) == 10
+    assert variants["ok_1"].shape == (4, 3) and int(variants["ok_1"][0, 0]) == 20
+    assert not variants["ok_0"].flags.writeable
+    assert pack.png_variants("cancel") == {"cancel_0": _png(30)}
+
+
+def test_add_and_remove_variant_bump_the_version(pack):
+    pack.put_template("ok", {"ok_0": _png(10)})
+    first = pack.version("ok")
+    pack.add_variant("ok", "ok_1", _png(20))
+    assert [key for key, _ in pack.variants("ok")] == ["ok_0", "ok_1"]
+    assert pack.version("ok") > first
+    second = pack.version("ok")
+    pack.remove_variant("ok", "ok_0")
+    assert [key for key, _ in pack.variants("ok")] == ["ok_1"]
+    assert pack.version("ok") > second
+
+
+def test_add_variant_replaces_a_key(pack):
+    pack.put_template("ok", {"ok_0": _png(10)})
+    pack.add_variant("ok", "ok_0", _png(99))
+    (key, gray), = pack.variants("ok")
+    assert key == "ok_0" and int(gray[0, 0]) == 99
+
+
+def test_removing_the_last_variant_removes_the_template(pack):
+    pack.put_template("ok", {"ok_0": _png(10)})
+    pack.remove_variant("ok", "ok_0")
+    assert "ok" not in pack and pack.names() == []
+    assert pack.is_removed("ok")
+    with pytest.raises(KeyError):
+        pack.variants("ok")
+
+
+def test_compact_keeps_live_templates_and_tombstones(pack):
+    pack.put_templates({"ok": {"ok_0": _png(10)}, "gone": {"gone_0": _png(40)}})
+    for value in range(5):
+        pack.add_variant("ok", "ok_1", _png(value))
+    pack.remove_template("gone")
+    before = os.path.getsize(pack.path)
+    expected = pack.png_variants("ok")
+    pack.compact()
+    assert os.path.getsize(pack.path) < before
+    assert pack.names() == ["ok"]
+    assert pack.png_variants("ok") == expected
+    assert pack.removed_names() == ["gone"]
+
+
+def test_versions_survive_compact_and_keep_increasing(pack):
+    pack.put_templates({"ok": {"ok_0": _png(10)}, "cancel": {"cancel_0": _png(30)}})
+    for value in range(3):
+        pack.add_variant("ok", "ok_1", _png(value))
+    before = {name: pack.version(name) for name in pack.names()}
+    pack.compact()
+    assert {name: pack.version(name) for name in pack.names()} == before
+    pack.add_variant("cancel", "cancel_1", _png(40))
+    assert pack.version("cancel") > max(before.values())
+
+
+def test_a_template_added_again_gets_a_new_version(pack):
+    pack.put_templates({"ok": {"ok_0": _png(10)}, "cancel": {"cancel_0": _png(30)}})
+    pack.add_variant("ok", "ok_1", _png(20))
+    old_version = pack.version("ok")
+    pack.remove_template("ok")
+    pack.compact()
+    pack.put_template("ok", {"ok_0": _png(99)})
+    assert pack.version("ok") > old_version
+
+
+def test_other_instances_see_commits(pack):
+    pack.put_template("ok", {"ok_0": _png(10)})
+    reader = TemplatePack(pack.path)
+    assert reader.names() == ["ok"]
+    pack.add_variant("ok", "ok_1", _png(20))
+    assert len(reader.variants("ok")) == 2
+
+
+def test_import_export_round_trip(tmp_path):
+    source, backup = tmp_path / "src", tmp_path / "backup"
+    source.mkdir()
+    _write_txt(str(source), "ok", {"ok_0": _png(10), "ok_1": _png(20)})
+    _write_txt(str(source), "cancel", {"cancel_0": _png(30)})
+    assert import_folder(str(source), remove_txt=True) == 2
+    assert sorted(os.listdir(source)) == ["templates.tpack"]
+    assert export_folder(str(source), str(backup)) == 2
+    with open(backup / "ok.txt") as json_file:
+        assert json.load(json_file) == {"ok_0": _png(10), "ok_1": _png(20)}
+
+
+def test_removed_template_does_not_come_back_from_its_txt_file(tmp_path):
+    click_image = tmp_path / "Click_image"
+    folder = click_image / "SAP GUI"
+    folder.mkdir(parents=True)
+    _write_txt(str(folder), "logon", {"logon_0": _png(10)})
+    _write_txt(str(folder), "other", {"other_0": _png(50)})
+    import_folder(str(folder))  # keeps the .txt files
+    pack = TemplatePack.for_folder(str(folder))
+    pack.remove_variant("logon", "logon_0")
+
+    assert list_template_names(str(click_image)) == ["SAP GUI/other"]
+    with pytest.raises(FileNotFoundError):
+        read_template_data(str(click_image), "SAP GUI/logon")
+    cache = TemplateCache()
+    with pytest.raises(FileNotFoundError):
+        cache.get_template(str(click_image), "SAP GUI/logon")
+    assert cache.template_stamp(str(click_image), "SAP GUI/logon") is None
+
+    # Saving the name again brings it back from the pack.
+    pack.add_variant("logon", "logon_1", _png(70))
+    assert "SAP GUI/logon" in list_template_names(str(click_image))
+    assert read_template_data(str(click_image), "SAP GUI/logon") == {"logon_1": _png(70)}
+    assert [key for key, _ in cache.get_template(str(click_image), "SAP GUI/logon")] == ["logon_1"]
+
+
+def test_txt_templates_without_a_pack_are_listed(tmp_path):
+    _write_txt(str(tmp_path), "plain", {"plain_0": _png(10)})
+    assert list_template_names(str(tmp_path)) == ["plain"]
+    assert read_template_data(str(tmp_path), "plain") == {"plain_0": _png(10)}
@@ -0,0 +1,133 @@
+# test_work_queue.py
+import pickle
+import sqlite3
+
+import pytest
+
+from my_lib.work_queue import CLAIMED, DONE, FAILED, PENDING, SqliteWorkQueue, WorkQueue
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "queue.db")
+
+
+def _worker(db_path, name, queue_name="orders"):
+    return SqliteWorkQueue(db_path, queue_name=queue_name, worker_id=name)
+
+
+def _expire_leases(db_path, item_ids):
+    connection = sqlite3.connect(db_path)
+    with connection:
+        connection.executemany("UPDATE bot_work_queue SET lease_expires = '2000-01-01 00:00:00.000' WHERE id = ?",
+                               [(item_id,) for item_id in item_ids])
+    connection.close()
+
+
+def test_claim_order_and_payloads(db_path):
+    queue = _worker(db_path, "a")
+    assert queue.enqueue([{"order": 1}, {"order": 2}]) == 2
+    assert queue.enqueue(["urgent"], priority=5) == 1
+    items = queue.claim(batch_size=2)
+    # Highest priority first, then the oldest; returned in id order.
+    assert [item["payload"] for item in items] == [{"order": 1}, "urgent"]
+    assert all(item["attempts"] == 1 for item in items)
+    assert queue.stats() == {PENDING: 1, CLAIMED: 2, DONE: 0, FAILED: 0}
+
+
+def test_claimed_items_are_not_handed_out_twice(db_path):
+    first, second = _worker(db_path, "a"), _worker(db_path, "b")
+    first.enqueue(range(3))
+    claimed = first.claim(batch_size=2)
+    rest = second.claim(batch_size=5)
+    assert [item["payload"] for item in rest] == [2]
+    assert second.claim() == []
+    assert {item["id"] for item in claimed}.isdisjoint(item["id"] for item in rest)
+
+
+def test_expired_lease_can_be_reclaimed(db_path):
+    first, second = _worker(db_path, "a"), _worker(db_path, "b")
+    first.enqueue(["job"])
+    (item,) = first.claim(lease_seconds=300)
+    assert second.claim() == []
+    _expire_leases(db_path, [item["id"]])
+    (reclaimed,) = second.claim()
+    assert reclaimed["id"] == item["id"] and reclaimed["attempts"] == 2
+
+
+def test_only_the_lease_owner_can_update_an_item(db_path):
+    first, second = _worker(db_path, "a"), _worker(db_path, "b")
+    first.enqueue(["job"])
+    (item,) = first.claim()
+    assert second.complete([item["id"]]) == 0
+    assert second.heartbeat([item["id"]]) == 0
+    assert second.fail([item["id"]], "not mine") == 0
+    assert first.heartbeat([item["id"]]) == 1
+    assert first.complete([item["id"]], result={"ok": True}) == 1
+    # A closed item cannot be completed again.
+    assert first.complete([item["id"]]) == 0
+    assert first.stats()[DONE] == 1
+
+
+def test_worker_that_lost_its_lease_cannot_complete(db_path):
+    first, second = _worker(db_path, "a"), _worker(db_path, "b")
+    first.enqueue(["job"])
+    (item,) = first.claim()
+    _expire_leases(db_path, [item["id"]])
+    second.claim()
+    assert first.complete([item["id"]]) == 0
+    assert second.complete([item["id"]]) == 1
+
+
+def test_fail_retries_until_max_attempts(db_path):
+    queue = _worker(db_path, "a")
+    queue.enqueue(["flaky"])
+    for attempt in (1, 2):
+        (item,) = queue.claim()
+        assert item["attempts"] == attempt
+        assert queue.fail([item["id"]], "timeout", max_attempts=3) == 1
+        assert queue.stats()[PENDING] == 1
+    (item,) = queue.claim()
+    queue.fail([item["id"]], "timeout", max_attempts=3)
+    assert queue.stats() == {PENDING: 0, CLAIMED: 0, DONE: 0, FAILED: 1}
+    assert queue.claim() == []
+
+
+def test_fail_without_retry_marks_failed(db_path):
+    queue = _worker(db_path, "a")
+    queue.enqueue(["bad"])
+    (item,) = queue.claim()
+    queue.fail([item["id"]], "bad input", retry=False)
+    assert queue.stats()[FAILED] == 1
+
+
+def test_queues_share_a_table_but_not_items(db_path):
+    orders, invoices = _worker(db_path, "a"), _worker(db_path, "a", queue_name="invoices")
+    orders.enqueue(["order"])
+    assert invoices.claim() == []
+    assert invoices.stats()[PENDING] == 0
+
+
+def test_queue_pickles_for_checkpoints(db_path):
+    queue = _worker(db_path, "a")
+    queue.enqueue(["job"])
+    restored = pickle.loads(pickle.dumps(queue))
+    assert restored.worker_id == "a" and restored.stats()[PENDING] == 1
+
+
+def test_rejects_unsafe_table_names(db_path):
+    with pytest.raises(ValueError):
+        SqliteWorkQueue(db_path, table_name="queue; DROP TABLE x")
+
+
+def test_incomplete_backend_fails_on_creation():
+    class NoClaim(WorkQueue):
+        def ensure_table(self): pass
+        def _insert(self, rows): return 0
+        def _update_owned(self, item_ids, set_sql, params): return 0
+        def _counts(self): return {}
+        def _lease_expiry_sql(self): return ""
+        def _now_sql(self): return ""
+
+    with pytest.raises(TypeError):
+        NoClaim()